@@ -0,0 +1,240 @@
+"""
+Measures the latency and throughput of every ConnectionObject method against
+the local mock Spotify server in benchmarks/mock_spotify.py, so changes to the
+hot paths can be compared without a network or a Spotify account.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_connection [--latency 0.02] [--page-size 50] \
+        [--rate-limit-every 0] [--library-size 1000] [--iterations 20] \
+        [--http2] \
+        [--save results.json] [--compare results.json] [--tolerance 0.25]
+
+With --compare the run exits with status 1 if any method's median latency is
+more than tolerance slower than in the saved results.
+"""
+import argparse
+from datetime import datetime, timedelta
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+from streamlib import ConnectionObject
+from streamlib.objects import Album, Artist, Song
+
+from .mock_spotify import MockSpotify, track_id, SONGS_PER_ALBUM, \
+    ALBUMS_PER_ARTIST
+
+CLIENT_ID = 'benchmark-client'
+CLIENT_SECRET = 'benchmark-secret'
+REDIRECT_URI = 'http://127.0.0.1/callback'
+SCOPE = ['user-library-read', 'user-library-modify']
+BATCH = 200
+
+
+def connect(
+    mock: MockSpotify,
+    cache_folder: str,
+    http2: bool = False) -> ConnectionObject:
+    """
+    returns a ConnectionObject using the mock server, logged in with an
+    expired token stored in the cache so the first call refreshes it
+    """
+    connection = ConnectionObject(
+        cache_folder=cache_folder,
+        metadata_ttl=None,
+        memory_cache_entries=None,
+        spotify_api_url=mock.api_url,
+        spotify_token_url=mock.token_url,
+        http2=http2)
+    expired = datetime.utcnow() - timedelta(hours=1)
+    connection._cache_handler._store_spotify_auth_code_connection(
+        CLIENT_ID,
+        CLIENT_SECRET,
+        REDIRECT_URI,
+        " ".join(SCOPE),
+        'expired-token',
+        'mock-refresh-token',
+        expired.strftime('%Y-%m-%d %H:%M:%S.%f'))
+    connection.spotify_auth_code(
+        CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, scope=SCOPE)
+    return connection
+
+
+def cases(connection: ConnectionObject, library_size: int) -> list:
+    """
+    returns (name, items per call, function of the iteration number) for
+    every method measured. Ids and searches are new on every iteration and
+    song data isn't cached, so every call reaches the server
+    """
+    auth = connection._spotify_auth
+
+    def refresh(i: int) -> None:
+        auth._access_token_expires = datetime.utcnow() - timedelta(seconds=1)
+        auth._get_access_token()
+
+    def ids(i: int, count: int) -> list:
+        return [track_id(10 ** 6 + i * count + j) for j in range(count)]
+
+    def unsaved(i: int) -> list:
+        return [Song(name='Unsaved {} {}'.format(i, j),
+                     artists=[Artist(name='Artist {}'.format(j))])
+                for j in range(50)]
+
+    def unhydrated(i: int) -> list:
+        # songs which only know the ids of their album and artist
+        songs = []
+        for j in range(BATCH):
+            n = 10 ** 6 + i * BATCH + j
+            album = n // SONGS_PER_ALBUM
+            songs.append(Song(
+                spotify_id=track_id(n),
+                album=Album(spotify_id='album{:017d}'.format(album)),
+                artists=[Artist(spotify_id='artist{:016d}'.format(
+                    album // ALBUMS_PER_ARTIST))]))
+        return songs
+
+    def queue(i: int) -> None:
+        # odd iterations remove what the one before saved, so the library 
+        # keeps its size
+        if i % 2 == 0:
+            connection.spotify_queue_save_songs_by_id(ids(i, 100))
+        else:
+            connection.spotify_queue_remove_saved_songs_by_id(ids(i - 1, 100))
+        connection.spotify_flush_saved_songs()
+
+    return [
+        ('token refresh', 1, refresh),
+        ('spotify_get_song_by_id', 1,
+            lambda i: connection.spotify_get_song_by_id(ids(i, 1)[0])),
+        ('spotify_get_songs_by_id', BATCH,
+            lambda i: connection.spotify_get_songs_by_id(ids(i, BATCH))),
+        ('spotify_get_saved_songs', library_size,
+            lambda i: connection.spotify_get_saved_songs()),
+        ('spotify_iter_saved_songs', library_size,
+            lambda i: sum(1 for _ in connection.spotify_iter_saved_songs())),
+        ('spotify_check_saved_songs_by_id', BATCH,
+            lambda i: connection.spotify_check_saved_songs_by_id(
+                ids(i, BATCH))),
+        ('spotify_save_songs_by_id', 50,
+            lambda i: connection.spotify_save_songs_by_id(ids(i, 50))),
+        ('spotify_removed_saved_songs_by_id', 50,
+            lambda i: connection.spotify_removed_saved_songs_by_id(
+                ids(i, 50))),
+        ('spotify_queue_save_songs_by_id + flush', 100, queue),
+        ('spotify_populate_song', 1,
+            lambda i: connection.spotify_populate_song(unsaved(i)[0])),
+        ('spotify_populate_songs', 50,
+            lambda i: connection.spotify_populate_songs(unsaved(i))),
+        ('spotify_hydrate', BATCH,
+            lambda i: connection.spotify_hydrate(unhydrated(i))),
+        ('spotify_export_saved_songs', library_size,
+            lambda i: connection.spotify_export_saved_songs(
+                os.path.join(connection._cache_handler._folder,
+                             'export.ndjson'))),
+        ('spotify_build_saved_index', library_size,
+            lambda i: connection.spotify_build_saved_index()),
+        ('spotify_sync_saved_songs', library_size,
+            lambda i: connection.spotify_sync_saved_songs()),
+    ]
+
+
+def measure(function, iterations: int) -> list:
+    """
+    returns the seconds taken by each call of function, after one warm up
+    call
+    """
+    function(-1)
+    times = []
+    for i in range(iterations):
+        start = time.perf_counter()
+        function(i)
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def percentile(times: list, p: float) -> float:
+    ordered = sorted(times)
+    return ordered[min(len(ordered) - 1, int(p * len(ordered)))]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--latency', type=float, default=0.02,
+                        help='seconds the server delays every response')
+    parser.add_argument('--page-size', type=int, default=50,
+                        help='largest page of saved songs the server serves')
+    parser.add_argument('--rate-limit-every', type=int, default=0,
+                        help='answer every nth request with 429')
+    parser.add_argument('--library-size', type=int, default=1000)
+    parser.add_argument('--iterations', type=int, default=20)
+    parser.add_argument('--http2', action='store_true',
+                        help='send requests with httpx, the mock server '
+                        'only speaks HTTP/1.1 so this measures httpx itself')
+    parser.add_argument('--save', help='write the results to this file')
+    parser.add_argument('--compare',
+                        help='compare with results saved with --save')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='allowed slowdown of the median, 0.25 is 25%%')
+    args = parser.parse_args()
+
+    mock = MockSpotify(
+        latency=args.latency,
+        page_size=args.page_size,
+        rate_limit_every=args.rate_limit_every,
+        library_size=args.library_size).start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory() as cache_folder:
+            connection = connect(mock, cache_folder, args.http2)
+            print("latency: {}s, page size: {}, 429 every: {}, "
+                  "library: {} songs, iterations: {}".format(
+                    args.latency, args.page_size,
+                    args.rate_limit_every or 'never', args.library_size,
+                    args.iterations))
+            print("{:42} {:>9} {:>9} {:>9} {:>11}".format(
+                'method', 'p50 ms', 'p95 ms', 'calls/s', 'items/s'))
+            for name, items, function in cases(
+                    connection, args.library_size):
+                times = measure(function, args.iterations)
+                median = statistics.median(times)
+                results[name] = {
+                    'p50': median,
+                    'p95': percentile(times, 0.95),
+                    'calls_per_second': len(times) / sum(times),
+                    'items_per_second': items * len(times) / sum(times),
+                }
+                print("{:42} {:9.2f} {:9.2f} {:9.1f} {:11.0f}".format(
+                    name,
+                    1000 * median,
+                    1000 * results[name]['p95'],
+                    results[name]['calls_per_second'],
+                    results[name]['items_per_second']))
+    finally:
+        mock.stop()
+    print("requests: {}, rate limited: {}, tokens issued: {}".format(
+        mock.requests, mock.rate_limited, mock.tokens))
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)
+        regressions = [
+            (name, baseline[name]['p50'], result['p50'])
+            for name, result in results.items()
+            if name in baseline and
+            result['p50'] > baseline[name]['p50'] * (1 + args.tolerance)]
+        for name, before, after in regressions:
+            print("regression: {} p50 {:.2f} ms -> {:.2f} ms".format(
+                name, 1000 * before, 1000 * after))
+        if len(regressions) > 0:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
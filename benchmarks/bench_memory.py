@@ -0,0 +1,81 @@
+"""
+Measures the memory held by Song objects parsed from a large library, with
+albums and artists shared through the identity map and without.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_memory [num_songs] [songs_per_album]
+"""
+import gc
+import sys
+import tracemalloc
+
+from streamlib.connection.spotify_api import SpotifyAPI
+from streamlib.objects import IdentityMap
+
+
+def track_json(i: int, songs_per_album: int) -> dict:
+    album = i // songs_per_album
+    artist = album // 3
+    artists = [{'name': 'Artist {}'.format(artist),
+                'id': 'artist{:018d}'.format(artist)}]
+    return {
+        'name': 'Song {}'.format(i),
+        'id': 'track{:017d}'.format(i),
+        'duration_ms': 180000 + i % 60000,
+        'explicit': i % 7 == 0,
+        'disc_number': 1,
+        'is_local': False,
+        'artists': artists,
+        'album': {
+            'name': 'Album {}'.format(album),
+            'id': 'album{:017d}'.format(album),
+            'total_tracks': songs_per_album,
+            'release_date': '2019-05-17',
+            'release_date_precision': 'day',
+            'type': 'album',
+            'artists': artists,
+        },
+    }
+
+
+def measure(tracks: list, shared: bool) -> int:
+    """
+    returns the bytes allocated to keep the parsed songs alive
+    """
+    api = SpotifyAPI()
+    gc.collect()
+    tracemalloc.start()
+    if shared:
+        songs = [api._create_song(track) for track in tracks]
+    else:
+        songs = []
+        for track in tracks:
+            # a fresh identity map per song stops albums and artists being
+            # shared, like before they were interned
+            api._identity_map = IdentityMap()
+            songs.append(api._create_song(track))
+    api._identity_map = IdentityMap()
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del songs
+    return size
+
+
+def main() -> None:
+    num_songs = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    songs_per_album = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+    tracks = [track_json(i, songs_per_album) for i in range(num_songs)]
+    separate = measure(tracks, shared=False)
+    shared = measure(tracks, shared=True)
+    print("songs: {}, songs per album: {}".format(num_songs, songs_per_album))
+    print("separate albums and artists: {:10.1f} MiB ({:.0f} B/song)".format(
+        separate / 2 ** 20, separate / num_songs))
+    print("shared albums and artists:   {:10.1f} MiB ({:.0f} B/song)".format(
+        shared / 2 ** 20, shared / num_songs))
+    print("reduction: {:.1f}%".format(100 * (1 - shared / separate)))
+
+
+if __name__ == '__main__':
+    main()
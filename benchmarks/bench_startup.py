@@ -0,0 +1,96 @@
+"""
+Measures the cold start of streamlib: importing ConnectionObject and
+constructing one, each in a fresh interpreter so nothing is already imported.
+It also checks that neither step imports the HTTP clients, numpy or asyncio,
+or creates the cache folder, since all of them are deferred until first use.
+
+Run from the repository root:
+
+    python -m benchmarks.bench_startup [--runs 10] [--import-budget 100] \
+        [--construct-budget 10]
+
+The run exits with status 1 if the median import or construction time is
+over its budget in milliseconds, or if anything was done eagerly.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# modules which should only be imported once they are needed
+DEFERRED_MODULES = ('requests', 'httpx', 'aiohttp', 'numpy', 'asyncio')
+
+CHILD = """
+import json, os, sys, time
+start = time.perf_counter()
+from streamlib import ConnectionObject
+imported = time.perf_counter()
+connection = ConnectionObject(cache_folder={folder!r})
+constructed = time.perf_counter()
+print(json.dumps({{
+    'import': imported - start,
+    'construct': constructed - imported,
+    'modules': [name for name in {modules!r} if name in sys.modules],
+    'folder_created': os.path.exists({folder!r}),
+}}))
+"""
+
+
+def run_once(root: str) -> dict:
+    """
+    imports and constructs a ConnectionObject in a new interpreter and
+    returns its timings, with a cache folder which doesn't exist yet
+    """
+    with tempfile.TemporaryDirectory() as parent:
+        code = CHILD.format(
+            folder=os.path.join(parent, 'cache'),
+            modules=DEFERRED_MODULES)
+        output = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=root,
+            capture_output=True,
+            text=True,
+            check=True).stdout
+    return json.loads(output)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--import-budget', type=float, default=100,
+                        help='milliseconds allowed to import ConnectionObject')
+    parser.add_argument('--construct-budget', type=float, default=10,
+                        help='milliseconds allowed to construct one')
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    runs = [run_once(root) for _ in range(args.runs)]
+    failures = []
+    print("{:12} {:>9} {:>9} {:>9}".format('step', 'p50 ms', 'max ms',
+                                           'budget'))
+    for step, budget in (('import', args.import_budget),
+                         ('construct', args.construct_budget)):
+        times = [1000 * run[step] for run in runs]
+        median = statistics.median(times)
+        print("{:12} {:9.2f} {:9.2f} {:9g}".format(
+            step, median, max(times), budget))
+        if median > budget:
+            failures.append("{} took {:.2f} ms, the budget is {:g} ms".format(
+                step, median, budget))
+    eager = sorted(set(name for run in runs for name in run['modules']))
+    if len(eager) > 0:
+        failures.append("imported eagerly: {}".format(", ".join(eager)))
+    if any(run['folder_created'] for run in runs):
+        failures.append("the cache folder was created by the constructor")
+
+    for failure in failures:
+        print("over budget: {}".format(failure))
+    if len(failures) > 0:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,425 @@
+"""
+A local stand-in for the Spotify Web API and accounts service, for measuring
+streamlib without a network or a Spotify account. Tracks are made from the
+recorded response in fixtures/track.json, with a different id, name, album
+and artist for each track.
+
+It can add latency to every response, serve saved songs and album songs in
+smaller pages than asked for, and answer every nth API request with 429 Too Many Requests.
+GET responses carry an ETag, and requests whose If-None-Match matches it are
+answered with 304 Not Modified.
+Point a ConnectionObject at it with spotify_api_url=server.api_url and
+spotify_token_url=server.token_url.
+
+Run from the repository root to serve it on its own:
+
+    python -m benchmarks.mock_spotify [--port 8642] [--latency 0.02] \
+        [--page-size 50] [--rate-limit-every 0] [--library-size 1000]
+"""
+import argparse
+from datetime import datetime, timedelta
+from hashlib import sha1
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import os
+import threading
+import time
+from urllib.parse import parse_qs, urlparse
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+USER_ID = 'benchmark-user'
+# the maximum number of ids Spotify accepts in one call to each endpoint
+MAX_IDS = {'tracks': 50, 'me/tracks': 50, 'me/tracks/contains': 50,
+           'artists': 50, 'albums': 20}
+GENRES = ('indie pop', 'art rock', 'ambient', 'synthwave', 'jazz rap')
+SONGS_PER_ALBUM = 10
+ALBUMS_PER_ARTIST = 3
+
+
+def track_id(i: int) -> str:
+    """
+    returns the 22 character id of the ith track, shaped like a Spotify id
+    """
+    return 'track{:017d}'.format(i)
+
+
+def track_index(id: str) -> int:
+    """
+    returns i for an id made by track_id, or a stable number for any other id
+    """
+    digits = id[5:]
+    if id.startswith('track') and digits.isdigit():
+        return int(digits)
+    return sum(ord(c) * 31 ** k for k, c in enumerate(id)) % 10 ** 9
+
+
+class MockSpotify:
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0,
+        page_size: int = 50,
+        rate_limit_every: int = 0,
+        retry_after: float = 0,
+        library_size: int = 1000):
+        """
+        a mock Spotify server, port 0 picks a free port. latency is the
+        number of seconds every response is delayed, page_size the largest
+        page of saved songs or album songs served, and every rate_limit_every'th API request
+        is answered with 429 and a Retry-After of retry_after seconds (0
+        turns this off). The user starts with library_size saved songs
+        """
+        with open(os.path.join(FIXTURES, 'track.json')) as file:
+            self.template = json.load(file)
+        self.latency = latency
+        self.page_size = page_size
+        self.rate_limit_every = rate_limit_every
+        self.retry_after = retry_after
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.rate_limited = 0
+        self.tokens = 0
+        # saved songs, newest first, like me/tracks returns them
+        start = datetime(2020, 1, 1)
+        self.library = [
+            (track_id(i), (start + timedelta(minutes=i)).strftime(
+                '%Y-%m-%dT%H:%M:%SZ'))
+            for i in reversed(range(library_size))]
+        self.saved = set(id for id, _ in self.library)
+        handler = type('Handler', (MockHandler,), {'mock': self})
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), handler)
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def port(self) -> int:
+        return self.server.server_address[1]
+
+    @property
+    def api_url(self) -> str:
+        return 'http://127.0.0.1:{}/v1/'.format(self.port)
+
+    @property
+    def token_url(self) -> str:
+        return 'http://127.0.0.1:{}/api/token'.format(self.port)
+
+    def start(self) -> 'MockSpotify':
+        """
+        serves requests on a daemon thread
+        """
+        self.thread = threading.Thread(
+            target=self.server.serve_forever,
+            name='mock-spotify',
+            daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def artist(self, artist_index: int, full: bool = False) -> dict:
+        """
+        returns the simplified JSON of an artist, or the full JSON with 
+        genres and popularity
+        """
+        artist = dict(
+            self.template['artists'][0],
+            id='artist{:016d}'.format(artist_index),
+            name='Artist {}'.format(artist_index))
+        if full:
+            artist.update(
+                genres=[GENRES[artist_index % len(GENRES)]],
+                popularity=artist_index % 100,
+                followers={'href': None, 'total': artist_index * 10})
+        return artist
+
+    def album(self, album_index: int, full: bool = False) -> dict:
+        """
+        returns the simplified JSON of an album, or the full JSON with its
+        songs
+        """
+        album = dict(
+            self.template['album'],
+            id='album{:017d}'.format(album_index),
+            name='Album {}'.format(album_index),
+            artists=[self.artist(album_index // ALBUMS_PER_ARTIST)],
+            total_tracks=SONGS_PER_ALBUM)
+        if full:
+            album.update(
+                genres=[],
+                label='Benchmark Records',
+                popularity=album_index % 100,
+                tracks=self.album_tracks(album_index, 0, 50))
+        return album
+
+    def album_tracks(self, album_index: int, offset: int, limit: int) -> dict:
+        """
+        returns a page of an album's songs, at most page_size long
+        """
+        limit = min(limit, self.page_size)
+        items = []
+        for k in range(offset, min(offset + limit, SONGS_PER_ALBUM)):
+            track = self.track(track_id(album_index * SONGS_PER_ALBUM + k))
+            del track['album']
+            items.append(track)
+        url = '{}albums/album{:017d}/tracks'.format(self.api_url, album_index)
+        return {
+            'href': '{}?offset={}&limit={}'.format(url, offset, limit),
+            'items': items,
+            'limit': limit,
+            'next': None if offset + limit >= SONGS_PER_ALBUM else
+                '{}?offset={}&limit={}'.format(url, offset + limit, limit),
+            'offset': offset,
+            'previous': None,
+            'total': SONGS_PER_ALBUM,
+        }
+
+    def track(self, id: str) -> dict:
+        """
+        returns the track JSON for an id, made from the recorded fixture
+        """
+        i = track_index(id)
+        album = self.album(i // SONGS_PER_ALBUM)
+        artist = album['artists'][0]
+        return dict(
+            self.template,
+            id=id,
+            name='Song {}'.format(i),
+            duration_ms=150000 + i % 120000,
+            track_number=i % SONGS_PER_ALBUM + 1,
+            explicit=i % 7 == 0,
+            artists=[artist],
+            album=album)
+
+    def should_rate_limit(self) -> bool:
+        """
+        counts an API request and decides if it gets a 429
+        """
+        with self.lock:
+            self.requests += 1
+            if self.rate_limit_every > 0 and \
+                    self.requests % self.rate_limit_every == 0:
+                self.rate_limited += 1
+                return True
+            return False
+
+
+def error(status: int, message: str) -> tuple:
+    return status, {'error': {'status': status, 'message': message}}
+
+
+class MockHandler(BaseHTTPRequestHandler):
+
+    # keep connections open so clients can pool them like with Spotify
+    protocol_version = 'HTTP/1.1'
+    # headers and body are written separately, without this the delayed
+    # ACK of the second write adds 40ms to every response
+    disable_nagle_algorithm = True
+    mock: MockSpotify = None
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_GET(self) -> None:
+        self.handle_api('GET')
+
+    def do_PUT(self) -> None:
+        self.handle_api('PUT')
+
+    def do_DELETE(self) -> None:
+        self.handle_api('DELETE')
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        if urlparse(self.path).path != '/api/token':
+            return self.respond(*error(404, 'Not found'))
+        with self.mock.lock:
+            self.mock.tokens += 1
+            token = 'mock-token-{}'.format(self.mock.tokens)
+        # without a scope in the response the client keeps the scope it
+        # asked for
+        self.respond(200, {
+            'access_token': token,
+            'token_type': 'Bearer',
+            'expires_in': 3600,
+            'refresh_token': 'mock-refresh-token',
+        })
+
+    def handle_api(self, method: str) -> None:
+        length = int(self.headers.get('Content-Length') or 0)
+        self.rfile.read(length)
+        url = urlparse(self.path)
+        if not url.path.startswith('/v1/'):
+            return self.respond(*error(404, 'Not found'))
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            return self.respond(*error(401, 'No token provided'))
+        if self.mock.should_rate_limit():
+            return self.respond(
+                *error(429, 'API rate limit exceeded'),
+                headers={'Retry-After': str(self.mock.retry_after)})
+        endpoint = url.path[len('/v1/'):].strip('/')
+        query = {k: v[0] for k, v in parse_qs(url.query).items()}
+        ids = query['ids'].split(',') if 'ids' in query else None
+        if ids is not None and endpoint in MAX_IDS and \
+                len(ids) > MAX_IDS[endpoint]:
+            return self.respond(*error(400, 'Too many ids requested'))
+        route = (method, endpoint.split('/')[0] if
+                 endpoint.startswith('tracks/') else endpoint)
+        if endpoint.startswith('albums/') and endpoint.endswith('/tracks'):
+            route = (method, 'albums/tracks')
+        handler = {
+            ('GET', 'tracks'): self.get_tracks,
+            ('GET', 'me'): self.get_me,
+            ('GET', 'me/tracks'): self.get_saved,
+            ('PUT', 'me/tracks'): self.save,
+            ('DELETE', 'me/tracks'): self.remove,
+            ('GET', 'me/tracks/contains'): self.contains,
+            ('GET', 'search'): self.search,
+            ('GET', 'artists'): self.get_artists,
+            ('GET', 'albums'): self.get_albums,
+            ('GET', 'albums/tracks'): self.get_album_tracks,
+        }.get(route)
+        if handler is None:
+            return self.respond(*error(404, 'Service not found'))
+        status, body = handler(endpoint, query, ids)
+        if method != 'GET' or status != 200:
+            return self.respond(status, body)
+        etag = '"{}"'.format(sha1(json.dumps(body).encode()).hexdigest())
+        if self.headers.get('If-None-Match') == etag:
+            return self.respond(304, None, headers={'ETag': etag})
+        self.respond(status, body, headers={'ETag': etag})
+
+    def get_tracks(self, endpoint: str, query: dict, ids: list) -> tuple:
+        if endpoint.startswith('tracks/'):
+            id = endpoint[len('tracks/'):]
+            if id.startswith('missing'):
+                return error(404, 'Non existing id')
+            return 200, self.mock.track(id)
+        return 200, {'tracks': [
+            None if id.startswith('missing') else self.mock.track(id)
+            for id in ids]}
+
+    def get_artists(self, endpoint: str, query: dict, ids: list) -> tuple:
+        return 200, {'artists': [
+            self.mock.artist(int(id[len('artist'):]), full=True)
+            if id.startswith('artist') and id[len('artist'):].isdigit()
+            else None for id in ids]}
+
+    def get_albums(self, endpoint: str, query: dict, ids: list) -> tuple:
+        return 200, {'albums': [
+            self.mock.album(int(id[len('album'):]), full=True)
+            if id.startswith('album') and id[len('album'):].isdigit()
+            else None for id in ids]}
+
+    def get_album_tracks(self, endpoint: str, query: dict, ids: list) -> tuple:
+        id = endpoint.split('/')[1]
+        if not (id.startswith('album') and id[len('album'):].isdigit()):
+            return error(404, 'Non existing id')
+        return 200, self.mock.album_tracks(
+            int(id[len('album'):]),
+            int(query.get('offset', 0)),
+            int(query.get('limit', 20)))
+
+    def get_me(self, endpoint: str, query: dict, ids: list) -> tuple:
+        return 200, {'id': USER_ID, 'display_name': 'Benchmark User'}
+
+    def get_saved(self, endpoint: str, query: dict, ids: list) -> tuple:
+        offset = int(query.get('offset', 0))
+        limit = min(int(query.get('limit', 20)), self.mock.page_size)
+        with self.mock.lock:
+            library = self.mock.library
+            page = library[offset:offset + limit]
+            total = len(library)
+        url = self.mock.api_url + 'me/tracks'
+        return 200, {
+            'href': '{}?offset={}&limit={}'.format(url, offset, limit),
+            'items': [{'added_at': added_at, 'track': self.mock.track(id)}
+                      for id, added_at in page],
+            'limit': limit,
+            'next': None if offset + limit >= total else
+                '{}?offset={}&limit={}'.format(url, offset + limit, limit),
+            'offset': offset,
+            'previous': None,
+            'total': total,
+        }
+
+    def save(self, endpoint: str, query: dict, ids: list) -> tuple:
+        added_at = datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ')
+        with self.mock.lock:
+            new = [id for id in dict.fromkeys(ids)
+                   if id not in self.mock.saved]
+            self.mock.saved.update(new)
+            self.mock.library = [(id, added_at) for id in reversed(new)] + \
+                self.mock.library
+        return 200, None
+
+    def remove(self, endpoint: str, query: dict, ids: list) -> tuple:
+        with self.mock.lock:
+            removed = set(ids) & self.mock.saved
+            if len(removed) > 0:
+                self.mock.saved -= removed
+                self.mock.library = [item for item in self.mock.library
+                                     if item[0] not in removed]
+        return 200, None
+
+    def contains(self, endpoint: str, query: dict, ids: list) -> tuple:
+        with self.mock.lock:
+            return 200, [id in self.mock.saved for id in ids]
+
+    def search(self, endpoint: str, query: dict, ids: list) -> tuple:
+        q = query.get('q', '')
+        if 'track:' not in q:
+            return error(400, 'No search query')
+        return 200, {'tracks': {
+            'href': self.mock.api_url + 'search',
+            'items': [self.mock.track(track_id(track_index(q)))],
+            'limit': 1,
+            'offset': 0,
+            'total': 1,
+        }}
+
+    def respond(
+        self,
+        status: int,
+        body,
+        headers: dict = None) -> None:
+        if self.mock.latency > 0:
+            time.sleep(self.mock.latency)
+        content = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--port', type=int, default=8642)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--page-size', type=int, default=50)
+    parser.add_argument('--rate-limit-every', type=int, default=0)
+    parser.add_argument('--retry-after', type=float, default=0)
+    parser.add_argument('--library-size', type=int, default=1000)
+    args = parser.parse_args()
+    mock = MockSpotify(
+        port=args.port,
+        latency=args.latency,
+        page_size=args.page_size,
+        rate_limit_every=args.rate_limit_every,
+        retry_after=args.retry_after,
+        library_size=args.library_size)
+    print("API: {}  token: {}".format(mock.api_url, mock.token_url))
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -10,6 +10,13 @@ setup(
     author_email='sethsabar@gmail.com',
     license='BSD 3-Clause',
     install_requires=[],
+    extras_require={
+        'async': ['aiohttp'],
+        'table': ['numpy'],
+        'fast': ['orjson'],
+        'http2': ['httpx[http2]'],
+        'parquet': ['pyarrow'],
+    },
     python_requires='>=3',
     classifiers=[
         "Development Status :: 1 - Planning",
@@ -1,2 +1,31 @@
+from importlib import import_module
+from typing import TYPE_CHECKING
 
-from .connection import ConnectionObject
\ No newline at end of file
+# public names and the modules they're imported from on first access, so
+# 'import streamlib' doesn't import the HTTP clients
+_EXPORTS = {
+    'ConnectionObject': '.connection',
+    'AsyncConnectionObject': '.connection',
+    'ConnectionManager': '.connection',
+    'Metrics': '.metrics',
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .connection import ConnectionObject, AsyncConnectionObject, \
+        ConnectionManager
+    from .metrics import Metrics
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
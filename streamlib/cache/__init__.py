@@ -1 +1,3 @@
-from .cache_handler import CacheHandler
\ No newline at end of file
+from .cache_handler import CacheHandler
+from .lru_cache import LRUCache
+from .response_cache import ResponseCache
@@ -1,16 +1,369 @@
-from os import mkdir
-from os.path import isdir
+from os import mkdir, replace
+from os.path import isdir, isfile
 import csv
+import json
+import sqlite3
+import threading
+import time
+from ..metrics import Metrics
+
+# sqlite limits the number of parameters in a single statement
+MAX_SQL_PARAMS = 500
+
+METADATA_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (
+    kind TEXT NOT NULL,
+    id TEXT NOT NULL,
+    json TEXT NOT NULL,
+    stored_at REAL NOT NULL,
+    PRIMARY KEY (kind, id)
+) WITHOUT ROWID;
+"""
+
+CREDENTIALS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS spotify_auth_code (
+    client_id TEXT NOT NULL,
+    redirect_uri TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    client_secret TEXT NOT NULL,
+    access_token TEXT,
+    refresh_token TEXT,
+    access_token_expires TEXT,
+    PRIMARY KEY (client_id, redirect_uri, scope)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS spotify_users (
+    client_id TEXT NOT NULL,
+    user_key TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    access_token TEXT,
+    refresh_token TEXT NOT NULL,
+    access_token_expires REAL NOT NULL,
+    PRIMARY KEY (client_id, user_key)
+) WITHOUT ROWID;
+"""
+
+LIBRARY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS saved_tracks (
+    user_id TEXT NOT NULL,
+    id TEXT NOT NULL,
+    added_at TEXT,
+    PRIMARY KEY (user_id, id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS saved_index (
+    user_id TEXT PRIMARY KEY,
+    built_at REAL NOT NULL,
+    watermark TEXT
+);
+"""
+
+RESPONSES_SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    key TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    body BLOB NOT NULL,
+    stored_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS responses_stored_at ON responses (stored_at);
+"""
+# the number of seconds stored responses are kept, older ones are ignored and 
+# deleted when another response is stored
+RESPONSE_TTL = 7 * 86400
 
 class CacheHandler:
 
-    def __init__(self, folder):
+    def __init__(
+        self,
+        folder,
+        metadata_ttl: float = 86400,
+        metrics: Metrics = None):
         """
-        constructor for CacheHandler object, this should not be accessed directly
+        constructor for CacheHandler object, this should not be accessed directly. 
+        Every cache operation is recorded in metrics. The folder is created 
+        when the first database is opened
         """
-        if not isdir(folder):
-            mkdir(folder)
         self._folder = folder
+        self._metadata_ttl = metadata_ttl
+        self._local = threading.local()
+        self._metrics = metrics if metrics is not None else Metrics()
+
+    def _observe(
+        self,
+        store: str,
+        operation: str,
+        start: float,
+        hits: int = 0,
+        misses: int = 0) -> None:
+        """
+        records a cache operation which began at time.perf_counter() start
+        """
+        self._metrics._observe_cache(
+            store, operation, time.perf_counter() - start, hits, misses)
+
+    def _get_db(self, name: str, schema: str) -> sqlite3.Connection:
+        """
+        returns this thread's connection to the sqlite database name in the 
+        cache folder, creating the database with schema on first use
+        """
+        connections = getattr(self._local, 'connections', None)
+        if connections is None:
+            connections = self._local.connections = {}
+        if name not in connections:
+            if not isdir(self._folder):
+                try:
+                    mkdir(self._folder)
+                except FileExistsError:
+                    # another thread or process created it first
+                    pass
+            conn = sqlite3.connect(
+                "{}/{}".format(self._folder, name), timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(schema)
+            connections[name] = conn
+        return connections[name]
+
+    def _get_spotify_metadata(self, kind: str, ids: list[str]) -> dict:
+        """
+        given a kind of object ('track', 'album' or 'artist') and a list of 
+        Spotify ids, returns a dict from id to the cached JSON for every id 
+        which is in the cache and hasn't expired
+        """
+        if self._metadata_ttl is None or len(ids) == 0:
+            return {}
+        start = time.perf_counter()
+        conn = self._get_db("metadata.sqlite3", METADATA_SCHEMA)
+        oldest = time.time() - self._metadata_ttl
+        ids = list(dict.fromkeys(ids))
+        found = {}
+        for i in range(0, len(ids), MAX_SQL_PARAMS):
+            chunk = ids[i:i + MAX_SQL_PARAMS]
+            rows = conn.execute(
+                "SELECT id, json FROM metadata WHERE kind = ? AND "
+                "stored_at >= ? AND id IN ({})".format(
+                    ",".join("?" * len(chunk))),
+                [kind, oldest] + chunk)
+            for id, data in rows:
+                found[id] = json.loads(data)
+        self._observe(
+            'metadata', 'get', start, len(found), len(ids) - len(found))
+        return found
+
+    def _store_spotify_metadata(self, kind: str, items: dict) -> None:
+        """
+        given a kind of object ('track', 'album' or 'artist') and a dict from 
+        Spotify id to JSON, stores the JSON in the cache
+        """
+        if self._metadata_ttl is None or len(items) == 0:
+            return
+        start = time.perf_counter()
+        conn = self._get_db("metadata.sqlite3", METADATA_SCHEMA)
+        now = time.time()
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO metadata (kind, id, json, stored_at) "
+                "VALUES (?, ?, ?, ?)",
+                [(kind, id, json.dumps(data), now)
+                    for id, data in items.items()])
+        self._observe('metadata', 'store', start)
+
+    def _get_response(self, key: str) -> tuple:
+        """
+        given the key of a GET request, returns the (etag, body) of its last 
+        response, None if it isn't cached
+        """
+        start = time.perf_counter()
+        row = self._get_db("responses.sqlite3", RESPONSES_SCHEMA).execute(
+            "SELECT etag, body FROM responses WHERE key = ? AND stored_at >= ?",
+            (key, time.time() - RESPONSE_TTL)).fetchone()
+        self._observe(
+            'responses', 'get', start, int(row is not None), int(row is None))
+        return row
+
+    def _store_response(self, key: str, etag: str, body: bytes) -> None:
+        """
+        given the key of a GET request, stores the etag and body of its 
+        response and deletes responses older than RESPONSE_TTL
+        """
+        start = time.perf_counter()
+        now = time.time()
+        conn = self._get_db("responses.sqlite3", RESPONSES_SCHEMA)
+        with conn:
+            conn.execute(
+                "DELETE FROM responses WHERE stored_at < ?",
+                (now - RESPONSE_TTL,))
+            conn.execute(
+                "INSERT OR REPLACE INTO responses (key, etag, body, stored_at) "
+                "VALUES (?, ?, ?, ?)",
+                (key, etag, body, now))
+        self._observe('responses', 'store', start)
+
+    def _replace_saved_tracks(self, user_id: str, items: list[tuple]) -> None:
+        """
+        given a Spotify user id and a list of (song id, added_at) for every 
+        song the user has saved, replaces the user's saved songs index
+        """
+        start = time.perf_counter()
+        conn = self._get_db("library.sqlite3", LIBRARY_SCHEMA)
+        with conn:
+            conn.execute(
+                "DELETE FROM saved_tracks WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO saved_tracks (user_id, id, added_at) "
+                "VALUES (?, ?, ?)",
+                [(user_id, id, added_at) for id, added_at in items])
+            self._set_saved_watermark(
+                conn,
+                user_id,
+                max((added_at for _, added_at in items), default=None))
+        self._observe('library', 'replace', start)
+
+    def _merge_saved_tracks(self, user_id: str, items: list[tuple]) -> list[str]:
+        """
+        given a Spotify user id and a list of (song id, added_at) the user 
+        saved since the index was last synced, adds them to the index and 
+        advances its watermark. Returns the ids which weren't in the index
+        """
+        start = time.perf_counter()
+        conn = self._get_db("library.sqlite3", LIBRARY_SCHEMA)
+        with conn:
+            known = set(self._saved_track_ids(conn, user_id))
+            conn.executemany(
+                "INSERT OR REPLACE INTO saved_tracks (user_id, id, added_at) "
+                "VALUES (?, ?, ?)",
+                [(user_id, id, added_at) for id, added_at in items])
+            watermark = max(
+                [added_at for _, added_at in items] + 
+                    [self._get_saved_watermark(user_id) or ""])
+            self._set_saved_watermark(conn, user_id, watermark or None)
+        self._observe('library', 'merge', start)
+        return [id for id, _ in items if id not in known]
+
+    def _get_saved_watermark(self, user_id: str) -> str:
+        """
+        returns the added_at of the newest song the user's saved songs index 
+        was synced with, None if there is no index
+        """
+        start = time.perf_counter()
+        row = self._get_db("library.sqlite3", LIBRARY_SCHEMA).execute(
+            "SELECT watermark FROM saved_index WHERE user_id = ?",
+            (user_id,)).fetchone()
+        self._observe('library', 'get_watermark', start)
+        return None if row is None else row[0]
+
+    def _get_saved_track_ids(self, user_id: str) -> list[str]:
+        """
+        returns the id of every song in the user's saved songs index
+        """
+        start = time.perf_counter()
+        ids = self._saved_track_ids(
+            self._get_db("library.sqlite3", LIBRARY_SCHEMA), user_id)
+        self._observe('library', 'get_ids', start)
+        return ids
+
+    def _saved_track_ids(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str) -> list[str]:
+        return [id for id, in conn.execute(
+            "SELECT id FROM saved_tracks WHERE user_id = ?", (user_id,))]
+
+    def _set_saved_watermark(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str,
+        watermark: str) -> None:
+        conn.execute(
+            "INSERT OR REPLACE INTO saved_index (user_id, built_at, watermark) "
+            "VALUES (?, ?, ?)",
+            (user_id, time.time(), watermark))
+
+    def _add_saved_tracks(self, user_id: str, items: list[tuple]) -> None:
+        """
+        given a Spotify user id and a list of (song id, added_at), adds the 
+        songs to the user's saved songs index if there is one
+        """
+        start = time.perf_counter()
+        conn = self._get_db("library.sqlite3", LIBRARY_SCHEMA)
+        with conn:
+            if self._saved_index_built_at(conn, user_id) is not None:
+                conn.executemany(
+                    "INSERT OR IGNORE INTO saved_tracks (user_id, id, added_at) "
+                    "VALUES (?, ?, ?)",
+                    [(user_id, id, added_at) for id, added_at in items])
+        self._observe('library', 'add', start)
+
+    def _remove_saved_tracks(self, user_id: str, ids: list[str]) -> None:
+        """
+        given a Spotify user id and a list of song ids, removes the songs 
+        from the user's saved songs index
+        """
+        start = time.perf_counter()
+        conn = self._get_db("library.sqlite3", LIBRARY_SCHEMA)
+        with conn:
+            conn.executemany(
+                "DELETE FROM saved_tracks WHERE user_id = ? AND id = ?",
+                [(user_id, id) for id in ids])
+        self._observe('library', 'remove', start)
+
+    def _get_saved_index_age(self, user_id: str) -> float:
+        """
+        returns how many seconds ago the user's saved songs index was built, 
+        None if it never was
+        """
+        start = time.perf_counter()
+        built_at = self._saved_index_built_at(
+            self._get_db("library.sqlite3", LIBRARY_SCHEMA), user_id)
+        self._observe('library', 'get_age', start)
+        return None if built_at is None else time.time() - built_at
+
+    def _saved_index_built_at(
+        self,
+        conn: sqlite3.Connection,
+        user_id: str) -> float:
+        row = conn.execute(
+            "SELECT built_at FROM saved_index WHERE user_id = ?",
+            (user_id,)).fetchone()
+        return None if row is None else row[0]
+
+    def _check_saved_tracks(self, user_id: str, ids: list[str]) -> list[bool]:
+        """
+        given a Spotify user id and a list of song ids, returns whether each 
+        song is in the user's saved songs index
+        """
+        start = time.perf_counter()
+        conn = self._get_db("library.sqlite3", LIBRARY_SCHEMA)
+        unique = list(dict.fromkeys(ids))
+        saved = set()
+        for i in range(0, len(unique), MAX_SQL_PARAMS):
+            chunk = unique[i:i + MAX_SQL_PARAMS]
+            rows = conn.execute(
+                "SELECT id FROM saved_tracks WHERE user_id = ? AND "
+                "id IN ({})".format(",".join("?" * len(chunk))),
+                [user_id] + chunk)
+            saved.update(id for id, in rows)
+        self._observe('library', 'check', start)
+        return [id in saved for id in ids]
+
+    def _get_credentials_db(self) -> sqlite3.Connection:
+        """
+        returns this thread's connection to the credentials database, on 
+        first use any credentials in the old sacc.csv file are moved into it
+        """
+        first_use = "credentials.sqlite3" not in getattr(
+            self._local, 'connections', {})
+        conn = self._get_db("credentials.sqlite3", CREDENTIALS_SCHEMA)
+        legacy = "{}/{}".format(self._folder, "sacc.csv")
+        if first_use and isfile(legacy):
+            with open(legacy, 'r', newline='') as file:
+                rows = [row for row in csv.reader(file) if len(row) == 7]
+            with conn:
+                for row in rows:
+                    self._upsert_spotify_auth_code_connection(conn, *row)
+            try:
+                replace(legacy, legacy + ".migrated")
+            except FileNotFoundError:
+                # another process migrated the file first
+                pass
+        return conn
 
     def _store_spotify_auth_code_connection(
         self,
@@ -25,39 +378,51 @@ class CacheHandler:
         """
         given Spotify Auth Code Flow client info and credentials, stores them in the cache
         """
-        file_w = open("{}/{}".format(self._folder, "sacc.csv"), 'w')
-        file_r = open("{}/{}".format(self._folder, "sacc.csv"), 'r')
-        reader = csv.reader(file_r)
-        to_write = []
-        already_in_cache = False
-        for row in reader:
-            if (row[0] == client_id) and \
-                   (row[1] == client_secret) and \
-                   (row[2] == redirect_uri) and \
-                   (self._spot_scope_parse(row[3]) ==
-                        self._spot_scope_parse(scope)):
-                already_in_cache = True
-                to_write.append(
-                    [client_id,
-                    client_secret,
-                    redirect_uri,
-                    scope,
-                    access_token,
-                    refresh_token,
-                    access_token_expires])
-            else:
-                to_write.append(row)
-        if not already_in_cache:
-            to_write.append(
-                    [client_id,
-                    client_secret,
-                    redirect_uri,
-                    scope,
-                    access_token,
-                    refresh_token,
-                    access_token_expires])
-        writer = csv.writer(file_w)
-        writer.writerows(to_write)
+        start = time.perf_counter()
+        conn = self._get_credentials_db()
+        with conn:
+            self._upsert_spotify_auth_code_connection(
+                conn,
+                client_id,
+                client_secret,
+                redirect_uri,
+                scope,
+                access_token,
+                refresh_token,
+                access_token_expires)
+        self._observe('credentials', 'store', start)
+
+    def _upsert_spotify_auth_code_connection(
+        self,
+        conn: sqlite3.Connection,
+        client_id: str,
+        client_secret: str,
+        redirect_uri: str,
+        scope: str,
+        access_token: str,
+        refresh_token: str,
+        access_token_expires: str
+        ):
+        """
+        inserts or replaces the credentials for the given client info, the 
+        caller is responsible for the transaction
+        """
+        conn.execute(
+            "INSERT INTO spotify_auth_code (client_id, redirect_uri, scope, "
+            "client_secret, access_token, refresh_token, access_token_expires) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (client_id, redirect_uri, scope) DO UPDATE SET "
+            "client_secret = excluded.client_secret, "
+            "access_token = excluded.access_token, "
+            "refresh_token = excluded.refresh_token, "
+            "access_token_expires = excluded.access_token_expires",
+            (client_id,
+            redirect_uri,
+            self._spot_scope_key(scope),
+            client_secret,
+            access_token,
+            refresh_token,
+            str(access_token_expires)))
 
     def _spot_scope_parse(self, scope: str):
         """
@@ -65,27 +430,91 @@ class CacheHandler:
         """
         return set(scope.split(" "))
 
+    def _spot_scope_key(self, scope: str) -> str:
+        """
+        Normalizes a string of Spotify scopes so that equal sets of scopes 
+        give equal strings
+        """
+        return " ".join(sorted(self._spot_scope_parse(scope)))
+
     def _get_spotify_auth_code_connection(
         self,
         client_id: str,
         client_secret: str,
         redirect_uri: str,
-        scope: list[str],
+        scope: str,
             ):
         """
         given Spotify Auth Code Flow client info, looks for credentials in the 
         cache
         """
-        try:
-            file = open("{}/{}".format(self._folder, "sacc.csv"), 'r')
-            reader = csv.reader(file)
-            for row in reader:
-                if (row[0] == client_id) and \
-                   (row[1] == client_secret) and \
-                   (row[2] == redirect_uri) and \
-                   (self._spot_scope_parse(row[3]) ==
-                        self._spot_scope_parse(scope)):
-                    return row[4], row[5], row[6]
-            return None
-        except IOError:
-            return None
+        start = time.perf_counter()
+        row = self._get_credentials_db().execute(
+            "SELECT access_token, refresh_token, access_token_expires "
+            "FROM spotify_auth_code WHERE client_id = ? AND redirect_uri = ? "
+            "AND scope = ? AND client_secret = ?",
+            (client_id,
+            redirect_uri,
+            self._spot_scope_key(scope),
+            client_secret)).fetchone()
+        self._observe(
+            'credentials', 'get', start, int(row is not None), int(row is None))
+        return row
+
+    def _store_spotify_user(
+        self,
+        client_id: str,
+        user_key: str,
+        scope: str,
+        access_token: str,
+        refresh_token: str,
+        access_token_expires: float) -> None:
+        """
+        given a Spotify App client id and the key a ConnectionManager knows a 
+        user by, stores the user's credentials. access_token_expires is in 
+        seconds since the epoch
+        """
+        start = time.perf_counter()
+        conn = self._get_credentials_db()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO spotify_users (client_id, user_key, "
+                "scope, access_token, refresh_token, access_token_expires) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (client_id,
+                user_key,
+                self._spot_scope_key(scope),
+                access_token,
+                refresh_token,
+                access_token_expires))
+        self._observe('users', 'store', start)
+
+    def _get_spotify_user(self, client_id: str, user_key: str) -> tuple:
+        """
+        given a Spotify App client id and a user key, returns the user's 
+        (scope, access_token, refresh_token, access_token_expires), or None 
+        if no credentials are stored
+        """
+        start = time.perf_counter()
+        row = self._get_credentials_db().execute(
+            "SELECT scope, access_token, refresh_token, access_token_expires "
+            "FROM spotify_users WHERE client_id = ? AND user_key = ?",
+            (client_id, user_key)).fetchone()
+        self._observe(
+            'users', 'get', start, int(row is not None), int(row is None))
+        return row
+
+    def _remove_spotify_user(self, client_id: str, user_key: str) -> bool:
+        """
+        given a Spotify App client id and a user key, removes the user's 
+        credentials and returns whether there were any
+        """
+        start = time.perf_counter()
+        conn = self._get_credentials_db()
+        with conn:
+            removed = conn.execute(
+                "DELETE FROM spotify_users WHERE client_id = ? AND "
+                "user_key = ?",
+                (client_id, user_key)).rowcount
+        self._observe('users', 'remove', start)
+        return removed > 0
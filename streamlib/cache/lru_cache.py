@@ -0,0 +1,120 @@
+from collections import OrderedDict
+from sys import getsizeof
+import threading
+
+# stored in place of a value to remember that a lookup found nothing
+NOT_FOUND = object()
+
+class LRUCache:
+
+    def __init__(self, max_entries: int = None, max_bytes: int = None):
+        """
+        constructor for LRUCache object, a thread-safe in-memory cache which
+        evicts its least recently used entries once it holds more than
+        max_entries entries or approximately max_bytes bytes, this should not
+        be accessed directly
+        """
+        self._max_entries = max_entries
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _get(self, key, default=None):
+        """
+        returns the value stored for key and marks it as recently used, or
+        default if key isn't in the cache
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+    def _put(self, key, value) -> None:
+        """
+        stores value for key, evicting the least recently used entries if the
+        cache is over its bounds
+        """
+        size = 0 if self._max_bytes is None else self._sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > 1 and (
+                    (self._max_entries is not None and
+                        len(self._entries) > self._max_entries) or
+                    (self._max_bytes is not None and
+                        self._bytes > self._max_bytes)):
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self._evictions += 1
+
+    def _clear(self) -> None:
+        """
+        removes every entry from the cache, the counters are kept
+        """
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _stats(self) -> dict:
+        """
+        returns the hit, miss and eviction counters along with the current
+        size of the cache
+        """
+        with self._lock:
+            return {
+                'hits': self._hits,
+                'misses': self._misses,
+                'evictions': self._evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+    def _sizeof(self, value, seen: set = None) -> int:
+        """
+        approximates the memory used by value and every object it references, 
+        except songs, albums and artists referenced by it. Those are shared 
+        through the identity map, so only the stored object's own fields are 
+        counted
+        """
+        if seen is None:
+            seen = set()
+        elif hasattr(type(value), '__slots__'):
+            return 0
+        if id(value) in seen:
+            return 0
+        seen.add(id(value))
+        size = getsizeof(value)
+        if isinstance(value, dict):
+            for k, v in value.items():
+                size += self._sizeof(k, seen) + self._sizeof(v, seen)
+        elif isinstance(value, (list, tuple, set)):
+            for v in value:
+                size += self._sizeof(v, seen)
+        elif hasattr(value, '__dict__'):
+            size += self._sizeof(value.__dict__, seen)
+        else:
+            for cls in type(value).__mro__:
+                for slot in getattr(cls, '__slots__', ()):
+                    # private slots reference shared state, except the raw 
+                    # JSON held by lazy objects
+                    if slot.startswith('_') and slot != '_json':
+                        continue
+                    try:
+                        # reading the slot descriptor directly doesn't 
+                        # materialize fields of lazy objects
+                        attr = cls.__dict__[slot].__get__(value, cls)
+                    except AttributeError:
+                        continue
+                    size += self._sizeof(attr, seen)
+        return size
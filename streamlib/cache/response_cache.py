@@ -0,0 +1,56 @@
+from typing import Any, Callable
+from .cache_handler import CacheHandler
+from .lru_cache import LRUCache
+
+class ResponseCache:
+
+    def __init__(
+        self,
+        max_entries: int = 1000,
+        cache_handler: CacheHandler = None):
+        """
+        constructor for ResponseCache object, which remembers the ETag, body
+        and parsed JSON of GET responses so repeated requests can be sent
+        with If-None-Match. The most recently used max_entries responses are
+        kept in memory, and if a cache_handler is given every response is
+        also stored on disk and survives restarts, this should not be
+        accessed directly
+        """
+        self._entries = LRUCache(max_entries=max_entries)
+        self._cache_handler = cache_handler
+
+    def _get(self, key: str) -> tuple:
+        """
+        returns the cached (etag, body, parsed JSON) for key, parsed is None
+        until the body is first parsed. None if nothing is cached
+        """
+        entry = self._entries._get(key)
+        if entry is None and self._cache_handler is not None:
+            row = self._cache_handler._get_response(key)
+            if row is not None:
+                entry = (row[0], row[1], None)
+                self._entries._put(key, entry)
+        return entry
+
+    def _parsed(
+        self,
+        key: str,
+        entry: tuple,
+        loads: Callable[[bytes], Any]):
+        """
+        returns the parsed JSON of an entry returned by _get, the body is
+        only parsed the first time
+        """
+        etag, body, parsed = entry
+        if parsed is None:
+            parsed = loads(body)
+            self._entries._put(key, (etag, body, parsed))
+        return parsed
+
+    def _put(self, key: str, etag: str, body: bytes, parsed) -> None:
+        """
+        stores a response and its parsed JSON for key
+        """
+        self._entries._put(key, (etag, body, parsed))
+        if self._cache_handler is not None:
+            self._cache_handler._store_response(key, etag, body)
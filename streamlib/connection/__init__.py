@@ -1,3 +1,38 @@
-from .spotify_auth import SpotifyAuthCode
-from .connection_object import ConnectionObject
-from .spotify_api import SpotifyAPI
+from importlib import import_module
+from typing import TYPE_CHECKING
+
+# public names and the modules they're imported from on first access, so
+# importing ConnectionObject doesn't import aiohttp
+_EXPORTS = {
+    'SpotifyAuthCode': '.spotify_auth',
+    'ConnectionObject': '.connection_object',
+    'SpotifyAPI': '.spotify_api',
+    'AsyncConnectionObject': '.async_connection_object',
+    'ConnectionManager': '.connection_manager',
+    'Transport': '.transport',
+    'RequestsTransport': '.transport',
+    'HttpxTransport': '.transport',
+}
+
+__all__ = list(_EXPORTS)
+
+if TYPE_CHECKING:
+    from .spotify_auth import SpotifyAuthCode
+    from .connection_object import ConnectionObject
+    from .spotify_api import SpotifyAPI
+    from .async_connection_object import AsyncConnectionObject
+    from .connection_manager import ConnectionManager
+    from .transport import Transport, RequestsTransport, HttpxTransport
+
+
+def __getattr__(name: str):
+    if name not in _EXPORTS:
+        raise AttributeError(
+            "module {!r} has no attribute {!r}".format(__name__, name))
+    value = getattr(import_module(_EXPORTS[name], __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> list:
+    return sorted(set(globals()) | set(__all__))
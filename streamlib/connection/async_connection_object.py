@@ -0,0 +1,381 @@
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Callable, Collection
+from streamlib.connection.connection_object import ConnectionObject
+from streamlib.connection.exporter import Exporter, DEFAULT_MAX_PENDING_PAGES
+from streamlib.connection.async_spotify_api import AsyncSpotifyAPI
+from streamlib.connection.async_write_queue import AsyncWriteQueue
+from streamlib.connection.spotify_api import BASE_URL as SPOTIFY_API_URL
+from streamlib.connection.spotify_auth import BASE_URL as SPOTIFY_TOKEN_URL
+from streamlib.connection.transport import Transport, DEFAULT_TIMEOUT
+from streamlib.connection.write_queue import SAVE, REMOVE
+from streamlib.metrics.metrics import Metrics
+from streamlib.objects.song import Song
+
+
+class AsyncConnectionObject(ConnectionObject):
+
+    _spotify_api_class = AsyncSpotifyAPI
+    _write_queue_class = AsyncWriteQueue
+
+    def __init__(
+            self,
+            cache_folder: str = "streamlib_cache",
+            max_workers: int = 8,
+            metadata_ttl: float = 86400,
+            memory_cache_entries: int = 10000,
+            memory_cache_bytes: int = None,
+            requests_per_second: float = None,
+            endpoint_requests_per_second: dict[str, float] = None,
+            lazy: bool = False,
+            json_decoder: Callable[[bytes], Any] = None,
+            search_cache_entries: int = 10000,
+            saved_index_max_age: float = None,
+            write_behind_window: float = 1,
+            metrics: Metrics = None,
+            spotify_api_url: str = SPOTIFY_API_URL,
+            spotify_token_url: str = SPOTIFY_TOKEN_URL,
+            transport: Transport = None,
+            pool_size: int = None,
+            timeout: float = DEFAULT_TIMEOUT,
+            response_cache_entries: int = None,
+            persist_responses: bool = False):
+        """
+        Constructor for AsyncConnectionObject object. This object offers the
+        functionality of ConnectionObject as coroutines, so a single event
+        loop can keep many requests in flight. It requires aiohttp to be
+        installed. Authentication is set up with spotify_auth_code like on a
+        ConnectionObject.
+
+        params:
+
+        The same as for ConnectionObject, max_workers is the maximum number
+        of requests in flight at once. Requests to the Web API are sent with
+        aiohttp using the pool size, timeout and compression of the
+        transport, which also sends the token requests
+        """
+        super().__init__(
+            cache_folder=cache_folder,
+            max_workers=max_workers,
+            metadata_ttl=metadata_ttl,
+            memory_cache_entries=memory_cache_entries,
+            memory_cache_bytes=memory_cache_bytes,
+            requests_per_second=requests_per_second,
+            endpoint_requests_per_second=endpoint_requests_per_second,
+            lazy=lazy,
+            json_decoder=json_decoder,
+            search_cache_entries=search_cache_entries,
+            saved_index_max_age=saved_index_max_age,
+            write_behind_window=write_behind_window,
+            metrics=metrics,
+            spotify_api_url=spotify_api_url,
+            spotify_token_url=spotify_token_url,
+            transport=transport,
+            pool_size=pool_size,
+            timeout=timeout,
+            response_cache_entries=response_cache_entries,
+            persist_responses=persist_responses)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self) -> None:
+        """
+        This method writes every queued song and then closes the connections 
+        held by this object. It is called automatically when the object is 
+        used with 'async with'
+        """
+        await self._write_queue._close()
+        if self._spotify_auth is not None:
+            self._spotify_auth._stop_background_refresh()
+        await self._spotify_connection._close()
+
+    async def _get_access_token(self) -> str:
+        """
+        returns the access token, refreshing it on a worker thread if it has
+        expired so the event loop is never blocked
+        """
+        if not self._spotify_auth._needs_refresh():
+            return self._spotify_auth._access_token
+        return await asyncio.to_thread(self._spotify_auth._get_access_token)
+
+    ## METHODS FOR COMMUNICATING WITH APIS ##
+
+    ### SPOTIFY ###
+
+    async def spotify_get_song_by_id(self, id: str) -> Song:
+        """
+        This coroutine takes a Spotify Song ID and creates a Song object for
+        that song, see ConnectionObject.spotify_get_song_by_id
+        """
+        return await self._spotify_connection._get_song_by_id(
+            id,
+            await self._get_access_token())
+
+    async def spotify_get_songs_by_id(self, ids: list[str]) -> list[Song]:
+        """
+        This coroutine takes a list of Spotify Song IDs and returns a list of
+        Song objects for those songs, see
+        ConnectionObject.spotify_get_songs_by_id
+        """
+        return await self._spotify_connection._get_songs_by_id(
+            ids,
+            await self._get_access_token())
+
+    async def spotify_get_saved_songs(self) -> list[Song]:
+        """
+        This coroutine returns a list of Song objects the user has saved on
+        Spotify
+        """
+        return await self._spotify_connection._get_saved_songs(
+            await self._get_access_token())
+
+    async def spotify_iter_saved_songs(self) -> AsyncIterator[Song]:
+        """
+        This method returns an async iterator over the Song objects the user
+        has saved on Spotify, see ConnectionObject.spotify_iter_saved_songs
+        """
+        async for song in self._spotify_connection._iter_saved_songs(
+                self._get_access_token):
+            yield song
+
+    async def spotify_export_saved_songs(
+        self,
+        path: str,
+        format: str = None,
+        max_pending_pages: int = DEFAULT_MAX_PENDING_PAGES) -> int:
+        """
+        This coroutine writes the songs the user has saved on Spotify to a
+        file as they are fetched, see
+        ConnectionObject.spotify_export_saved_songs. Waiting for the writer
+        doesn't block the event loop
+        """
+        exporter = Exporter(path, format, max_pending_pages)
+        try:
+            async for items in self._spotify_connection._iter_saved_pages(
+                    self._get_access_token):
+                await asyncio.to_thread(
+                    exporter._put,
+                    [item['track'] for item in items],
+                    [item['added_at'] for item in items])
+        except BaseException:
+            await asyncio.to_thread(exporter._abort)
+            raise
+        return await asyncio.to_thread(exporter._finish)
+
+    async def spotify_export_songs_by_id(
+        self,
+        ids: Collection[str],
+        path: str,
+        format: str = None,
+        max_pending_pages: int = DEFAULT_MAX_PENDING_PAGES) -> int:
+        """
+        This coroutine writes the songs with the given Spotify IDs to a file
+        as they are fetched, see ConnectionObject.spotify_export_songs_by_id
+        """
+        exporter = Exporter(path, format, max_pending_pages)
+        try:
+            async for tracks in self._spotify_connection._iter_tracks_json(
+                    list(ids), self._get_access_token):
+                await asyncio.to_thread(exporter._put, tracks)
+        except BaseException:
+            await asyncio.to_thread(exporter._abort)
+            raise
+        return await asyncio.to_thread(exporter._finish)
+
+    async def spotify_save_songs_by_id(self, songs: Collection[str]) -> bool:
+        """
+        This coroutine takes a list of Spotify song IDs and adds them to the
+        logged in user's saved songs. On success True is returned
+        """
+        songs = list(songs)
+        result = await self._spotify_connection._add_saved_songs(
+            songs,
+            await self._get_access_token())
+        await self._update_saved_index(added=songs)
+        return result
+
+    async def spotify_removed_saved_songs_by_id(
+        self,
+        songs: Collection[str]) -> bool:
+        """
+        This coroutine takes a list of Spotify song IDs and removes them from
+        the logged in user's saved songs. On success True is returned
+        """
+        songs = list(songs)
+        result = await self._spotify_connection._remove_saved_songs(
+            songs,
+            await self._get_access_token())
+        await self._update_saved_index(removed=songs)
+        return result
+
+    async def spotify_queue_save_songs_by_id(
+        self,
+        songs: Collection[str]) -> list[asyncio.Future]:
+        """
+        This coroutine takes a list of Spotify song IDs and queues them to be
+        added to the logged in user's saved songs, see
+        ConnectionObject.spotify_queue_save_songs_by_id. The returned
+        asyncio Futures can be awaited
+        """
+        return [self._write_queue._enqueue(SAVE, id) for id in songs]
+
+    async def spotify_queue_remove_saved_songs_by_id(
+        self,
+        songs: Collection[str]) -> list[asyncio.Future]:
+        """
+        This coroutine takes a list of Spotify song IDs and queues them to be
+        removed from the logged in user's saved songs, see
+        ConnectionObject.spotify_queue_remove_saved_songs_by_id
+        """
+        return [self._write_queue._enqueue(REMOVE, id) for id in songs]
+
+    async def spotify_flush_saved_songs(self) -> dict:
+        """
+        This coroutine writes every queued song now, see
+        ConnectionObject.spotify_flush_saved_songs
+        """
+        return await self._write_queue._flush()
+
+    async def _write_saved_songs(self, action: str, songs: list[str]) -> None:
+        """
+        writes a batch of queued songs to Spotify and the saved songs index
+        """
+        if action == SAVE:
+            await self.spotify_save_songs_by_id(songs)
+        else:
+            await self.spotify_removed_saved_songs_by_id(songs)
+
+    async def spotify_check_saved_songs_by_id(
+        self,
+        songs: Collection[str]) -> list[bool]:
+        """
+        This coroutine takes a list of Spotify song IDs and returns a list of
+        booleans indicating if each song is saved, see
+        ConnectionObject.spotify_check_saved_songs_by_id
+        """
+        songs = list(songs)
+        if self._saved_index_max_age is not None:
+            user_id = await self._get_spotify_user_id()
+            age = await asyncio.to_thread(
+                self._cache_handler._get_saved_index_age, user_id)
+            if age is not None and age <= self._saved_index_max_age:
+                return await asyncio.to_thread(
+                    self._cache_handler._check_saved_tracks, user_id, songs)
+        return await self._spotify_connection._check_saved_songs(
+            songs,
+            await self._get_access_token())
+
+    async def spotify_build_saved_index(self) -> int:
+        """
+        This coroutine stores the IDs of every song the logged in user has
+        saved in a local index, see ConnectionObject.spotify_build_saved_index
+        """
+        items = await self._spotify_connection._get_saved_song_ids(
+            await self._get_access_token())
+        await asyncio.to_thread(
+            self._cache_handler._replace_saved_tracks,
+            await self._get_spotify_user_id(),
+            items)
+        return len(items)
+
+    async def spotify_sync_saved_songs(
+        self,
+        full: bool = False) -> tuple[list[str], list[str]]:
+        """
+        This coroutine brings the local saved songs index up to date and
+        returns the lists of added and removed song IDs, see
+        ConnectionObject.spotify_sync_saved_songs
+        """
+        user_id = await self._get_spotify_user_id()
+        added = []
+        token = await self._get_access_token()
+        if not full and await asyncio.to_thread(
+                self._cache_handler._get_saved_index_age, user_id) is not None:
+            items, total = \
+                await self._spotify_connection._get_saved_song_ids_since(
+                    await asyncio.to_thread(
+                        self._cache_handler._get_saved_watermark, user_id),
+                    token)
+            added = await asyncio.to_thread(
+                self._cache_handler._merge_saved_tracks, user_id, items)
+            known = await asyncio.to_thread(
+                self._cache_handler._get_saved_track_ids, user_id)
+            if total == len(known):
+                return added, []
+        reconciled, removed = await asyncio.to_thread(
+            self._reconcile_saved_index,
+            user_id,
+            await self._spotify_connection._get_saved_song_ids(token))
+        return added + reconciled, removed
+
+    async def _update_saved_index(
+        self,
+        added: list[str] = (),
+        removed: list[str] = ()) -> None:
+        """
+        applies songs saved or removed through this object to the local saved
+        songs index, see ConnectionObject._update_saved_index
+        """
+        if self._spotify_user_id is None and self._saved_index_max_age is None:
+            return
+        user_id = await self._get_spotify_user_id()
+        if len(added) > 0:
+            added_at = datetime.now(timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%SZ")
+            await asyncio.to_thread(
+                self._cache_handler._add_saved_tracks,
+                user_id,
+                [(id, added_at) for id in added])
+        if len(removed) > 0:
+            await asyncio.to_thread(
+                self._cache_handler._remove_saved_tracks, user_id, removed)
+
+    async def _get_spotify_user_id(self) -> str:
+        """
+        returns the Spotify id of the logged in user, requesting it once per
+        login
+        """
+        if self._spotify_user_id is None:
+            self._spotify_user_id = await self._spotify_connection._get_user_id(
+                await self._get_access_token())
+        return self._spotify_user_id
+
+    async def spotify_populate_song(self, song: Song) -> Song:
+        """
+        This coroutine takes a Song object and returns a populated Song
+        object based on the currently available information in the object
+        """
+        if song.spotify_id is not None:
+            return await self.spotify_get_song_by_id(song.spotify_id)
+        else:
+            return await self._spotify_connection._search_song(
+                song,
+                await self._get_access_token())
+
+    async def spotify_hydrate(
+        self,
+        songs: list[Song],
+        artists: bool = True,
+        albums: bool = True) -> list[Song]:
+        """
+        This coroutine fills in the artists and albums of a list of Song 
+        objects, see ConnectionObject.spotify_hydrate
+        """
+        return await self._spotify_connection._hydrate(
+            list(songs),
+            await self._get_access_token(),
+            artists,
+            albums)
+
+    async def spotify_populate_songs(self, songs: list[Song]) -> list[Song]:
+        """
+        This coroutine takes a list of Song objects and returns a list of
+        populated Song objects, see ConnectionObject.spotify_populate_songs
+        """
+        return await self._spotify_connection._populate_songs(
+            list(songs),
+            await self._get_access_token())
@@ -0,0 +1,527 @@
+import asyncio
+import time
+from typing import AsyncIterator, Awaitable, Callable
+from ..cache import CacheHandler, LRUCache, ResponseCache
+from ..metrics import Metrics
+from ..objects import Song, IdentityMap
+from .rate_limiter import RateLimiter
+from .transport import Transport
+from .spotify_api import SpotifyAPI, MAX_TRACK_IDS, MAX_SAVED_PAGE, BASE_URL, \
+    HYDRATE_ENDPOINTS, MAX_ALBUM_TRACKS_PAGE
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+class AsyncSpotifyAPI(SpotifyAPI):
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        cache_handler: CacheHandler = None,
+        memory_cache: LRUCache = None,
+        rate_limiter: RateLimiter = None,
+        identity_map: IdentityMap = None,
+        lazy: bool = False,
+        json_decoder: Callable = None,
+        search_cache: LRUCache = None,
+        metrics: Metrics = None,
+        base_url: str = BASE_URL,
+        transport: Transport = None,
+        response_cache: ResponseCache = None):
+        """
+        an asyncio wrapper object for the Spotify API on top of a pooled
+        aiohttp client, it shares the parsing and caching of SpotifyAPI, this
+        should not be accessed directly
+        """
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncSpotifyAPI requires aiohttp, install it with "
+                "'pip install aiohttp'")
+        super().__init__(
+            max_workers,
+            cache_handler,
+            memory_cache,
+            rate_limiter,
+            identity_map,
+            lazy,
+            json_decoder,
+            search_cache,
+            metrics,
+            base_url,
+            transport,
+            response_cache)
+        self._client = None
+
+    def _get_client(self):
+        """
+        lazily creates the aiohttp client, it has to be created inside the
+        running event loop. Its pool size, timeout and compression follow 
+        the transport
+        """
+        if self._client is None:
+            self._client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self._transport._pool_size),
+                timeout=aiohttp.ClientTimeout(
+                    sock_connect=self._transport._timeout,
+                    sock_read=self._transport._timeout))
+        return self._client
+
+    async def _close(self) -> None:
+        """
+        closes the aiohttp client and its connections
+        """
+        if self._client is not None:
+            await self._client.close()
+            self._client = None
+
+    async def _request_json(
+        self,
+        method: str,
+        endpoint: str,
+        url: str,
+        token: str,
+        params: dict = None):
+        """
+        sends a request through the rate limiter, retrying it after 429 and
+        5xx responses, and returns its JSON body or None if it has none. GET
+        requests are revalidated with the response cache, see
+        SpotifyAPI._get_json
+        """
+        headers = self._gen_header(token)
+        key = None
+        entry = None
+        if method == 'GET' and self._response_cache is not None and \
+                endpoint != 'me':
+            user_id = await self._get_user_id(token) \
+                if endpoint.startswith('me/') else None
+            key = self._response_key(endpoint, url, user_id, params)
+            entry = await self._in_thread(
+                self._response_cache._get,
+                key,
+                on_disk=self._response_cache._cache_handler is not None)
+            if entry is not None:
+                headers['If-None-Match'] = entry[0]
+        attempt = 0
+        while True:
+            await self._rate_limiter._acquire_async(endpoint)
+            status = None
+            retry_after = None
+            etag = None
+            body = b''
+            start = time.perf_counter()
+            try:
+                async with self._get_client().request(
+                        method,
+                        url,
+                        params=params,
+                        headers=self._transport._headers(headers)) as res:
+                    status = res.status
+                    retry_after = res.headers.get('Retry-After')
+                    etag = res.headers.get('ETag')
+                    body = await res.read()
+            finally:
+                self._rate_limiter._release(status, retry_after)
+                self._metrics._observe_request(
+                    endpoint,
+                    method,
+                    status,
+                    time.perf_counter() - start,
+                    len(body))
+            if not self._rate_limiter._should_retry(status, attempt):
+                if status == 304 and entry is not None:
+                    return self._response_cache._parsed(
+                        key, entry, self._loads)
+                try:
+                    data = self._loads(body) if body else None
+                except ValueError:
+                    message = "Spotify API returned a response to " \
+                    + endpoint + " which isn't JSON with status code " \
+                    + str(status)
+                    raise RuntimeError(message)
+                if key is not None and status == 200 and etag is not None:
+                    await self._in_thread(
+                        self._response_cache._put,
+                        key,
+                        etag,
+                        body,
+                        data,
+                        on_disk=self._response_cache._cache_handler is not None)
+                return data
+            if status != 429 or retry_after is None:
+                await asyncio.sleep(self._rate_limiter._backoff(attempt))
+            attempt += 1
+
+    async def _in_thread(
+        self,
+        function: Callable,
+        *args,
+        on_disk: bool = None):
+        """
+        calls function, which reads or writes the on-disk cache, on a worker
+        thread so SQLite never blocks the event loop. If on_disk is False, or
+        it is None and there is no on-disk cache, it is called directly
+        """
+        if on_disk is None:
+            on_disk = self._cache_handler is not None
+        if not on_disk:
+            return function(*args)
+        return await asyncio.to_thread(function, *args)
+
+    async def _get_song_by_id(self, id: str, token: str) -> Song:
+        """
+        given a song id and an access token, calls the API and with the
+        returned JSON creates a Song object
+        """
+        song = await self._in_thread(self._get_cached_song, id)
+        if song is not None:
+            return song
+        res = await self._request_json(
+            'GET',
+            'tracks',
+            "{}tracks/{}".format(self._base_url, id),
+            token)
+        return await self._in_thread(self._song_from_response, id, res)
+
+    async def _get_songs_by_id(self, ids: list[str], token: str) -> list[Song]:
+        """
+        given a list of song ids and an access token, calls the API and with
+        the returned JSON creates a list of Song objects, see
+        SpotifyAPI._get_songs_by_id
+        """
+        if len(ids) == 0:
+            return []
+        songs = self._get_memory_cached_songs(ids)
+        missing = [id for id in dict.fromkeys(ids) if id not in songs]
+        if len(missing) > 0:
+            self._add_fetched_songs(
+                songs, missing, await self._get_tracks_json(missing, token))
+        return [songs[id] for id in ids]
+
+    async def _get_tracks_json(self, ids: list[str], token: str) -> dict:
+        """
+        returns a dict from each of the given ids to its track JSON, or None
+        if Spotify could not find it, requesting every chunk concurrently
+        """
+        tracks = await self._in_thread(self._get_cached_metadata, 'track', ids)
+        missing = [id for id in dict.fromkeys(ids) if id not in tracks]
+        chunks = self._chunk(missing, MAX_TRACK_IDS)
+        results = await asyncio.gather(
+            *(self._get_tracks_chunk(chunk, token) for chunk in chunks))
+        await self._in_thread(
+            self._merge_fetched_tracks, tracks, chunks, results)
+        return tracks
+
+    async def _iter_tracks_json(
+        self,
+        ids: list[str],
+        get_token: Callable[[], Awaitable[str]]) -> AsyncIterator[list[dict]]:
+        """
+        yields the track JSON of ids a chunk of MAX_TRACK_IDS at a time, in
+        order and with None for ids Spotify could not find, requesting
+        max_workers chunks at once. get_token is awaited for each window of
+        chunks
+        """
+        chunks = self._chunk(list(ids), MAX_TRACK_IDS)
+        for i in range(0, len(chunks), self._max_workers):
+            window = chunks[i:i + self._max_workers]
+            token = await get_token()
+            results = await asyncio.gather(
+                *(self._get_tracks_json(chunk, token) for chunk in window))
+            for chunk, tracks in zip(window, results):
+                yield [tracks[id] for id in chunk]
+
+    async def _get_tracks_chunk(self, ids: list[str], token: str) -> list[dict]:
+        """
+        fetches the JSON of at most MAX_TRACK_IDS songs in a single API call
+        """
+        res = await self._request_json(
+            'GET',
+            'tracks',
+            "{}tracks/?ids={}".format(self._base_url, ','.join(ids)),
+            token)
+        return self._tracks_from_response(ids, res)
+
+    async def _hydrate(
+        self,
+        songs: list[Song],
+        token: str,
+        artists: bool = True,
+        albums: bool = True) -> list[Song]:
+        """
+        fills in the artists and albums of the given songs, requesting every 
+        chunk concurrently, see SpotifyAPI._hydrate
+        """
+        targets = self._hydration_targets(songs, artists, albums)
+        found, requests = await self._in_thread(
+            self._hydration_requests, targets)
+        results = await asyncio.gather(
+            *(self._get_hydration_chunk(kind, chunk, token)
+              for kind, chunk in requests))
+        fetched = self._fetched_by_kind(requests, results)
+        pages = self._album_track_pages(self._incomplete_albums(fetched))
+        results = await asyncio.gather(*(
+            self._get_album_tracks_page(album, offset, token)
+            for album, offset in pages))
+        for (album, _), items in zip(pages, results):
+            album['tracks']['items'].extend(items)
+        await self._in_thread(self._store_hydrated, found, fetched)
+        self._attach_hydrated(songs, targets, found)
+        return songs
+
+    async def _get_album_tracks_page(
+        self,
+        album: dict,
+        offset: int,
+        token: str) -> list[dict]:
+        """
+        fetches a page of an album's songs, see
+        SpotifyAPI._get_album_tracks_page
+        """
+        return (await self._get_page(
+            'albums/tracks',
+            "{}albums/{}/tracks".format(self._base_url, album['id']),
+            token,
+            {'offset': offset, 'limit': MAX_ALBUM_TRACKS_PAGE}))['items']
+
+    async def _get_hydration_chunk(
+        self,
+        kind: str,
+        ids: list[str],
+        token: str) -> list[dict]:
+        """
+        fetches the JSON of a chunk of artists or albums in a single API call
+        """
+        endpoint = HYDRATE_ENDPOINTS[kind][0]
+        res = await self._request_json(
+            'GET',
+            endpoint,
+            "{}{}?ids={}".format(self._base_url, endpoint, ','.join(ids)),
+            token)
+        return self._hydration_from_response(kind, ids, res)
+
+    async def _get_saved_songs(self, token: str) -> list[Song]:
+        """
+        gets saved songs for Spotify user
+        """
+        return await self._get_all_pages(
+            "me/tracks",
+            token,
+            MAX_SAVED_PAGE,
+            lambda items: self._create_songs(item['track'] for item in items))
+
+    async def _get_page(
+        self,
+        endpoint: str,
+        url: str,
+        token: str,
+        params: dict = None) -> dict:
+        """
+        gets a single page of a paginated endpoint
+        """
+        res = await self._request_json('GET', endpoint, url, token, params)
+        return self._page_from_response(url, res)
+
+    async def _get_all_pages(
+        self,
+        endpoint: str,
+        token: str,
+        limit: int,
+        parse: Callable[[list], list] = None,
+        params: dict = None) -> list:
+        """
+        gets every item of a paginated endpoint, requesting every page after
+        the first concurrently by offset, see SpotifyAPI._get_all_pages
+        """
+        if parse is None:
+            parse = list
+        url = "{}{}".format(self._base_url, endpoint)
+        first = await self._get_page(
+            endpoint, url, token, dict(params or {}, offset=0, limit=limit))
+        step = first.get('limit') or limit
+        pages = await asyncio.gather(*(
+            self._get_page(
+                endpoint,
+                url,
+                token,
+                dict(params or {}, offset=offset, limit=limit))
+            for offset in range(step, first['total'], step)))
+        ret_list = parse(first['items'])
+        for page in pages:
+            ret_list.extend(parse(page['items']))
+        return ret_list
+
+    async def _iter_saved_song_pages(
+        self,
+        get_token: Callable[[], Awaitable[str]]) -> AsyncIterator[list[Song]]:
+        """
+        yields the user's saved songs a page at a time, the next page is
+        requested while the current one is consumed. get_token is awaited
+        for every page
+        """
+        async for items in self._iter_saved_pages(get_token):
+            yield self._create_songs(item['track'] for item in items)
+
+    async def _iter_saved_pages(
+        self,
+        get_token: Callable[[], Awaitable[str]]) -> AsyncIterator[list[dict]]:
+        """
+        yields the items of each page of the user's saved songs, requesting
+        the next page while the current one is consumed
+        """
+        task = asyncio.ensure_future(self._get_page(
+            'me/tracks',
+            "{}me/tracks".format(self._base_url),
+            await get_token(),
+            {'limit': MAX_SAVED_PAGE}))
+        try:
+            while task is not None:
+                res = await task
+                if res['next'] is not None:
+                    task = asyncio.ensure_future(self._get_page(
+                        'me/tracks', res['next'], await get_token()))
+                else:
+                    task = None
+                yield res['items']
+        finally:
+            if task is not None:
+                task.cancel()
+
+    async def _iter_saved_songs(
+        self,
+        get_token: Callable[[], Awaitable[str]]) -> AsyncIterator[Song]:
+        """
+        yields the user's saved songs one at a time
+        """
+        async for page in self._iter_saved_song_pages(get_token):
+            for song in page:
+                yield song
+
+    async def _get_saved_song_ids_since(
+        self,
+        watermark: str,
+        token: str) -> tuple[list[tuple], int]:
+        """
+        gets (song id, added_at) for the songs the user saved at or after
+        watermark, see SpotifyAPI._get_saved_song_ids_since
+        """
+        url = "{}me/tracks".format(self._base_url)
+        params = {'offset': 0, 'limit': MAX_SAVED_PAGE}
+        items = []
+        while url is not None:
+            res = await self._get_page('me/tracks', url, token, params)
+            reached = self._saved_ids_since(res['items'], watermark, items)
+            url = None if reached else res['next']
+            params = None
+        return items, res['total']
+
+    async def _get_user_id(self, token: str) -> str:
+        """
+        gets the Spotify id of the user the token belongs to, it is only
+        requested once per token
+        """
+        user_id = self._user_ids._get(token)
+        if user_id is None:
+            user_id = self._user_id_result(await self._request_json(
+                'GET',
+                'me',
+                "{}me".format(self._base_url),
+                token))
+            self._user_ids._put(token, user_id)
+        return user_id
+
+    async def _get_saved_song_ids(self, token: str) -> list[tuple]:
+        """
+        gets (song id, added_at) for every song the user has saved
+        """
+        return await self._get_all_pages(
+            "me/tracks",
+            token,
+            MAX_SAVED_PAGE,
+            lambda items:
+                [(item['track']['id'], item['added_at']) for item in items])
+
+    async def _add_saved_songs(self, songs: list[str], token: str) -> bool:
+        """
+        saves songs on spotify, lists longer than the endpoint limit are
+        split into chunks
+        """
+        for chunk in self._chunk(songs, MAX_TRACK_IDS):
+            res = await self._request_json(
+                'PUT',
+                'me/tracks',
+                "{}me/tracks/?ids={}".format(self._base_url, ','.join(chunk)),
+                token)
+            self._saved_songs_result("save songs", chunk, res)
+        return True
+
+    async def _remove_saved_songs(self, songs: list[str], token: str) -> bool:
+        """
+        removes saved songs on spotify, lists longer than the endpoint limit
+        are split into chunks
+        """
+        for chunk in self._chunk(songs, MAX_TRACK_IDS):
+            res = await self._request_json(
+                'DELETE',
+                'me/tracks',
+                "{}me/tracks/?ids={}".format(self._base_url, ','.join(chunk)),
+                token)
+            self._saved_songs_result("remove saved songs", chunk, res)
+        return True
+
+    async def _check_saved_songs(self, songs: list[str], token: str) \
+    -> list[bool]:
+        """
+        checks saved songs on spotify, checking every chunk concurrently
+        """
+        results = await asyncio.gather(*(
+            self._check_saved_chunk(chunk, token)
+            for chunk in self._chunk(songs, MAX_TRACK_IDS)))
+        return [saved for result in results for saved in result]
+
+    async def _check_saved_chunk(self, songs: list[str], token: str) \
+    -> list[bool]:
+        """
+        checks at most MAX_TRACK_IDS saved songs in a single API call
+        """
+        res = await self._request_json(
+            'GET',
+            'me/tracks/contains',
+            "{}me/tracks/contains/?ids={}".format(
+                self._base_url, ','.join(songs)),
+            token)
+        return self._check_saved_result(songs, res)
+
+    async def _search_song(self, song: Song, token: str) -> Song:
+        """
+        searchs for a song with avaialable info, the result of each distinct
+        search is remembered in the search cache
+        """
+        key = self._search_key(song)
+        if key is None:
+            return song
+        track = self._search_cache._get(key)
+        if track is None:
+            res = await self._request_json(
+                'GET',
+                'search',
+                "{}search".format(self._base_url),
+                token,
+                self._search_params(song))
+            track = await self._in_thread(self._track_from_search, song, res)
+            self._search_cache._put(key, track)
+        return self._song_from_search(song, track)
+
+    async def _populate_songs(self, songs: list[Song], token: str) \
+    -> list[Song]:
+        """
+        populates many songs at once, see SpotifyAPI._populate_songs
+        """
+        ids = [song.spotify_id for song in songs if song.spotify_id is not None]
+        found = dict(zip(ids, await self._get_songs_by_id(ids, token)))
+        await asyncio.gather(*(self._search_song(song, token)
+                               for song in self._distinct_searches(songs)))
+        return [self._populated(song, found) if song.spotify_id is not None
+                else await self._search_song(song, token) for song in songs]
@@ -0,0 +1,101 @@
+import asyncio
+from typing import Awaitable, Callable
+from streamlib.connection.write_queue import WriteQueue
+
+class AsyncWriteQueue(WriteQueue):
+
+    def __init__(
+        self,
+        write: Callable[[str, list], Awaitable[None]],
+        window: float,
+        max_batch: int):
+        """
+        constructor for AsyncWriteQueue object, the WriteQueue of
+        AsyncConnectionObject, this should not be accessed directly. write
+        is a coroutine function, intents get asyncio Futures, the window is
+        timed by the event loop and batches are written in order by a task
+        instead of a thread. It must be used from a single event loop
+        """
+        super().__init__(write, window, max_batch)
+        self._batches: asyncio.Queue = None
+        self._worker: asyncio.Task = None
+
+    def _create_future(self) -> asyncio.Future:
+        return asyncio.get_running_loop().create_future()
+
+    def _start_timer(self) -> None:
+        self._timer = asyncio.get_running_loop().call_later(
+            self._window, self._flush_pending)
+
+    def _flush_pending(self) -> None:
+        """
+        queues every pending intent for the writer task once the window is
+        over
+        """
+        with self._lock:
+            self._timer = None
+            self._submit(self._take_batch())
+
+    async def _flush(self) -> dict:
+        """
+        writes every pending intent now and returns a dict from id to its
+        outcome, or to the exception raised while writing it
+        """
+        with self._lock:
+            done = self._submit(self._take_batch())
+        return await done
+
+    async def _close(self) -> dict:
+        """
+        writes every pending intent like _flush, then stops the writer task 
+        and waits for it to finish
+        """
+        with self._lock:
+            if (self._worker is None or self._worker.done()) and \
+                    len(self._pending) == 0:
+                return {}
+            done = self._submit(self._take_batch())
+            worker = self._worker
+            self._batches.put_nowait(None)
+            self._worker = None
+        outcomes = await done
+        await worker
+        return outcomes
+
+    def _submit(self, batch: dict) -> asyncio.Future:
+        """
+        queues a batch for the writer task, starting it on first use, and
+        returns a Future for the batch's outcomes. Callers must hold the lock
+        """
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        if self._worker is None or self._worker.done():
+            self._batches = asyncio.Queue()
+            self._worker = loop.create_task(
+                self._write_batches(self._batches))
+        self._batches.put_nowait((batch, done))
+        return done
+
+    async def _write_batches(self, batches: asyncio.Queue) -> None:
+        """
+        body of the writer task, it writes batches from batches one at a time
+        until it takes the None queued by _close
+        """
+        while (item := await batches.get()) is not None:
+            batch, done = item
+            done.set_result(await self._dispatch(batch))
+
+    async def _dispatch(self, batch: dict) -> dict:
+        """
+        writes a batch of intents, at most max_batch ids per call to write,
+        and hands each outcome to its Future
+        """
+        outcomes = {}
+        for action, chunk in self._chunks(batch):
+            try:
+                await self._write(action, chunk)
+            except Exception as e:
+                self._settle(batch, chunk, outcomes, error=e)
+            else:
+                self._settle(batch, chunk, outcomes, action=action)
+        return outcomes
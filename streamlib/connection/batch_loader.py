@@ -0,0 +1,78 @@
+from concurrent.futures import Future
+from typing import Callable
+import threading
+
+class BatchLoader:
+
+    def __init__(
+        self,
+        load: Callable[[list], list],
+        window: float,
+        max_batch: int):
+        """
+        constructor for BatchLoader object, this should not be accessed
+        directly. Keys requested within window seconds of the first pending
+        key are de-duplicated and loaded together with a single call to load,
+        which takes a list of keys and returns a list of results in the same
+        order. A batch is loaded early once it holds max_batch keys
+        """
+        self._load_batch = load
+        self._window = window
+        self._max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: dict = {}
+        self._timer: threading.Timer = None
+
+    def _load(self, key) -> Future:
+        """
+        queues key to be loaded and returns a Future for its result, a key
+        which is already queued shares the queued Future
+        """
+        batch = None
+        with self._lock:
+            future = self._pending.get(key)
+            if future is None:
+                future = Future()
+                self._pending[key] = future
+                if len(self._pending) >= self._max_batch:
+                    batch = self._take_batch()
+                elif self._timer is None:
+                    self._timer = threading.Timer(self._window, self._flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+        if batch is not None:
+            self._dispatch(batch)
+        return future
+
+    def _take_batch(self) -> dict:
+        """
+        removes and returns the pending keys, callers must hold the lock
+        """
+        batch = self._pending
+        self._pending = {}
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        return batch
+
+    def _flush(self) -> None:
+        """
+        loads every pending key now
+        """
+        with self._lock:
+            batch = self._take_batch()
+        if len(batch) > 0:
+            self._dispatch(batch)
+
+    def _dispatch(self, batch: dict) -> None:
+        """
+        loads a batch of keys and hands each result to its Future
+        """
+        try:
+            results = self._load_batch(list(batch))
+        except Exception as e:
+            for future in batch.values():
+                future.set_exception(e)
+        else:
+            for future, result in zip(batch.values(), results):
+                future.set_result(result)
@@ -0,0 +1,317 @@
+from collections import OrderedDict
+from datetime import timedelta
+import threading
+import time
+from urllib.parse import urlencode
+from streamlib.connection.connection_object import ConnectionObject
+from streamlib.connection.spotify_auth import SpotifyUserAuth, ALL_SCOPES, \
+    EPOCH
+from streamlib.metrics.metrics import Metrics
+
+class ConnectionManager:
+
+    def __init__(
+            self,
+            client_id: str,
+            client_secret: str,
+            redirect_uri: str,
+            scope: list[str] = ALL_SCOPES,
+            connection: ConnectionObject = None,
+            max_loaded_users: int = 10000,
+            idle_seconds: float = 3600):
+        """
+        Constructor for ConnectionManager object, which makes Spotify API
+        calls on behalf of many users of one Spotify App, such as the users
+        of a web backend. Every user's credentials are stored in a table in
+        the cache folder, and are only loaded when a connection for that
+        user is requested. All users share the transport, rate limiter,
+        caches and metrics of a single ConnectionObject, so each loaded user
+        only costs their credentials. Ex:
+
+        manager = ConnectionManager(client_id, client_secret, redirect_uri)
+        manager.spotify_add_user_by_code('user-1', code)
+        manager.get_connection('user-1').spotify_get_saved_songs()
+
+        params:
+
+        client_id: Spotify App client id
+        client_secret: Spotify App client secret
+        redirect_uri: Spotify App redirect uri
+        (optional) scope: List of Spotify Authorization scopes requested from
+        users, read more here:
+        https://developer.spotify.com/documentation/general/guides/authorization/scopes/
+        (optional) connection: the ConnectionObject every user shares, its
+        constructor params configure the cache folder, rate limits, pool
+        size and so on. Its coalesce_window isn't used for users. By default
+        a ConnectionObject with default params is used
+        (optional) max_loaded_users: the maximum number of users whose
+        credentials are kept in memory, the least recently used user is
+        unloaded when another one is loaded. Songs an unloaded user queued
+        with spotify_queue_save_songs_by_id are written first. The default
+        value is 10000
+        (optional) idle_seconds: users are unloaded once they haven't been
+        used for this many seconds, None keeps them until max_loaded_users
+        is reached. The default value is 3600
+        """
+        self._client_id = client_id
+        self._client_secret = client_secret
+        self._redirect_uri = redirect_uri
+        self._scope = " ".join(scope)
+        self._connection = connection if connection is not None \
+            else ConnectionObject()
+        self._max_loaded_users = max_loaded_users
+        self._idle_seconds = idle_seconds
+        self._lock = threading.Lock()
+        # user key -> [ConnectionObject, time.monotonic() of last use], least
+        # recently used first
+        self._users = OrderedDict()
+
+    def get_connection(self, user_key: str) -> ConnectionObject:
+        """
+        This method returns a ConnectionObject which makes API calls on
+        behalf of a user added with spotify_add_user or
+        spotify_add_user_by_code. The user's credentials are loaded from the
+        cache on first use, after that this is a dictionary lookup. Ex:
+        manager.get_connection('user-1').spotify_check_saved_songs_by_id(ids)
+
+        params:
+
+        user_key: the key the user was added with
+
+        returns:
+
+        a ConnectionObject for the user, it shouldn't be kept after the
+        request it was fetched for, since the user may be unloaded
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._users.get(user_key)
+            if entry is not None:
+                self._users.move_to_end(user_key)
+                entry[1] = now
+                evicted = self._evict(now)
+        if entry is not None:
+            self._close(evicted)
+            return entry[0]
+        connection = self._load_user(user_key)
+        if connection is None:
+            error_message = \
+                "No Spotify credentials are stored for the user " + \
+                "'{}', add them with spotify_add_user".format(user_key)
+            raise RuntimeError(error_message)
+        return self._insert(user_key, connection, now)
+
+    def spotify_get_authorize_url(self, state: str) -> str:
+        """
+        This method returns the Spotify URL to send a user to so they can
+        allow the Spotify App the requested scopes. Spotify then redirects
+        them to the redirect uri with a code, which is passed to
+        spotify_add_user_by_code.
+
+        params:
+
+        state: a value which is returned with the redirect, for checking
+        that the redirect answers this request
+
+        returns:
+
+        the URL as a string
+        """
+        payload = {
+            "client_id": self._client_id,
+            "response_type": "code",
+            "redirect_uri": self._redirect_uri,
+            "state": state,
+            "scope": self._scope,
+        }
+        return 'https://accounts.spotify.com/authorize?{}'.format(
+            urlencode(payload))
+
+    def spotify_add_user_by_code(
+            self,
+            user_key: str,
+            code: str) -> ConnectionObject:
+        """
+        This method exchanges the code Spotify redirected a user to the
+        redirect uri with for the user's credentials, and stores them under
+        user_key, replacing any stored before.
+
+        params:
+
+        user_key: the key to make API calls for the user with, such as the
+        user's id in the backend
+        code: the code query parameter of the redirect
+
+        returns:
+
+        a ConnectionObject for the user
+        """
+        auth = self._create_auth(user_key, self._scope)
+        auth._get_token(code)
+        return self._insert(
+            user_key,
+            self._connection._with_auth(auth),
+            time.monotonic(),
+            replace=True)
+
+    def spotify_add_user(
+            self,
+            user_key: str,
+            refresh_token: str,
+            access_token: str = None,
+            expires_in: float = None,
+            scope: list[str] = None) -> None:
+        """
+        This method stores credentials obtained elsewhere for a user under
+        user_key, replacing any stored before.
+
+        params:
+
+        user_key: the key to make API calls for the user with, such as the
+        user's id in the backend
+        refresh_token: the user's refresh token
+        (optional) access_token: the user's access token, if it isn't given
+        one is requested with the refresh token on first use
+        (optional) expires_in: the number of seconds until access_token
+        expires
+        (optional) scope: the scopes the user allowed, by default the scopes
+        the manager requests
+        """
+        if access_token is None or expires_in is None:
+            access_token = None
+            expires = 0
+        else:
+            expires = time.time() + expires_in
+        self._connection._cache_handler._store_spotify_user(
+            self._client_id,
+            user_key,
+            self._scope if scope is None else " ".join(scope),
+            access_token,
+            refresh_token,
+            expires)
+        self._unload(user_key)
+
+    def spotify_remove_user(self, user_key: str) -> bool:
+        """
+        This method removes a user's stored credentials, for example after
+        they disconnected their Spotify account.
+
+        params:
+
+        user_key: the key the user was added with
+
+        returns:
+
+        whether credentials were stored for the user
+        """
+        self._unload(user_key)
+        return self._connection._cache_handler._remove_spotify_user(
+            self._client_id, user_key)
+
+    def get_metrics(self) -> Metrics:
+        """
+        This method takes no parameters and returns the Metrics object
+        shared by every user's connection.
+
+        returns:
+
+        a Metrics object
+        """
+        return self._connection._metrics
+
+    def _create_auth(
+            self,
+            user_key: str,
+            scope: str,
+            access_token: str = None,
+            refresh_token: str = None,
+            expires: float = 0) -> SpotifyUserAuth:
+        """
+        returns the auth object of a user, sending token requests through
+        the shared transport
+        """
+        return SpotifyUserAuth(
+            user_key,
+            self._client_id,
+            self._client_secret,
+            self._redirect_uri,
+            self._connection._cache_handler,
+            scope,
+            access_token,
+            refresh_token,
+            EPOCH + timedelta(seconds=expires),
+            self._connection._metrics,
+            self._connection._spotify_token_url,
+            self._connection._transport)
+
+    def _load_user(self, user_key: str) -> ConnectionObject:
+        """
+        returns a ConnectionObject for a user with credentials from the
+        cache, or None if the user has none
+        """
+        row = self._connection._cache_handler._get_spotify_user(
+            self._client_id, user_key)
+        if row is None:
+            return None
+        scope, access_token, refresh_token, expires = row
+        return self._connection._with_auth(self._create_auth(
+            user_key, scope, access_token, refresh_token, expires))
+
+    def _insert(
+            self,
+            user_key: str,
+            connection: ConnectionObject,
+            now: float,
+            replace: bool = False) -> ConnectionObject:
+        """
+        keeps a loaded user and returns their connection. Unless replace is
+        True, a connection another thread loaded first is returned instead
+        """
+        with self._lock:
+            entry = self._users.get(user_key)
+            if entry is not None and not replace:
+                connection = entry[0]
+            self._users[user_key] = [connection, now]
+            self._users.move_to_end(user_key)
+            evicted = self._evict(now)
+        if entry is not None and entry[0] is not connection:
+            evicted.append(entry[0])
+        self._close(evicted)
+        return connection
+
+    def _unload(self, user_key: str) -> None:
+        """
+        forgets a loaded user, so their credentials are read again on next
+        use
+        """
+        with self._lock:
+            entry = self._users.pop(user_key, None)
+        if entry is not None:
+            self._close([entry[0]])
+
+    def _evict(self, now: float) -> list[ConnectionObject]:
+        """
+        unloads the least recently used users while there are too many or
+        they have been idle for too long and returns their connections, 
+        which the caller passes to _close once it has released the lock. 
+        Callers must hold the lock
+        """
+        evicted = []
+        while len(self._users) > 0:
+            user_key, (connection, last_used) = \
+                next(iter(self._users.items()))
+            if len(self._users) <= self._max_loaded_users and (
+                    self._idle_seconds is None or
+                    now - last_used < self._idle_seconds):
+                break
+            del self._users[user_key]
+            evicted.append(connection)
+        return evicted
+
+    def _close(self, connections: list[ConnectionObject]) -> None:
+        """
+        writes the songs queued by unloaded users and stops their write 
+        queues, callers must not hold the lock as writing sends requests
+        """
+        for connection in connections:
+            connection.close()
@@ -1,7 +1,20 @@
-from typing import Any, Collection
+from concurrent.futures import Future
+from datetime import datetime, timezone
+from typing import Any, Callable, Collection, Iterator
 from streamlib.cache.cache_handler import CacheHandler
-from streamlib.connection.spotify_auth import SpotifyAuthCode
-from streamlib.connection.spotify_api import SpotifyAPI
+from streamlib.cache.lru_cache import LRUCache
+from streamlib.cache.response_cache import ResponseCache
+from streamlib.connection.spotify_auth import SpotifyAuthCode, \
+    BASE_URL as SPOTIFY_TOKEN_URL, TOKEN_LIFETIME_SECONDS
+from streamlib.connection.spotify_api import SpotifyAPI, MAX_TRACK_IDS, \
+    BASE_URL as SPOTIFY_API_URL
+from streamlib.connection.rate_limiter import RateLimiter
+from streamlib.connection.batch_loader import BatchLoader
+from streamlib.connection.write_queue import WriteQueue, SAVE, REMOVE
+from streamlib.connection.exporter import Exporter, DEFAULT_MAX_PENDING_PAGES
+from streamlib.connection.transport import Transport, RequestsTransport, \
+    HttpxTransport, DEFAULT_TIMEOUT
+from streamlib.metrics.metrics import Metrics
 from streamlib.objects.song import Song
 from streamlib.objects.artist import Artist
 from streamlib.objects.album import Album
@@ -9,7 +22,33 @@ from streamlib.objects.album import Album
 
 class ConnectionObject:
 
-    def __init__(self, cache_folder: str = "streamlib_cache"):
+    _spotify_api_class = SpotifyAPI
+    _write_queue_class = WriteQueue
+
+    def __init__(
+            self,
+            cache_folder: str = "streamlib_cache",
+            max_workers: int = 8,
+            metadata_ttl: float = 86400,
+            memory_cache_entries: int = 10000,
+            memory_cache_bytes: int = None,
+            requests_per_second: float = None,
+            endpoint_requests_per_second: dict[str, float] = None,
+            coalesce_window: float = None,
+            lazy: bool = False,
+            json_decoder: Callable[[bytes], Any] = None,
+            search_cache_entries: int = 10000,
+            saved_index_max_age: float = None,
+            write_behind_window: float = 1,
+            metrics: Metrics = None,
+            spotify_api_url: str = SPOTIFY_API_URL,
+            spotify_token_url: str = SPOTIFY_TOKEN_URL,
+            transport: Transport = None,
+            pool_size: int = None,
+            timeout: float = DEFAULT_TIMEOUT,
+            http2: bool = False,
+            response_cache_entries: int = None,
+            persist_responses: bool = False):
         """
         Constructor for ConnectionObject object. This object wraps all 
         functionality of the streamlib library.
@@ -18,10 +57,147 @@ class ConnectionObject:
 
         (optional) cache_folder: the folder which will store the cache. The 
         default value is 'streamlib_cache'
+        (optional) max_workers: the maximum number of API requests made in 
+        parallel when a call needs more than one request. The default value 
+        is 8
+        (optional) metadata_ttl: the number of seconds song, album and artist 
+        data is kept in the cache before it is requested again, None turns 
+        off caching of this data. The default value is 86400 (one day)
+        (optional) memory_cache_entries: the maximum number of songs kept in 
+        memory for repeated lookups by ID. The default value is 10000
+        (optional) memory_cache_bytes: the approximate maximum number of bytes 
+        used by songs kept in memory. By default there is no byte limit. If 
+        both this and memory_cache_entries are None, songs are not kept in 
+        memory
+        (optional) requests_per_second: the average number of requests per 
+        second sent to the Spotify API across all threads. By default 
+        requests are only slowed down when Spotify responds with 429 Too Many 
+        Requests or server errors
+        (optional) endpoint_requests_per_second: a dict from endpoint name 
+        ('tracks', 'me/tracks', 'me/tracks/contains' or 'search') to the 
+        average number of requests per second sent to that endpoint
+        (optional) coalesce_window: if given, spotify_get_song_by_id calls 
+        made from different threads within this many seconds of each other 
+        are combined into a single request for up to 50 songs. By default 
+        every call makes its own request
+        (optional) lazy: whether returned songs, albums and artists should 
+        keep the API's JSON and only read each field the first time it is 
+        accessed, which is faster when only a few fields are needed. The 
+        default value is False
+        (optional) json_decoder: a function parsing response bodies from 
+        bytes, such as orjson.loads. By default orjson or ujson is used if 
+        installed, otherwise the standard library json module
+        (optional) search_cache_entries: the maximum number of searches made 
+        when populating songs without IDs whose results are remembered. The 
+        default value is 10000
+        (optional) saved_index_max_age: if given, 
+        spotify_check_saved_songs_by_id answers from the local index built by 
+        spotify_build_saved_index as long as it was built at most this many 
+        seconds ago, without calling the Spotify API. By default every check 
+        is sent to Spotify
+        (optional) write_behind_window: the number of seconds songs queued 
+        with spotify_queue_save_songs_by_id or 
+        spotify_queue_remove_saved_songs_by_id wait before they are written 
+        to Spotify, None waits for a full batch of 50 or 
+        spotify_flush_saved_songs. The default value is 1
+        (optional) metrics: the Metrics object requests, token refreshes and 
+        cache operations are recorded in, so several objects can share one. 
+        By default each object has its own, returned by get_metrics
+        (optional) spotify_api_url: the root of the Spotify Web API, ending 
+        with a slash. The default value is 'https://api.spotify.com/v1/'
+        (optional) spotify_token_url: the Spotify accounts endpoint access 
+        tokens are requested from. The default value is 
+        'https://accounts.spotify.com/api/token'. Both are meant for pointing 
+        the library at a local stand-in for Spotify, like the one in 
+        benchmarks/mock_spotify.py
+        (optional) transport: the Transport every request is sent through, 
+        so several objects can share one connection pool. If given, 
+        pool_size, timeout and http2 are ignored
+        (optional) pool_size: the maximum number of connections kept open to 
+        Spotify. By default it is max_workers
+        (optional) timeout: the number of seconds to wait to connect and for 
+        each response, None waits forever. The default value is 30
+        (optional) http2: whether to send requests over HTTP/2 with httpx, 
+        which must be installed with 'pip install httpx[http2]'. The default 
+        value is False
+        (optional) response_cache_entries: if given, the bodies of this many 
+        GET responses are kept with their ETags, repeated requests ask 
+        Spotify whether they changed, and unchanged responses are reused 
+        without downloading or parsing them again. This suits jobs which poll 
+        data that rarely changes. By default responses aren't kept
+        (optional) persist_responses: whether responses kept for 
+        response_cache_entries are also stored in the cache folder, so they 
+        are reused after a restart. The default value is False
         """
-        self._cache_handler = CacheHandler(cache_folder)
+        if transport is None:
+            if pool_size is None:
+                pool_size = max_workers
+            if http2:
+                transport = HttpxTransport(pool_size=pool_size, timeout=timeout)
+            else:
+                transport = RequestsTransport(
+                    pool_size=pool_size,
+                    timeout=timeout)
+        self._transport = transport
+        if metrics is None:
+            metrics = Metrics()
+        self._metrics = metrics
+        self._cache_handler = CacheHandler(
+            cache_folder,
+            metadata_ttl=metadata_ttl,
+            metrics=metrics)
         self._spotify_auth = None
-        self._spotify_connection = SpotifyAPI()
+        self._spotify_token_url = spotify_token_url
+        self._spotify_user_id = None
+        self._saved_index_max_age = saved_index_max_age
+        if memory_cache_entries is None and memory_cache_bytes is None:
+            self._memory_cache = None
+        else:
+            self._memory_cache = LRUCache(
+                max_entries=memory_cache_entries,
+                max_bytes=memory_cache_bytes)
+        if response_cache_entries is None:
+            response_cache = None
+        else:
+            response_cache = ResponseCache(
+                max_entries=response_cache_entries,
+                cache_handler=self._cache_handler if persist_responses
+                    else None)
+            metrics._register_lru_cache(
+                'response_memory', response_cache._entries)
+        self._rate_limiter = RateLimiter(
+            rate=requests_per_second,
+            endpoint_rates=endpoint_requests_per_second,
+            max_concurrency=max_workers)
+        self._spotify_connection = self._spotify_api_class(
+            max_workers=max_workers,
+            cache_handler=self._cache_handler,
+            memory_cache=self._memory_cache,
+            rate_limiter=self._rate_limiter,
+            lazy=lazy,
+            json_decoder=json_decoder,
+            search_cache=LRUCache(max_entries=search_cache_entries),
+            metrics=metrics,
+            base_url=spotify_api_url,
+            transport=transport,
+            response_cache=response_cache)
+        if self._memory_cache is not None:
+            metrics._register_lru_cache('memory', self._memory_cache)
+        metrics._register_lru_cache(
+            'search', self._spotify_connection._search_cache)
+        if coalesce_window is None:
+            self._song_loader = None
+        else:
+            self._song_loader = BatchLoader(
+                lambda ids: self._spotify_connection._get_songs_by_id(
+                    ids,
+                    self._spotify_auth._get_access_token()),
+                coalesce_window,
+                MAX_TRACK_IDS)
+        self._write_queue = self._write_queue_class(
+            self._write_saved_songs,
+            write_behind_window,
+            MAX_TRACK_IDS)
 
     ## METHODS FOR INSTANTIATING API AUTHENTICATION ##
 
@@ -34,7 +210,8 @@ class ConnectionObject:
             redirect_uri: str,
             scope: list[str] = None,
             check_cache: bool = True,
-            update_cache: bool = True):
+            update_cache: bool = True,
+            refresh_margin: float = None):
             """
             This method instantiates a SpotifyAuthCode object, which 
             authenticates Spotify API calls via the Authorization Code Flow. 
@@ -56,7 +233,21 @@ class ConnectionObject:
             verication of permissions
             (optional) update_cache: Whether this call should update the cache 
             with the credentials obtained from the Spotify API 
+            (optional) refresh_margin: if given, a background thread renews 
+            the access token this many seconds before it expires, so API 
+            calls never wait for a token refresh. It must be less than the 
+            3600 second lifetime of Spotify access tokens, and is capped at 
+            half of it
             """
+            if refresh_margin is not None and \
+                    not 0 <= refresh_margin < TOKEN_LIFETIME_SECONDS:
+                raise ValueError(
+                    "refresh_margin must be at least 0 and less than the "
+                    "lifetime of Spotify access tokens, " + 
+                    str(TOKEN_LIFETIME_SECONDS) + " seconds")
+            if self._spotify_auth is not None:
+                self._spotify_auth._stop_background_refresh()
+            self._spotify_user_id = None
             if scope is None:
                 self._spotify_auth = SpotifyAuthCode(
                     client_id,
@@ -64,7 +255,11 @@ class ConnectionObject:
                     redirect_uri,
                     self._cache_handler,
                     check_cache=check_cache,
-                    update_cache=update_cache)
+                    update_cache=update_cache,
+                    refresh_margin=refresh_margin,
+                    metrics=self._metrics,
+                    token_url=self._spotify_token_url,
+                    transport=self._transport)
             else:
                 self._spotify_auth = SpotifyAuthCode(
                     client_id,
@@ -73,7 +268,11 @@ class ConnectionObject:
                     self._cache_handler,
                     scope,
                     check_cache,
-                    update_cache)
+                    update_cache,
+                    refresh_margin,
+                    self._metrics,
+                    self._spotify_token_url,
+                    self._transport)
 
     ## METHODS FOR COMMUNICATING WITH APIS ##
 
@@ -95,11 +294,21 @@ class ConnectionObject:
 
         a Song object
         """
+        if self._song_loader is not None:
+            song = self._spotify_connection._get_cached_song(id)
+            if song is not None:
+                return song
+            song = self._song_loader._load(id).result()
+            if song is None:
+                message = "Spotify API failed to retrieve song with id " \
+                + str(id) + " because it was not found"
+                raise RuntimeError(message)
+            return song
         return self._spotify_connection._get_song_by_id(
             id, 
             self._spotify_auth._get_access_token())
 
-    def spotify_get_songs_by_id(self, ids: list[str]):
+    def spotify_get_songs_by_id(self, ids: list[str], as_table: bool = False):
         """
         This method takes a list of Spotify Song IDs and returns a list of Song 
         objects for those songs. Song IDs can be found be getting a shareable link for a Spotify 
@@ -107,30 +316,145 @@ class ConnectionObject:
         https://open.spotify.com/track/xxx?si=yyy
         has the ID xxx
 
+        Any number of IDs can be passed, they are fetched in chunks of 50 
+        (the Spotify API limit) in parallel.
+
         params:
 
         ids: the list of song ids
+        (optional) as_table: whether to return a SongTable instead of a list. 
+        Requires NumPy
 
         returns:
 
-        a list of Song objects
+        a list of Song objects in the same order as ids, with None in place 
+        of any ID Spotify could not find. If as_table is True, a SongTable of 
+        the songs found in the same order
         """
+        if as_table:
+            return self._spotify_connection._get_songs_table_by_id(
+                ids,
+                self._spotify_auth._get_access_token())
         return self._spotify_connection._get_songs_by_id(
             ids, 
             self._spotify_auth._get_access_token())
 
-    def spotify_get_saved_songs(self) -> list[Song]:
+    def spotify_get_saved_songs(self, as_table: bool = False) -> list[Song]:
         """
-        This method takes no parameters and returns a list of Song objects the 
-        user has saved on Spotify
+        This method returns a list of Song objects the user has saved on 
+        Spotify
     
+        params:
+
+        (optional) as_table: whether to return a SongTable instead of a list, 
+        which is much faster to filter, sort and aggregate and uses less 
+        memory. Requires NumPy
+
         returns:
 
-        a list of Song objects the user has saved on Spotify
+        a list of Song objects the user has saved on Spotify, or a SongTable 
+        if as_table is True
         """
+        if as_table:
+            return self._spotify_connection._get_saved_songs_table(
+                self._spotify_auth._get_access_token())
         return self._spotify_connection._get_saved_songs(
             self._spotify_auth._get_access_token())
+
+    def spotify_iter_saved_songs(self) -> Iterator[Song]:
+        """
+        This method takes no parameters and returns an iterator over the Song 
+        objects the user has saved on Spotify. Songs are fetched a page at a 
+        time as the iterator is consumed, with the next page requested in the 
+        background, so the first songs are available right away and the 
+        whole library is never held in memory.
+    
+        returns:
+
+        an iterator of Song objects the user has saved on Spotify
+        """
+        return self._spotify_connection._iter_saved_songs(
+            self._spotify_auth._get_access_token)
     
+    def spotify_export_saved_songs(
+            self,
+            path: str,
+            format: str = None,
+            max_pending_pages: int = DEFAULT_MAX_PENDING_PAGES) -> int:
+        """
+        This method writes the songs the user has saved on Spotify to a file 
+        as they are fetched, without holding the library in memory. The next 
+        page is fetched while the current one is parsed, and parsed pages are 
+        written by a background thread, so fetching, parsing and writing 
+        overlap. Each row has the columns of a SongTable with every artist 
+        in artists, and the time the song was saved in added_at. Ex:
+        connection.spotify_export_saved_songs('library.parquet')
+    
+        params:
+
+        path: the file to write, it is replaced once every song is written, 
+        and left as it was if the export fails
+        (optional) format: 'ndjson' for one JSON object per line, 'csv', or 
+        'parquet', which requires pyarrow to be installed with 
+        'pip install pyarrow'. By default the format is chosen by the 
+        extension of path, .ndjson, .jsonl, .csv or .parquet
+        (optional) max_pending_pages: the number of parsed pages which may 
+        wait to be written before fetching pauses. The default value is 4
+
+        returns:
+
+        the number of songs written
+        """
+        exporter = Exporter(path, format, max_pending_pages)
+        try:
+            for items in self._spotify_connection._iter_saved_pages(
+                    self._spotify_auth._get_access_token):
+                exporter._put(
+                    [item['track'] for item in items],
+                    [item['added_at'] for item in items])
+        except BaseException:
+            exporter._abort()
+            raise
+        return exporter._finish()
+
+    def spotify_export_songs_by_id(
+            self,
+            ids: Collection[str],
+            path: str,
+            format: str = None,
+            max_pending_pages: int = DEFAULT_MAX_PENDING_PAGES) -> int:
+        """
+        This method writes the songs with the given Spotify IDs to a file as 
+        they are fetched, like spotify_export_saved_songs. Songs are fetched 
+        in batches of 50, several batches ahead of the writer, and IDs 
+        Spotify could not find are left out.
+    
+        params:
+
+        ids: a list of Spotify song IDs
+        path: the file to write, it is replaced once every song is written, 
+        and left as it was if the export fails
+        (optional) format: 'ndjson', 'csv' or 'parquet', see 
+        spotify_export_saved_songs. By default the format is chosen by the 
+        extension of path
+        (optional) max_pending_pages: the number of parsed batches which may 
+        wait to be written before fetching pauses. The default value is 4
+
+        returns:
+
+        the number of songs written
+        """
+        exporter = Exporter(path, format, max_pending_pages)
+        try:
+            for tracks in self._spotify_connection._iter_tracks_json(
+                    list(ids),
+                    self._spotify_auth._get_access_token):
+                exporter._put(tracks)
+        except BaseException:
+            exporter._abort()
+            raise
+        return exporter._finish()
+
     def spotify_save_songs_by_id(self, songs: Collection[str]) -> bool:
         """
         This method takes a list of Spotify song IDs and adds them to the 
@@ -144,9 +468,12 @@ class ConnectionObject:
 
         True if successful
         """
-        return self._spotify_connection._add_saved_songs(
-            list(songs),
+        songs = list(songs)
+        result = self._spotify_connection._add_saved_songs(
+            songs,
             self._spotify_auth._get_access_token())
+        self._update_saved_index(added=songs)
+        return result
 
     def spotify_removed_saved_songs_by_id(self, songs: Collection[str]) -> bool:
         """
@@ -161,15 +488,83 @@ class ConnectionObject:
 
         True if successful
         """
-        return self._spotify_connection._remove_saved_songs(
-            list(songs),
+        songs = list(songs)
+        result = self._spotify_connection._remove_saved_songs(
+            songs,
             self._spotify_auth._get_access_token())
+        self._update_saved_index(removed=songs)
+        return result
     
+    def spotify_queue_save_songs_by_id(
+        self,
+        songs: Collection[str]) -> list[Future]:
+        """
+        This method takes a list of Spotify song IDs and queues them to be 
+        added to the logged in user's saved songs. Queued songs are written 
+        50 at a time, once 50 are waiting, write_behind_window seconds after 
+        the first was queued, or on spotify_flush_saved_songs. Queuing a 
+        song which is queued to be removed cancels both without a request
+
+        params:
+
+        songs: a collection of Spotify song ids
+
+        returns:
+
+        a list of Futures, one per song, whose results are 'saved' or 
+        'cancelled'. If writing a song fails its Future raises the error
+        """
+        return [self._write_queue._enqueue(SAVE, id) for id in songs]
+
+    def spotify_queue_remove_saved_songs_by_id(
+        self,
+        songs: Collection[str]) -> list[Future]:
+        """
+        This method takes a list of Spotify song IDs and queues them to be 
+        removed from the logged in user's saved songs, see 
+        spotify_queue_save_songs_by_id
+
+        params:
+
+        songs: a collection of Spotify song ids
+
+        returns:
+
+        a list of Futures, one per song, whose results are 'removed' or 
+        'cancelled'. If writing a song fails its Future raises the error
+        """
+        return [self._write_queue._enqueue(REMOVE, id) for id in songs]
+
+    def spotify_flush_saved_songs(self) -> dict:
+        """
+        This method writes every song queued with 
+        spotify_queue_save_songs_by_id or 
+        spotify_queue_remove_saved_songs_by_id now. It should be called 
+        before the program exits so no queued songs are lost
+
+        returns:
+
+        a dict from each written song ID to 'saved' or 'removed', or to the 
+        error raised while writing it
+        """
+        return self._write_queue._flush()
+
+    def _write_saved_songs(self, action: str, songs: list[str]) -> None:
+        """
+        writes a batch of queued songs to Spotify and the saved songs index
+        """
+        if action == SAVE:
+            self.spotify_save_songs_by_id(songs)
+        else:
+            self.spotify_removed_saved_songs_by_id(songs)
+
     def spotify_check_saved_songs_by_id(
         self, 
         songs: Collection[str]) -> list[bool]:
         """
-        This method takes a list of Spotify song IDs and checks if they are saved. A list of booleans indicating if they are is returned
+        This method takes a list of Spotify song IDs and checks if they are saved. A list of booleans indicating if they are is returned. 
+        If saved_index_max_age was given and the local saved songs index is 
+        recent enough, the songs are checked locally without calling Spotify
     
         params:
 
@@ -179,9 +574,135 @@ class ConnectionObject:
 
         a list of booleans indicating if each song is saved
         """
+        songs = list(songs)
+        if self._saved_index_max_age is not None:
+            user_id = self._get_spotify_user_id()
+            age = self._cache_handler._get_saved_index_age(user_id)
+            if age is not None and age <= self._saved_index_max_age:
+                return self._cache_handler._check_saved_tracks(user_id, songs)
         return self._spotify_connection._check_saved_songs(
-            list(songs),
-            self._spotify_auth._get_access_token())      
+            songs,
+            self._spotify_auth._get_access_token())
+
+    def spotify_build_saved_index(self) -> int:
+        """
+        This method downloads the IDs of every song the logged in user has 
+        saved and stores them in a local index in the cache folder. Songs 
+        saved or removed through this object keep the index up to date, and 
+        spotify_check_saved_songs_by_id uses it while it is younger than 
+        saved_index_max_age
+
+        returns:
+
+        the number of saved songs
+        """
+        items = self._spotify_connection._get_saved_song_ids(
+            self._spotify_auth._get_access_token())
+        self._cache_handler._replace_saved_tracks(
+            self._get_spotify_user_id(),
+            items)
+        return len(items)
+
+    def spotify_sync_saved_songs(
+        self,
+        full: bool = False) -> tuple[list[str], list[str]]:
+        """
+        This method brings the local saved songs index up to date with the 
+        logged in user's saved songs on Spotify and reports what changed 
+        since the last sync. Only songs added after the last sync are 
+        downloaded. If the number of saved songs then differs from the index, 
+        songs were removed and every saved song ID is downloaded to find 
+        them. The first sync builds the index like spotify_build_saved_index
+
+        params:
+
+        (optional) full: whether to download every saved song ID even if the 
+        counts agree, which also finds removals hidden by the same number of 
+        additions. The default value is False
+
+        returns:
+
+        a tuple of the list of added song IDs and the list of removed song 
+        IDs
+        """
+        user_id = self._get_spotify_user_id()
+        added = []
+        token = self._spotify_auth._get_access_token()
+        if not full and \
+                self._cache_handler._get_saved_index_age(user_id) is not None:
+            items, total = self._spotify_connection._get_saved_song_ids_since(
+                self._cache_handler._get_saved_watermark(user_id),
+                token)
+            added = self._cache_handler._merge_saved_tracks(user_id, items)
+            if total == len(self._cache_handler._get_saved_track_ids(user_id)):
+                return added, []
+        reconciled, removed = self._reconcile_saved_index(
+            user_id,
+            self._spotify_connection._get_saved_song_ids(token))
+        return added + reconciled, removed
+
+    def _reconcile_saved_index(
+        self,
+        user_id: str,
+        items: list[tuple]) -> tuple[list[str], list[str]]:
+        """
+        replaces the saved songs index with every saved (song id, added_at) 
+        and returns the added and removed song ids
+        """
+        known = set(self._cache_handler._get_saved_track_ids(user_id))
+        remote = set(id for id, _ in items)
+        self._cache_handler._replace_saved_tracks(user_id, items)
+        return [id for id, _ in items if id not in known], \
+            [id for id in known if id not in remote]
+
+    def _update_saved_index(
+        self,
+        added: list[str] = (),
+        removed: list[str] = ()) -> None:
+        """
+        applies songs saved or removed through this object to the local saved 
+        songs index, the user id is only requested if the index is in use
+        """
+        if self._spotify_user_id is None and self._saved_index_max_age is None:
+            return
+        user_id = self._get_spotify_user_id()
+        if len(added) > 0:
+            added_at = datetime.now(timezone.utc).strftime(
+                "%Y-%m-%dT%H:%M:%SZ")
+            self._cache_handler._add_saved_tracks(
+                user_id,
+                [(id, added_at) for id in added])
+        if len(removed) > 0:
+            self._cache_handler._remove_saved_tracks(user_id, removed)
+
+    def _get_spotify_user_id(self) -> str:
+        """
+        returns the Spotify id of the logged in user, requesting it once per 
+        login
+        """
+        if self._spotify_user_id is None:
+            self._spotify_user_id = self._spotify_connection._get_user_id(
+                self._spotify_auth._get_access_token())
+        return self._spotify_user_id
+
+    def _with_auth(self, auth: SpotifyAuthCode) -> 'ConnectionObject':
+        """
+        returns a ConnectionObject authenticated with auth which shares this 
+        one's transport, rate limiter, caches and API wrapper, for 
+        ConnectionManager. It has its own write-behind queue, which the 
+        manager closes when it unloads the user, and its song requests aren't 
+        coalesced
+        """
+        connection = object.__new__(type(self))
+        connection.__dict__.update(self.__dict__)
+        connection._spotify_auth = auth
+        connection._spotify_user_id = None
+        connection._song_loader = None
+        connection._write_queue = self._write_queue_class(
+            connection._write_saved_songs,
+            self._write_queue._window,
+            MAX_TRACK_IDS)
+        return connection
 
     def spotify_populate_song(self, song: Song) -> Song:
         """
@@ -203,6 +724,108 @@ class ConnectionObject:
             song,
             self._spotify_auth._get_access_token()) 
 
+    def spotify_populate_songs(self, songs: list[Song]) -> list[Song]:
+        """
+        This method takes a list of Song objects and returns a list of 
+        populated Song objects, like spotify_populate_song does for one song. 
+        Songs with Spotify IDs are fetched in batches of 50, songs without 
+        are searched for in parallel, and songs with the same name, artist 
+        and album are only searched for once.
+    
+        params:
+
+        songs: a list of Song objects
+
+        returns:
+
+        a list of Song objects in the same order as songs. A song which 
+        couldn't be found is returned as it was passed in
+        """
+        return self._spotify_connection._populate_songs(
+            list(songs),
+            self._spotify_auth._get_access_token())
+
+    def spotify_hydrate(
+            self,
+            songs: list[Song],
+            artists: bool = True,
+            albums: bool = True) -> list[Song]:
+        """
+        This method fills in the artists and albums of a list of Song 
+        objects: the genres of every artist of the songs and their albums, 
+        and the songs and any missing fields of every album. Each distinct 
+        artist and album is requested once, in batches of 50 artists and 20 
+        albums which are fetched concurrently, and the results are set on 
+        every object that refers to them, which are shared between songs. 
+        Artists and albums already hydrated aren't requested again. Ex:
+        songs = connection.spotify_hydrate(connection.spotify_get_saved_songs())
+        songs[0].artists[0].genres
+    
+        params:
+
+        songs: a list of Song objects, None entries are skipped
+        (optional) artists: whether to fetch the genres of artists. The 
+        default value is True
+        (optional) albums: whether to fetch the songs of albums. The default 
+        value is True
+
+        returns:
+
+        the list of Song objects, which are updated in place
+        """
+        return self._spotify_connection._hydrate(
+            list(songs),
+            self._spotify_auth._get_access_token(),
+            artists,
+            albums)
+
+    def spotify_memory_cache_stats(self) -> dict:
+        """
+        This method takes no parameters and returns statistics about the 
+        in-memory song cache, which can be used to size it.
+    
+        returns:
+
+        a dict with the number of cache 'hits', 'misses' and 'evictions' so 
+        far, and the current number of 'entries' and approximate 'bytes' 
+        (only counted if memory_cache_bytes is set). None if the memory cache 
+        is turned off
+        """
+        if self._memory_cache is None:
+            return None
+        return self._memory_cache._stats()
+
+    def get_metrics(self) -> Metrics:
+        """
+        This method takes no parameters and returns the Metrics object 
+        recording this object's API requests, token refreshes and cache 
+        operations. Ex:
+        connection.get_metrics().to_prometheus()
+    
+        returns:
+
+        a Metrics object
+        """
+        return self._metrics
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self) -> None:
+        """
+        This method writes every song queued with 
+        spotify_queue_save_songs_by_id or 
+        spotify_queue_remove_saved_songs_by_id and stops the thread writing 
+        them, along with the background token refresh. It is called 
+        automatically when the object is used with 'with'
+        """
+        self._write_queue._close()
+        if self._spotify_auth is not None:
+            self._spotify_auth._stop_background_refresh()
+
     ### APPLE MUSIC ###     
         
         
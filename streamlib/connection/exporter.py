@@ -0,0 +1,295 @@
+from os.path import basename, dirname, splitext
+import csv
+import json
+import os
+import queue
+import tempfile
+import threading
+from streamlib.objects.song_table import NUMERIC_COLUMNS, BOOLEAN_COLUMNS, \
+    _track_row
+
+# the columns of exported rows in order, artists holds every artist as an
+# object with id and name, and added_at is only set for saved songs
+EXPORT_COLUMNS = [
+    'spotify_id',
+    'name',
+    'artist_id',
+    'artist_name',
+    'artists',
+    'album_id',
+    'album_name',
+    'album_type',
+    'album_num_songs',
+    'release_year',
+    'release_month',
+    'release_day',
+    'duration_ms',
+    'song_number',
+    'explicit',
+    'spotify_is_local',
+    'added_at',
+]
+# the export format of each file extension
+EXTENSIONS = {
+    '.ndjson': 'ndjson',
+    '.jsonl': 'ndjson',
+    '.csv': 'csv',
+    '.parquet': 'parquet',
+}
+FORMATS = ('ndjson', 'csv', 'parquet')
+# the default number of parsed pages waiting for the writer, the parser
+# blocks once this many are queued
+DEFAULT_MAX_PENDING_PAGES = 4
+# the number of rows in each Parquet row group, which are buffered until
+# written
+ROW_GROUP_SIZE = 10000
+# sent to the writer thread after the last page
+_DONE = object()
+
+class Exporter:
+
+    def __init__(
+        self,
+        path: str,
+        format: str = None,
+        max_pending_pages: int = DEFAULT_MAX_PENDING_PAGES):
+        """
+        constructor for Exporter object, which writes songs to the file at
+        path as they are fetched, this should not be accessed directly.
+        Pages of track JSON passed to _put are parsed into rows on the
+        calling thread and written by a writer thread, so parsing a page
+        overlaps with writing the one before. At most max_pending_pages
+        parsed pages wait for the writer, after which _put blocks, so memory
+        stays flat however many songs are exported. format is 'ndjson',
+        'csv' or 'parquet', by default it is chosen by the extension of path.
+        Rows are written to a temporary file next to path, which replaces
+        path once _finish succeeds, so a failed export leaves path as it was
+        """
+        format = _get_format(path, format)
+        self._path = path
+        fd, self._temp_path = tempfile.mkstemp(
+            dir=dirname(path) or None,
+            prefix='.' + basename(path) + '.',
+            suffix='.tmp')
+        os.close(fd)
+        try:
+            self._writer = _create_writer(self._temp_path, format)
+        except BaseException:
+            os.remove(self._temp_path)
+            raise
+        self._queue = queue.Queue(maxsize=max_pending_pages)
+        self._count = 0
+        self._error: Exception = None
+        self._thread = threading.Thread(
+            target=self._write_pages,
+            name='streamlib-export',
+            daemon=True)
+        self._thread.start()
+
+    def _put(self, tracks: list[dict], added_at: list[str] = None) -> None:
+        """
+        parses a page of track JSON and queues it for the writer, waiting
+        while max_pending_pages are queued. added_at holds when each track
+        was saved. Tracks which are None are skipped. Raises the writer's
+        error if writing failed
+        """
+        if self._error is not None:
+            raise self._error
+        if added_at is None:
+            added_at = [None] * len(tracks)
+        self._queue.put([
+            _export_row(track, saved)
+            for track, saved in zip(tracks, added_at) if track is not None])
+
+    def _finish(self) -> int:
+        """
+        waits for every queued page to be written, closes the file, moves it
+        to path and returns the number of rows written. Raises the writer's
+        error if writing failed, in which case path isn't touched
+        """
+        self._close()
+        if self._error is not None:
+            os.remove(self._temp_path)
+            raise self._error
+        # mkstemp creates the file readable only by its owner, give it the
+        # mode open() would have
+        os.chmod(self._temp_path, 0o666 & ~_get_umask())
+        os.replace(self._temp_path, self._path)
+        return self._count
+
+    def _abort(self) -> None:
+        """
+        stops the export after fetching failed, the pages queued are
+        discarded with the temporary file and path isn't touched
+        """
+        self._close()
+        os.remove(self._temp_path)
+
+    def _close(self) -> None:
+        """
+        waits for the writer thread to take every queued page and closes the
+        file, keeping the first error
+        """
+        self._queue.put(_DONE)
+        self._thread.join()
+        try:
+            self._writer._close()
+        except Exception as e:
+            if self._error is None:
+                self._error = e
+
+    def _write_pages(self) -> None:
+        """
+        body of the writer thread. After an error pages are still taken from
+        the queue, so the parsing thread never blocks on a full queue
+        """
+        while True:
+            rows = self._queue.get()
+            if rows is _DONE:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._writer._write_rows(rows)
+                self._count += len(rows)
+            except Exception as e:
+                self._error = e
+
+
+class NdjsonWriter:
+
+    def __init__(self, path: str):
+        """
+        writes rows as one JSON object per line, this should not be accessed
+        directly
+        """
+        self._file = open(path, 'w', encoding='utf-8')
+
+    def _write_rows(self, rows: list[dict]) -> None:
+        self._file.write("".join(
+            json.dumps(row, ensure_ascii=False) + "\n" for row in rows))
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class CsvWriter:
+
+    def __init__(self, path: str):
+        """
+        writes rows as CSV with a header, the artists column holds JSON, this
+        should not be accessed directly
+        """
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._csv = csv.DictWriter(self._file, fieldnames=EXPORT_COLUMNS)
+        self._csv.writeheader()
+
+    def _write_rows(self, rows: list[dict]) -> None:
+        for row in rows:
+            row['artists'] = json.dumps(row['artists'], ensure_ascii=False)
+        self._csv.writerows(rows)
+
+    def _close(self) -> None:
+        self._file.close()
+
+
+class ParquetWriter:
+
+    def __init__(self, path: str, row_group_size: int = ROW_GROUP_SIZE):
+        """
+        writes rows to a Parquet file a row group at a time, rows are
+        buffered until row_group_size are waiting. It requires pyarrow to be
+        installed, this should not be accessed directly
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError(
+                "Exporting to Parquet requires pyarrow, install it with "
+                "'pip install pyarrow'")
+        self._pyarrow = pyarrow
+        fields = []
+        for name in EXPORT_COLUMNS:
+            if name in NUMERIC_COLUMNS:
+                # the dtype names match pyarrow's type factories
+                fields.append((name, getattr(pyarrow, NUMERIC_COLUMNS[name])()))
+            elif name in BOOLEAN_COLUMNS:
+                fields.append((name, pyarrow.bool_()))
+            elif name == 'artists':
+                fields.append((name, pyarrow.list_(pyarrow.struct(
+                    [('id', pyarrow.string()), ('name', pyarrow.string())]))))
+            else:
+                fields.append((name, pyarrow.string()))
+        self._schema = pyarrow.schema(fields)
+        self._writer = pyarrow.parquet.ParquetWriter(path, self._schema)
+        self._row_group_size = row_group_size
+        self._rows = []
+
+    def _write_rows(self, rows: list[dict]) -> None:
+        self._rows.extend(rows)
+        if len(self._rows) >= self._row_group_size:
+            self._write_row_group()
+
+    def _write_row_group(self) -> None:
+        self._writer.write_table(self._pyarrow.Table.from_pylist(
+            self._rows, schema=self._schema))
+        self._rows = []
+
+    def _close(self) -> None:
+        try:
+            if len(self._rows) > 0:
+                self._write_row_group()
+        finally:
+            self._writer.close()
+
+
+def _get_format(path: str, format: str = None) -> str:
+    """
+    returns format, or the format of the extension of path if format is
+    None, this should not be accessed directly
+    """
+    if format is None:
+        format = EXTENSIONS.get(splitext(path)[1].lower())
+        if format is None:
+            raise ValueError(
+                "the format of " + path + " can't be told from its "
+                "extension, pass format as one of " + str(FORMATS))
+    if format not in FORMATS:
+        raise ValueError("format must be one of " + str(FORMATS))
+    return format
+
+
+def _get_umask() -> int:
+    """
+    returns the process's umask, this should not be accessed directly. It 
+    can only be read by setting it, so it is briefly 0
+    """
+    umask = os.umask(0)
+    os.umask(umask)
+    return umask
+
+
+def _create_writer(path: str, format: str):
+    """
+    returns the writer for format, writing to path, this should not be
+    accessed directly
+    """
+    if format == 'ndjson':
+        return NdjsonWriter(path)
+    elif format == 'csv':
+        return CsvWriter(path)
+    elif format == 'parquet':
+        return ParquetWriter(path)
+    raise ValueError("format must be one of " + str(FORMATS))
+
+
+def _export_row(track: dict, added_at: str = None) -> dict:
+    """
+    returns the exported row of a track JSON object, this should not be
+    accessed directly
+    """
+    row = _track_row(track)
+    row['artists'] = [{'id': id, 'name': name} for id, name in row['artists']]
+    row['added_at'] = added_at
+    return {name: row[name] for name in EXPORT_COLUMNS}
@@ -0,0 +1,13 @@
+import json
+
+# the fastest installed JSON decoder is used to parse API responses, they all
+# raise a subclass of ValueError on invalid input
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    try:
+        import ujson
+        loads = ujson.loads
+    except ImportError:
+        loads = json.loads
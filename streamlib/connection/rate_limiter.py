@@ -0,0 +1,191 @@
+import random
+import threading
+import time
+
+# the longest a single exponential backoff will wait, in seconds
+MAX_BACKOFF_SECONDS = 60
+
+class TokenBucket:
+
+    def __init__(self, rate: float, burst: float):
+        """
+        constructor for TokenBucket object, which allows rate requests per
+        second on average and bursts of up to burst requests, this should not
+        be accessed directly. Callers must hold the rate limiter's lock
+        """
+        self._rate = rate
+        self._burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+
+    def _wait_time(self, now: float) -> float:
+        """
+        refills the bucket and returns how long to wait for a token, 0 if one
+        is available
+        """
+        self._tokens = min(
+            self._burst,
+            self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+        if self._tokens >= 1:
+            return 0
+        return (1 - self._tokens) / self._rate
+
+    def _take(self) -> None:
+        self._tokens -= 1
+
+
+class RateLimiter:
+
+    def __init__(
+        self,
+        rate: float = None,
+        burst: float = None,
+        endpoint_rates: dict[str, float] = None,
+        max_concurrency: int = 8,
+        min_concurrency: int = 1,
+        max_retries: int = 5):
+        """
+        constructor for RateLimiter object, which paces the requests of every
+        thread sharing it, this should not be accessed directly.
+
+        rate and burst configure a token bucket shared by all requests, and
+        endpoint_rates maps an endpoint name to its own requests per second.
+        A Retry-After from Spotify pauses every request until it has passed.
+        The number of requests in flight starts at max_concurrency, is halved
+        on every 429 or 5xx response and grows back by one per window of
+        successful requests
+        """
+        self._lock = threading.Condition()
+        self._bucket = None if rate is None else \
+            TokenBucket(rate, burst if burst is not None else max(1, rate))
+        self._endpoint_buckets = {
+            endpoint: TokenBucket(endpoint_rate, max(1, endpoint_rate))
+            for endpoint, endpoint_rate in (endpoint_rates or {}).items()}
+        self._max_concurrency = max_concurrency
+        self._min_concurrency = min_concurrency
+        self._concurrency = float(max_concurrency)
+        self._in_flight = 0
+        self._paused_until = 0
+        self._max_retries = max_retries
+        # (event loop, future) of every async caller waiting for a free slot
+        self._async_waiters = []
+
+    def _acquire(self, endpoint: str) -> None:
+        """
+        blocks until a request to endpoint may be sent
+        """
+        with self._lock:
+            while (wait := self._try_acquire(endpoint)) != 0:
+                self._lock.wait(wait)
+
+    async def _acquire_async(self, endpoint: str) -> None:
+        """
+        waits without blocking the event loop until a request to endpoint may 
+        be sent. A caller waiting for another request to finish is woken by 
+        _release, only token bucket and Retry-After waits sleep
+        """
+        # only async callers need asyncio, which is slow to import
+        import asyncio
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._lock:
+                wait = self._try_acquire(endpoint)
+                if wait == 0:
+                    return
+                if wait is None:
+                    waiter = (loop, loop.create_future())
+                    self._async_waiters.append(waiter)
+            if wait is not None:
+                await asyncio.sleep(wait)
+                continue
+            try:
+                await waiter[1]
+            finally:
+                with self._lock:
+                    if waiter in self._async_waiters:
+                        self._async_waiters.remove(waiter)
+
+    def _try_acquire(self, endpoint: str) -> float:
+        """
+        takes a slot for a request to endpoint and returns 0 if one is free, 
+        otherwise returns how long to wait before trying again, or None if 
+        the wait is for another request to finish. Callers must hold the lock
+        """
+        if self._in_flight >= int(self._concurrency):
+            return None
+        now = time.monotonic()
+        wait = max(
+            self._paused_until - now,
+            self._bucket_wait(self._bucket, now),
+            self._bucket_wait(self._endpoint_buckets.get(endpoint), now))
+        if wait > 0:
+            return wait
+        if self._bucket is not None:
+            self._bucket._take()
+        if endpoint in self._endpoint_buckets:
+            self._endpoint_buckets[endpoint]._take()
+        self._in_flight += 1
+        return 0
+
+    def _bucket_wait(self, bucket: TokenBucket, now: float) -> float:
+        if bucket is None:
+            return 0
+        return bucket._wait_time(now)
+
+    def _release(self, status: int, retry_after: str = None) -> None:
+        """
+        records the outcome of a request sent after _acquire, status is None
+        if the request failed without a response
+        """
+        with self._lock:
+            self._in_flight -= 1
+            if status == 429 or status is None or status >= 500:
+                self._concurrency = max(
+                    self._min_concurrency, self._concurrency / 2)
+            else:
+                self._concurrency = min(
+                    self._max_concurrency,
+                    self._concurrency + 1 / self._concurrency)
+            seconds = self._parse_retry_after(retry_after)
+            if seconds is not None:
+                self._paused_until = max(
+                    self._paused_until, time.monotonic() + seconds)
+            self._lock.notify_all()
+            waiters = self._async_waiters
+            self._async_waiters = []
+        for loop, future in waiters:
+            loop.call_soon_threadsafe(self._wake, future)
+
+    def _wake(self, future) -> None:
+        """
+        wakes an async caller waiting in _acquire_async, on its event loop
+        """
+        if not future.done():
+            future.set_result(None)
+
+    def _parse_retry_after(self, retry_after: str) -> float:
+        """
+        parses the number of seconds in a Retry-After header
+        """
+        if retry_after is None:
+            return None
+        try:
+            return max(0, float(retry_after))
+        except ValueError:
+            return None
+
+    def _should_retry(self, status: int, attempt: int) -> bool:
+        """
+        checks if a request which got status on its attempt'th try should be
+        sent again
+        """
+        return attempt < self._max_retries and \
+            (status == 429 or status >= 500)
+
+    def _backoff(self, attempt: int) -> float:
+        """
+        returns how long to wait before retrying a request that failed with a
+        server error, with full jitter
+        """
+        return random.uniform(0, min(MAX_BACKOFF_SECONDS, 0.5 * 2 ** attempt))
@@ -1,17 +1,211 @@
-from json import JSONDecodeError
-from requests import Session
-from ..objects import Song, Artist, Album
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import TYPE_CHECKING, Callable, Iterator
+import time
+from urllib.parse import urlencode
+from ..cache import CacheHandler, LRUCache, ResponseCache
+from ..cache.lru_cache import NOT_FOUND
+from ..metrics import Metrics
+from ..objects import Song, Artist, Album, IdentityMap, SongTable
+from ..objects.lazy import LazySong, LazyAlbum, LazyArtist
+from .json_decoder import loads
+from .rate_limiter import RateLimiter
+from .transport import Transport, RequestsTransport
+
+if TYPE_CHECKING:
+    from requests import Response
+
+# the maximum number of ids the Spotify API accepts in a single tracks call
+MAX_TRACK_IDS = 50
+# the maximum page size the Spotify API allows when listing saved songs
+MAX_SAVED_PAGE = 50
+# the maximum numbers of ids the Spotify API accepts in a single artists and 
+# albums call
+MAX_ARTIST_IDS = 50
+MAX_ALBUM_IDS = 20
+# the endpoint and the maximum number of ids per call of each kind of object 
+# fetched by _hydrate, kinds are also the on-disk cache kinds
+HYDRATE_ENDPOINTS = {
+    'artist': ('artists', MAX_ARTIST_IDS),
+    'album': ('albums', MAX_ALBUM_IDS),
+}
+# the maximum page size the Spotify API allows when listing an album's songs
+MAX_ALBUM_TRACKS_PAGE = 50
+# the default number of search results remembered
+SEARCH_CACHE_ENTRIES = 10000
+# the number of access tokens whose user id is remembered for response cache
+# keys
+USER_ID_ENTRIES = 1000
+# the default root of every Spotify Web API endpoint
+BASE_URL = "https://api.spotify.com/v1/"
 
 class SpotifyAPI:
 
-    def __init__(self):
+    def __init__(
+        self,
+        max_workers: int = 8,
+        cache_handler: CacheHandler = None,
+        memory_cache: LRUCache = None,
+        rate_limiter: RateLimiter = None,
+        identity_map: IdentityMap = None,
+        lazy: bool = False,
+        json_decoder: Callable = None,
+        search_cache: LRUCache = None,
+        metrics: Metrics = None,
+        base_url: str = BASE_URL,
+        transport: Transport = None,
+        response_cache: ResponseCache = None):
         """
         an wrapper object for the Spotify API, this should not be accessed 
-        directly
+        directly. If lazy is True songs, albums and artists keep their JSON 
+        and read each field on first access. json_decoder parses response 
+        bodies, by default the fastest installed decoder is used. Every 
+        request is recorded in metrics. base_url is the root of every 
+        endpoint and ends with a slash. Requests are sent through transport. 
+        If response_cache is given, GET requests are revalidated with ETags
+        """
+        # by default the connection pool is sized to the worker pool so 
+        # concurrent chunk fetches don't discard connections
+        if transport is None:
+            transport = RequestsTransport(pool_size=max_workers)
+        self._transport = transport
+        self._cache_handler = cache_handler
+        self._memory_cache = memory_cache
+        self._base_url = base_url
+        self._max_workers = max_workers
+        self._executor = None
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(max_concurrency=max_workers)
+        self._rate_limiter = rate_limiter
+        # albums and artists are shared between all songs that reference them
+        if identity_map is None:
+            identity_map = IdentityMap()
+        self._identity_map = identity_map
+        self._lazy = lazy
+        self._loads = json_decoder if json_decoder is not None else loads
+        if search_cache is None:
+            search_cache = LRUCache(max_entries=SEARCH_CACHE_ENTRIES)
+        self._search_cache = search_cache
+        if metrics is None:
+            metrics = Metrics()
+        self._metrics = metrics
+        self._response_cache = response_cache
+        # access token -> Spotify user id, so cached responses of the user's 
+        # endpoints outlive token refreshes
+        self._user_ids = LRUCache(max_entries=USER_ID_ENTRIES)
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        """
+        lazily creates the thread pool shared by all concurrent API calls
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_workers,
+                thread_name_prefix='streamlib')
+        return self._executor
+
+    def _chunk(self, ids: list[str], size: int) -> list[list[str]]:
+        """
+        splits a list of ids into lists of at most size ids
         """
-        self._session = Session()
-        self._base_url = "https://api.spotify.com/v1/"
+        return [ids[i:i + size] for i in range(0, len(ids), size)]
     
+    def _request(
+        self,
+        method: str,
+        endpoint: str,
+        url: str,
+        token: str,
+        params: dict = None,
+        headers: dict = None) -> 'Response':
+        """
+        sends a request through the rate limiter, retrying it after 429 and 
+        5xx responses. endpoint names the API endpoint for per-endpoint rate 
+        limits, headers are sent along with the authorization header
+        """
+        attempt = 0
+        while True:
+            self._rate_limiter._acquire(endpoint)
+            res = None
+            start = time.perf_counter()
+            try:
+                res = self._transport._request(
+                    method,
+                    url,
+                    params=params,
+                    headers=dict(self._gen_header(token), **(headers or {})))
+            finally:
+                if res is None:
+                    self._rate_limiter._release(None)
+                    self._metrics._observe_request(
+                        endpoint, method, None, time.perf_counter() - start, 0)
+                else:
+                    self._rate_limiter._release(
+                        res.status_code, res.headers.get('Retry-After'))
+                    self._metrics._observe_request(
+                        endpoint,
+                        method,
+                        res.status_code,
+                        time.perf_counter() - start,
+                        len(res.content))
+            if not self._rate_limiter._should_retry(res.status_code, attempt):
+                return res
+            if res.status_code != 429 or 'Retry-After' not in res.headers:
+                time.sleep(self._rate_limiter._backoff(attempt))
+            attempt += 1
+
+    def _get_json(
+        self,
+        endpoint: str,
+        url: str,
+        token: str,
+        params: dict = None):
+        """
+        sends a GET request and returns its parsed JSON body. With a response 
+        cache the ETag of the last response to the same request is sent in 
+        If-None-Match, and on 304 Not Modified the cached JSON is returned, 
+        parsing the cached body only if it hasn't been parsed before
+        """
+        if self._response_cache is None or endpoint == 'me':
+            return self._decode(
+                endpoint, self._request('GET', endpoint, url, token, params))
+        user_id = self._get_user_id(token) if endpoint.startswith('me/') \
+            else None
+        key = self._response_key(endpoint, url, user_id, params)
+        entry = self._response_cache._get(key)
+        res = self._request(
+            'GET',
+            endpoint,
+            url,
+            token,
+            params,
+            None if entry is None else {'If-None-Match': entry[0]})
+        if res.status_code == 304 and entry is not None:
+            return self._response_cache._parsed(key, entry, self._loads)
+        data = self._decode(endpoint, res)
+        etag = res.headers.get('ETag')
+        if res.status_code == 200 and etag is not None:
+            self._response_cache._put(key, etag, res.content, data)
+        return data
+
+    def _response_key(
+        self,
+        endpoint: str,
+        url: str,
+        user_id: str = None,
+        params: dict = None) -> str:
+        """
+        returns the response cache key of a GET request. Responses from the 
+        user's endpoints depend on who is asking, so their key includes the 
+        Spotify id of the user, user_id. The me endpoint itself isn't cached 
+        since it is how the user id is found
+        """
+        key = url if not params else "{}?{}".format(
+            url, urlencode(sorted(params.items())))
+        if user_id is not None:
+            key = "{} {}".format(user_id, key)
+        return key
+
     def _gen_header(self, token: str) -> dict[str, str]:
         return {
             'Authorization': 'Bearer ' + token,
@@ -23,16 +217,84 @@ class SpotifyAPI:
         given a song id and an access token, calls the API and with the 
         returned JSON creates a Song object 
         """
-        res = self._session.get(
-            url="{}tracks/{}".format(self._base_url, id),
-            headers=self._gen_header(token)).json()
-        
+        song = self._get_cached_song(id)
+        if song is not None:
+            return song
+        res = self._get_json(
+            'tracks',
+            "{}tracks/{}".format(self._base_url, id),
+            token)
+        return self._song_from_response(id, res)
+
+    def _get_cached_song(self, id: str) -> Song:
+        """
+        looks up a song in the in-memory and then the on-disk cache. Returns 
+        None on a miss and raises a RuntimeError if Spotify is known not to 
+        have the song
+        """
+        song = self._get_memory_cached(id)
+        if song is NOT_FOUND:
+            message = "Spotify API failed to retrieve song with id " + str(id) \
+            + " because it was not found"
+            raise RuntimeError(message)
+        elif song is not None:
+            return song
+        cached = self._get_cached_metadata('track', [id])
+        if id in cached:
+            song = self._create_song(cached[id])
+            self._put_memory_cached(id, song)
+            return song
+        return None
+
+    def _song_from_response(self, id: str, res: dict) -> Song:
+        """
+        creates a Song from the API response for a single track and caches 
+        it, or raises a RuntimeError if the response is an error
+        """
         if 'error' in res:
+            if res['error'].get('status') in (400, 404):
+                self._put_memory_cached(id, NOT_FOUND)
             message = "Spotify API failed to retrieve song with id " + str(id) \
             + " because of the following error: " + str(res['error'])
             raise RuntimeError(message)
         else:
-            return self._create_song(res)
+            self._store_cached_metadata('track', {id: res})
+            song = self._create_song(res)
+            self._put_memory_cached(id, song)
+            return song
+
+    def _get_memory_cached(self, id: str):
+        """
+        looks up a Song in the in-memory cache, if there is one. Returns 
+        NOT_FOUND for ids Spotify is known not to have and None on a miss
+        """
+        if self._memory_cache is None:
+            return None
+        return self._memory_cache._get(id)
+
+    def _put_memory_cached(self, id: str, song) -> None:
+        """
+        stores a Song, or NOT_FOUND, in the in-memory cache, if there is one
+        """
+        if self._memory_cache is not None:
+            self._memory_cache._put(id, song)
+
+    def _get_cached_metadata(self, kind: str, ids: list[str]) -> dict:
+        """
+        looks up the JSON of the given objects in the on-disk cache, if there 
+        is one
+        """
+        if self._cache_handler is None:
+            return {}
+        return self._cache_handler._get_spotify_metadata(kind, ids)
+
+    def _store_cached_metadata(self, kind: str, items: dict) -> None:
+        """
+        stores the JSON of the given objects in the on-disk cache, if there 
+        is one
+        """
+        if self._cache_handler is not None:
+            self._cache_handler._store_spotify_metadata(kind, items)
     
     def _parse_album_release(self, date: str, precision: str) -> \
     tuple[int, int, int]:
@@ -44,161 +306,851 @@ class SpotifyAPI:
         else:
             return int(date_list[0]), int(date_list[1]), int(date_list[2]) 
 
-    def _create_song(self, json) -> Song:
-        album_obj = json['album']
-        artists_list = json['artists']
-        artists = []
-        for a in artists_list:
-            artists.append(Artist(
-                name=a['name'],
-                spotify_id=a['id']
+    def _create_artist(self, json) -> Artist:
+        """
+        returns the shared Artist for the given artist JSON
+        """
+        if self._lazy:
+            return self._identity_map._get_or_create(
+                Artist, json['id'], lambda: LazyArtist(json, self))
+        return self._identity_map._get_or_create(
+            Artist,
+            json['id'],
+            lambda: Artist(
+                name=json['name'],
+                spotify_id=json['id']
             ))
-        year, month, day = self._parse_album_release(
-            album_obj['release_date'], 
-            album_obj['release_date_precision'])
-        album = Album(
-            name=album_obj['name'],
-            artists=artists_list,
-            num_songs=album_obj['total_tracks'],
-            spotify_id=album_obj['id'],
-            release_year=year,
-            release_month=month,
-            release_day=day,
-            spotify_album_type=album_obj['type']
-        )
+
+    def _create_album(self, json) -> Album:
+        """
+        returns the shared Album for the given album JSON
+        """
+        def create() -> Album:
+            year, month, day = self._parse_album_release(
+                json['release_date'], 
+                json['release_date_precision'])
+            return Album(
+                name=json['name'],
+                artists=[self._create_artist(a) for a in json.get('artists', [])],
+                num_songs=json['total_tracks'],
+                spotify_id=json['id'],
+                release_year=year,
+                release_month=month,
+                release_day=day,
+                spotify_album_type=json['type']
+            )
+        if self._lazy:
+            return self._identity_map._get_or_create(
+                Album, json['id'], lambda: LazyAlbum(json, self))
+        return self._identity_map._get_or_create(Album, json['id'], create)
+
+    def _create_song(self, json) -> Song:
+        if self._lazy:
+            return LazySong(json, self)
         return Song(
             name=json['name'],
             spotify_id=json['id'],
             duration_ms=json['duration_ms'],
             explicit=json['explicit'],
-            album=album,
-            artists=artists,
+            album=self._create_album(json['album']),
+            artists=[self._create_artist(a) for a in json['artists']],
             song_number=json['disc_number'],
             spotify_is_local=json['is_local']
         )
 
     def _create_songs(self, json):
-        return [self._create_song(li) for li in json]
+        # Spotify returns null in place of tracks it could not find
+        return [None if li is None else self._create_song(li) for li in json]
 
     def _get_songs_by_id(self, ids: list[str], token: str) -> list[Song]:
         """
         given a list of song ids and an access token, calls the API and with 
-        the returned JSON creates a list of Song objects
+        the returned JSON creates a list of Song objects. Songs in the cache 
+        are not requested again. Lists longer than the endpoint limit are 
+        split into chunks which are fetched concurrently, the result keeps 
+        the order of ids and holds None for ids Spotify could not find
         """
         if len(ids) == 0:
             return []
-        res = self._session.get(
-            url="{}tracks/?ids={}".format(self._base_url, ','.join(ids)),
-            headers=self._gen_header(token)).json()
-        
+        songs = self._get_memory_cached_songs(ids)
+        missing = [id for id in dict.fromkeys(ids) if id not in songs]
+        if len(missing) > 0:
+            self._add_fetched_songs(
+                songs, missing, self._get_tracks_json(missing, token))
+        return [songs[id] for id in ids]
+
+    def _get_memory_cached_songs(self, ids: list[str]) -> dict:
+        """
+        returns a dict from id to Song, or None if Spotify is known not to 
+        have it, for each of the given ids in the in-memory cache
+        """
+        songs = {}
+        for id in dict.fromkeys(ids):
+            song = self._get_memory_cached(id)
+            if song is not None:
+                songs[id] = None if song is NOT_FOUND else song
+        return songs
+
+    def _add_fetched_songs(
+        self,
+        songs: dict,
+        ids: list[str],
+        tracks: dict) -> None:
+        """
+        creates Songs for ids from their track JSON, adding them to songs and 
+        the in-memory cache
+        """
+        for id in ids:
+            if tracks[id] is None:
+                songs[id] = None
+                self._put_memory_cached(id, NOT_FOUND)
+            else:
+                songs[id] = self._create_song(tracks[id])
+                self._put_memory_cached(id, songs[id])
+
+    def _get_songs_table_by_id(self, ids: list[str], token: str) -> SongTable:
+        """
+        given a list of song ids and an access token, returns a SongTable of 
+        the songs built straight from the track JSON, ids Spotify could not 
+        find are left out
+        """
+        tracks = self._get_tracks_json(list(ids), token)
+        return SongTable.from_tracks(tracks[id] for id in ids)
+
+    def _get_tracks_json(self, ids: list[str], token: str) -> dict:
+        """
+        returns a dict from each of the given ids to its track JSON, or None 
+        if Spotify could not find it. Only ids missing from the cache are 
+        requested
+        """
+        tracks = self._get_cached_metadata('track', ids)
+        missing = [id for id in dict.fromkeys(ids) if id not in tracks]
+        chunks = self._chunk(missing, MAX_TRACK_IDS)
+        if len(chunks) <= 1:
+            results = [self._get_tracks_chunk(chunk, token) for chunk in chunks]
+        else:
+            results = self._get_executor().map(
+                lambda chunk: self._get_tracks_chunk(chunk, token), chunks)
+        self._merge_fetched_tracks(tracks, chunks, results)
+        return tracks
+
+    def _merge_fetched_tracks(
+        self,
+        tracks: dict,
+        chunks: list[list[str]],
+        results: list[list[dict]]) -> None:
+        """
+        adds the track JSON fetched for each chunk of ids to tracks and to the 
+        on-disk cache
+        """
+        fetched = {}
+        for chunk, result in zip(chunks, results):
+            fetched.update(zip(chunk, result))
+        self._store_cached_metadata(
+            'track',
+            {id: track for id, track in fetched.items() if track is not None})
+        tracks.update(fetched)
+
+    def _get_tracks_chunk(self, ids: list[str], token: str) -> list[dict]:
+        """
+        fetches the JSON of at most MAX_TRACK_IDS songs in a single API call
+        """
+        res = self._get_json(
+            'tracks',
+            "{}tracks/?ids={}".format(self._base_url, ','.join(ids)),
+            token)
+        return self._tracks_from_response(ids, res)
+
+    def _tracks_from_response(self, ids: list[str], res: dict) -> list[dict]:
+        """
+        returns the track JSON in a response for several tracks, or raises a 
+        RuntimeError if the response is an error
+        """
         if 'error' in res:
             message = "Spotify API failed to retrieve songs with ids " \
             + str(ids) + " because of the following error: " + str(res['error'])
             raise RuntimeError(message)
         else:
-            return self._create_songs(res['tracks'])
+            return res['tracks']
+
+    def _hydrate(
+        self,
+        songs: list[Song],
+        token: str,
+        artists: bool = True,
+        albums: bool = True) -> list[Song]:
+        """
+        fills in the genres of the artists and the songs and missing fields 
+        of the albums of the given songs. Each distinct artist and album is 
+        requested once through the multi-id endpoints, with every chunk of 
+        either kind fetched concurrently, and the result is set on every 
+        object with its id
+        """
+        targets = self._hydration_targets(songs, artists, albums)
+        found, requests = self._hydration_requests(targets)
+        if len(requests) <= 1:
+            results = [self._get_hydration_chunk(kind, chunk, token)
+                       for kind, chunk in requests]
+        else:
+            results = self._get_executor().map(
+                lambda request: self._get_hydration_chunk(*request, token),
+                requests)
+        fetched = self._fetched_by_kind(requests, results)
+        pages = self._album_track_pages(self._incomplete_albums(fetched))
+        if len(pages) <= 1:
+            results = [self._get_album_tracks_page(album, offset, token)
+                       for album, offset in pages]
+        else:
+            results = self._get_executor().map(
+                lambda page: self._get_album_tracks_page(*page, token), pages)
+        for (album, _), items in zip(pages, results):
+            album['tracks']['items'].extend(items)
+        self._store_hydrated(found, fetched)
+        self._attach_hydrated(songs, targets, found)
+        return songs
+
+    def _hydration_targets(
+        self,
+        songs: list[Song],
+        artists: bool,
+        albums: bool) -> dict:
+        """
+        returns a dict from kind ('artist' or 'album') to a dict from Spotify 
+        id to every distinct object with that id referenced by the songs. 
+        Artists with genres and albums with songs are already hydrated and 
+        left out
+        """
+        targets = {}
+
+        def add(kind: str, obj) -> None:
+            if obj is None or obj.spotify_id is None:
+                return
+            if (obj.genres if kind == 'artist' else obj.songs) is not None:
+                return
+            objects = targets.setdefault(kind, {}).setdefault(
+                obj.spotify_id, [])
+            if not any(o is obj for o in objects):
+                objects.append(obj)
+
+        for song in songs:
+            if song is None:
+                continue
+            album = song.album
+            if albums:
+                add('album', album)
+            if artists:
+                for artist in song.artists or []:
+                    add('artist', artist)
+                if album is not None:
+                    for artist in album.artists or []:
+                        add('artist', artist)
+        return targets
+
+    def _hydration_requests(self, targets: dict) -> tuple[dict, list]:
+        """
+        returns a dict from kind to the JSON of each target in the on-disk 
+        cache, and a list of (kind, ids) for the chunks of targets which 
+        have to be requested
+        """
+        found = {kind: self._get_cached_metadata(kind, list(ids))
+                 for kind, ids in targets.items()}
+        requests = [
+            (kind, chunk) for kind, ids in targets.items()
+            for chunk in self._chunk(
+                [id for id in ids if id not in found[kind]],
+                HYDRATE_ENDPOINTS[kind][1])]
+        return found, requests
+
+    def _get_hydration_chunk(
+        self,
+        kind: str,
+        ids: list[str],
+        token: str) -> list[dict]:
+        """
+        fetches the JSON of a chunk of artists or albums in a single API call
+        """
+        endpoint = HYDRATE_ENDPOINTS[kind][0]
+        res = self._get_json(
+            endpoint,
+            "{}{}?ids={}".format(self._base_url, endpoint, ','.join(ids)),
+            token)
+        return self._hydration_from_response(kind, ids, res)
+
+    def _hydration_from_response(
+        self,
+        kind: str,
+        ids: list[str],
+        res: dict) -> list[dict]:
+        """
+        returns the artist or album JSON in a response for several ids, or 
+        raises a RuntimeError if the response is an error
+        """
+        if 'error' in res:
+            message = "Spotify API failed to retrieve " + kind + "s with ids " \
+            + str(ids) + " because of the following error: " + str(res['error'])
+            raise RuntimeError(message)
+        else:
+            return res[HYDRATE_ENDPOINTS[kind][0]]
+
+    def _fetched_by_kind(self, requests: list, results: list) -> dict:
+        """
+        returns a dict from kind to a dict from id to the fetched JSON, or 
+        None if Spotify could not find it
+        """
+        fetched = {}
+        for (kind, chunk), result in zip(requests, results):
+            fetched.setdefault(kind, {}).update(zip(chunk, result))
+        return fetched
+
+    def _incomplete_albums(self, fetched: dict) -> list[dict]:
+        """
+        returns the fetched album JSON which only holds the first page of the 
+        album's songs
+        """
+        return [album for album in fetched.get('album', {}).values()
+                if album is not None and 
+                album['tracks'].get('next') is not None]
+
+    def _album_track_pages(self, albums: list[dict]) -> list[tuple]:
+        """
+        returns (album JSON, offset) for every page of songs missing from the 
+        given albums, in order. The album JSON already holds the first page, 
+        so pages start after its songs
+        """
+        pages = []
+        for album in albums:
+            tracks = album['tracks']
+            step = min(
+                tracks.get('limit') or MAX_ALBUM_TRACKS_PAGE,
+                MAX_ALBUM_TRACKS_PAGE)
+            pages.extend(
+                (album, offset) for offset in
+                range(len(tracks['items']), tracks['total'], step))
+        return pages
+
+    def _get_album_tracks_page(
+        self,
+        album: dict,
+        offset: int,
+        token: str) -> list[dict]:
+        """
+        fetches a page of an album's songs. Every album is requested under 
+        the endpoint name 'albums/tracks' so metrics and rate limits aren't 
+        split by album id
+        """
+        return self._get_page(
+            'albums/tracks',
+            "{}albums/{}/tracks".format(self._base_url, album['id']),
+            token,
+            {'offset': offset, 'limit': MAX_ALBUM_TRACKS_PAGE})['items']
+
+    def _store_hydrated(self, found: dict, fetched: dict) -> None:
+        """
+        adds the fetched JSON to found and to the on-disk cache
+        """
+        for kind, items in fetched.items():
+            self._store_cached_metadata(
+                kind,
+                {id: item for id, item in items.items() if item is not None})
+            found[kind].update(items)
+
+    def _attach_hydrated(
+        self,
+        songs: list[Song],
+        targets: dict,
+        found: dict) -> None:
+        """
+        sets the fetched fields on every target object. Album songs which are 
+        among the given songs are those Song objects
+        """
+        batch = {song.spotify_id: song for song in songs
+                 if song is not None and song.spotify_id is not None}
+        for id, json in found.get('artist', {}).items():
+            if json is None:
+                continue
+            for artist in targets['artist'][id]:
+                artist.genres = json.get('genres', [])
+                if artist.name is None:
+                    artist.name = json['name']
+        for id, json in found.get('album', {}).items():
+            if json is None:
+                continue
+            for album in targets['album'][id]:
+                self._fill_album(album, json, batch)
+
+    def _fill_album(self, album: Album, json: dict, batch: dict) -> None:
+        """
+        sets the songs and any missing fields of an album from its full JSON
+        """
+        if not album.artists:
+            album.artists = [self._create_artist(a) for a in json['artists']]
+        if album.name is None:
+            album.name = json['name']
+        if album.num_songs is None:
+            album.num_songs = json['total_tracks']
+        if album.spotify_album_type is None:
+            album.spotify_album_type = json['type']
+        if album.release_year is None:
+            album.release_year, album.release_month, album.release_day = \
+                self._parse_album_release(
+                    json['release_date'],
+                    json['release_date_precision'])
+        album.songs = [
+            batch.get(track['id']) or self._create_album_song(track, album)
+            for track in json['tracks']['items']]
 
-    def _get_saved_songs(self, token: str) -> Song:
+    def _create_album_song(self, json: dict, album: Album) -> Song:
+        """
+        creates a Song of album from the song JSON in an album response, 
+        which has no album of its own
+        """
+        return Song(
+            name=json['name'],
+            spotify_id=json['id'],
+            duration_ms=json['duration_ms'],
+            explicit=json['explicit'],
+            album=album,
+            artists=[self._create_artist(a) for a in json['artists']],
+            song_number=json['disc_number'],
+            spotify_is_local=json['is_local']
+        )
+
+    def _get_saved_songs(self, token: str) -> list[Song]:
         """
         gets saved songs for Spotify user
         """
-        res = self._session.get(
-            url="{}me/tracks".format(self._base_url),
-            headers=self._gen_header(token)).json()
-        
+        return self._get_all_pages(
+            "me/tracks",
+            token,
+            MAX_SAVED_PAGE,
+            lambda items: self._create_songs(item['track'] for item in items))
+
+    def _get_saved_songs_table(self, token: str) -> SongTable:
+        """
+        gets saved songs for Spotify user as a SongTable, built straight from 
+        the page JSON
+        """
+        return SongTable.from_tracks(self._get_all_pages(
+            "me/tracks",
+            token,
+            MAX_SAVED_PAGE,
+            lambda items: [item['track'] for item in items]))
+
+    def _get_saved_song_ids(self, token: str) -> list[tuple]:
+        """
+        gets (song id, added_at) for every song the user has saved, without 
+        creating Song objects
+        """
+        return self._get_all_pages(
+            "me/tracks",
+            token,
+            MAX_SAVED_PAGE,
+            lambda items:
+                [(item['track']['id'], item['added_at']) for item in items])
+
+    def _get_saved_song_ids_since(
+        self,
+        watermark: str,
+        token: str) -> tuple[list[tuple], int]:
+        """
+        gets (song id, added_at) for the songs the user saved at or after 
+        watermark, newest first, along with the total number of saved songs. 
+        Saved songs are ordered by when they were added, so pages are only 
+        requested until one reaches an older song
+        """
+        url = "{}me/tracks".format(self._base_url)
+        params = {'offset': 0, 'limit': MAX_SAVED_PAGE}
+        items = []
+        while url is not None:
+            res = self._get_page('me/tracks', url, token, params)
+            reached = self._saved_ids_since(res['items'], watermark, items)
+            url = None if reached else res['next']
+            params = None
+        return items, res['total']
+
+    def _saved_ids_since(
+        self,
+        page: list[dict],
+        watermark: str,
+        items: list[tuple]) -> bool:
+        """
+        appends (song id, added_at) for the songs of a page added at or after 
+        watermark to items, returns whether an older song was reached
+        """
+        for item in page:
+            if watermark is not None and item['added_at'] < watermark:
+                return True
+            items.append((item['track']['id'], item['added_at']))
+        return False
+
+    def _get_user_id(self, token: str) -> str:
+        """
+        gets the Spotify id of the user the token belongs to, it is only 
+        requested once per token
+        """
+        user_id = self._user_ids._get(token)
+        if user_id is None:
+            user_id = self._user_id_result(self._get_json(
+                'me',
+                "{}me".format(self._base_url),
+                token))
+            self._user_ids._put(token, user_id)
+        return user_id
+
+    def _user_id_result(self, res: dict) -> str:
         if 'error' in res:
-            message = "Spotify API failed to retrieve song with id " + str(id) \
+            message = "Spotify API failed to retrieve the current user " \
+            + "because of the following error: " + str(res['error'])
+            raise RuntimeError(message)
+        else:
+            return res['id']
+
+    def _get_page(
+        self,
+        endpoint: str,
+        url: str,
+        token: str,
+        params: dict = None) -> dict:
+        """
+        gets a single page of a paginated endpoint
+        """
+        res = self._get_json(endpoint, url, token, params)
+        return self._page_from_response(url, res)
+
+    def _page_from_response(self, url: str, res: dict) -> dict:
+        """
+        returns a page response, or raises a RuntimeError if it is an error
+        """
+        if 'error' in res:
+            message = "Spotify API failed to retrieve page " + str(url) \
             + " because of the following error: " + str(res['error'])
             raise RuntimeError(message)
         else:
-            ret_list = \
-            self._create_songs(item['track'] for item in res['items'])
-            while (next := res['next']) is not None:
-                ret_list.append(self._create_songs(res['items']))
-                res = self._session.get(
-                    url=next,
-                    headers=self._gen_header(token)).json()
-            return ret_list
+            return res
 
-    def _add_saved_songs(self, songs: list[str], token: str) -> bool:
+    def _get_all_pages(
+        self,
+        endpoint: str,
+        token: str,
+        limit: int,
+        parse: Callable[[list], list] = None,
+        params: dict = None) -> list:
+        """
+        gets every item of a paginated endpoint. The first page gives the 
+        total number of items, so the remaining pages are requested by offset 
+        in parallel and merged back in order. If given, parse is applied to 
+        the items of each page on the worker that fetched it. Offsets step by 
+        the page size the API actually used, in case it is below limit
+        """
+        if parse is None:
+            parse = list
+        url = "{}{}".format(self._base_url, endpoint)
+
+        def fetch(offset: int) -> list:
+            page_params = dict(params or {}, offset=offset, limit=limit)
+            return parse(
+                self._get_page(endpoint, url, token, page_params)['items'])
+
+        first = self._get_page(
+            endpoint, url, token, dict(params or {}, offset=0, limit=limit))
+        ret_list = parse(first['items'])
+        step = first.get('limit') or limit
+        for page in self._get_executor().map(
+                fetch, range(step, first['total'], step)):
+            ret_list.extend(page)
+        return ret_list
+
+    def _iter_saved_song_pages(
+        self,
+        get_token: Callable[[], str]) -> Iterator[list[Song]]:
+        """
+        yields the user's saved songs a page at a time, the next page is 
+        fetched in the background while the current one is parsed and 
+        consumed, so at most two pages are held at once. get_token returns 
+        the access token and is called for every page, so an iterator 
+        consumed for longer than the token lasts keeps working
+        """
+        for items in self._iter_saved_pages(get_token):
+            yield self._create_songs(item['track'] for item in items)
+
+    def _iter_saved_pages(
+        self,
+        get_token: Callable[[], str]) -> Iterator[list[dict]]:
+        """
+        yields the items of each page of the user's saved songs, each with 
+        'added_at' and 'track' JSON, fetching the next page in the background 
+        like _iter_saved_song_pages
+        """
+        executor = self._get_executor()
+        future = executor.submit(
+            self._get_page,
+            'me/tracks',
+            "{}me/tracks".format(self._base_url),
+            get_token(),
+            {'limit': MAX_SAVED_PAGE})
+        try:
+            while future is not None:
+                res = future.result()
+                if res['next'] is not None:
+                    future = executor.submit(
+                        self._get_page, 'me/tracks', res['next'], get_token())
+                else:
+                    future = None
+                yield res['items']
+        finally:
+            if future is not None:
+                future.cancel()
+
+    def _iter_tracks_json(
+        self,
+        ids: list[str],
+        get_token: Callable[[], str]) -> Iterator[list[dict]]:
         """
-        saves songs on spotify
+        yields the track JSON of ids a chunk of MAX_TRACK_IDS at a time, in 
+        order and with None for ids Spotify could not find. Up to max_workers 
+        chunks are fetched ahead in the background, so memory is bounded by 
+        that many chunks however many ids there are. get_token is called 
+        for every chunk
         """
-        res = self._session.put(
-            url="{}me/tracks/?ids={}".format(self._base_url, ','.join(songs)),
-            headers=self._gen_header(token))
-        
+        chunks = self._chunk(list(ids), MAX_TRACK_IDS)
+        executor = self._get_executor()
+        futures = deque()
         try:
-            if 'error' in res.json():
-                message = "Spotify API failed to save songs with ids " \
-                + str(songs) + \
-                " because of the following error: " + str(res['error'])
-                raise RuntimeError(message)
-        except JSONDecodeError:
-            return True
+            for chunk in chunks:
+                futures.append((chunk, executor.submit(
+                    self._get_tracks_json, chunk, get_token())))
+                if len(futures) >= self._max_workers:
+                    chunk, future = futures.popleft()
+                    tracks = future.result()
+                    yield [tracks[id] for id in chunk]
+            while len(futures) > 0:
+                chunk, future = futures.popleft()
+                tracks = future.result()
+                yield [tracks[id] for id in chunk]
+        finally:
+            for _, future in futures:
+                future.cancel()
+
+    def _iter_saved_songs(self, get_token: Callable[[], str]) -> Iterator[Song]:
+        """
+        yields the user's saved songs one at a time, see 
+        _iter_saved_song_pages
+        """
+        for page in self._iter_saved_song_pages(get_token):
+            yield from page
+
+    def _add_saved_songs(self, songs: list[str], token: str) -> bool:
+        """
+        saves songs on spotify, lists longer than the endpoint limit are 
+        split into chunks
+        """
+        for chunk in self._chunk(songs, MAX_TRACK_IDS):
+            res = self._request(
+                'PUT',
+                'me/tracks',
+                "{}me/tracks/?ids={}".format(self._base_url, ','.join(chunk)),
+                token)
+            self._saved_songs_result(
+                "save songs", chunk, self._json_or_none(res))
+        return True
 
     def _remove_saved_songs(self, songs: list[str], token: str) -> bool:
         """
-        removes saved songs on spotify
+        removes saved songs on spotify, lists longer than the endpoint limit 
+        are split into chunks
         """
-        res = self._session.delete(
-            url="{}me/tracks/?ids={}".format(self._base_url, ','.join(songs)),
-            headers=self._gen_header(token))
-        
+        for chunk in self._chunk(songs, MAX_TRACK_IDS):
+            res = self._request(
+                'DELETE',
+                'me/tracks',
+                "{}me/tracks/?ids={}".format(self._base_url, ','.join(chunk)),
+                token)
+            self._saved_songs_result(
+                "remove saved songs", chunk, self._json_or_none(res))
+        return True
+
+    def _decode(self, endpoint: str, res: 'Response'):
+        """
+        parses the JSON body of a response from endpoint, None if it has no 
+        body, raising a RuntimeError if it isn't JSON
+        """
+        if not res.content:
+            return None
         try:
-            if 'error' in res.json():
-                message = "Spotify API failed to remove saved songs with ids " \
-                + str(songs) + \
-                " because of the following error: " + str(res['error'])
-                raise RuntimeError(message)
-        except JSONDecodeError:
-            return True
+            return self._loads(res.content)
+        except ValueError:
+            message = "Spotify API returned a response to " \
+            + endpoint + " which isn't JSON with status code " \
+            + str(res.status_code)
+            raise RuntimeError(message)
 
-    def _check_saved_songs(self, songs: list[str], token: str) -> bool:
+    def _json_or_none(self, res: 'Response'):
         """
-        checks saved songs on spotify
+        returns the JSON body of a response, or None if it has none
+        """
+        try:
+            return self._loads(res.content)
+        except ValueError:
+            return None
+
+    def _saved_songs_result(self, action: str, songs: list[str], body) -> bool:
         """
-        res = self._session.get(
-            url="{}me/tracks/contains/?ids={}".format(self._base_url, 
+        checks the response body to saving or removing songs, raising a 
+        RuntimeError if it is an error
+        """
+        if isinstance(body, dict) and 'error' in body:
+            message = "Spotify API failed to " + action + " with ids " \
+            + str(songs) + \
+            " because of the following error: " + str(body['error'])
+            raise RuntimeError(message)
+        return True
+
+    def _check_saved_songs(self, songs: list[str], token: str) -> list[bool]:
+        """
+        checks saved songs on spotify, lists longer than the endpoint limit 
+        are split into chunks which are checked concurrently
+        """
+        chunks = self._chunk(songs, MAX_TRACK_IDS)
+        if len(chunks) <= 1:
+            results = [self._check_saved_chunk(chunk, token) for chunk in chunks]
+        else:
+            results = self._get_executor().map(
+                lambda chunk: self._check_saved_chunk(chunk, token), chunks)
+        return [saved for result in results for saved in result]
+
+    def _check_saved_chunk(self, songs: list[str], token: str) -> list[bool]:
+        """
+        checks at most MAX_TRACK_IDS saved songs in a single API call
+        """
+        res = self._get_json(
+            'me/tracks/contains',
+            "{}me/tracks/contains/?ids={}".format(self._base_url, 
             ','.join(songs)),
-            headers=self._gen_header(token)).json()
-        
+            token)
+        return self._check_saved_result(songs, res)
+
+    def _check_saved_result(self, songs: list[str], res) -> list[bool]:
+        """
+        returns the booleans in a response to checking saved songs, or raises 
+        a RuntimeError if it is an error
+        """
         if 'error' in res:
-            message = "Spotify API failed to remove saved songs with ids " \
+            message = "Spotify API failed to check saved songs with ids " \
             + str(songs) + \
             " because of the following error: " + str(res['error'])
             raise RuntimeError(message)
         else:
             return res
     
-    def _search_song(self, song: Song, token: str) -> bool:
+    def _search_song(self, song: Song, token: str) -> Song:
         """
-        searchs for a song with avaialable info
+        searchs for a song with avaialable info, the result of each distinct 
+        search is remembered in the search cache
         """
-        if song.name is None:
+        key = self._search_key(song)
+        if key is None:
             return song
+        track = self._search_cache._get(key)
+        if track is None:
+            res = self._get_json(
+                'search',
+                "{}search".format(self._base_url),
+                token,
+                self._search_params(song))
+            track = self._track_from_search(song, res)
+            self._search_cache._put(key, track)
+        return self._song_from_search(song, track)
+
+    def _populate_songs(self, songs: list[Song], token: str) -> list[Song]:
+        """
+        populates many songs at once. Songs with ids are fetched in batches, 
+        the others are searched for concurrently with each distinct search 
+        made only once
+        """
+        ids = [song.spotify_id for song in songs if song.spotify_id is not None]
+        found = dict(zip(ids, self._get_songs_by_id(ids, token)))
+        searches = self._distinct_searches(songs)
+        if len(searches) > 1:
+            # fills the search cache so the loop below doesn't hit the API
+            list(self._get_executor().map(
+                lambda song: self._search_song(song, token), searches))
+        return [self._populated(song, found) if song.spotify_id is not None
+                else self._search_song(song, token) for song in songs]
+
+    def _distinct_searches(self, songs: list[Song]) -> list[Song]:
+        """
+        returns one song without an id for each distinct search needed to 
+        populate songs
+        """
+        searches = {}
+        for song in songs:
+            if song.spotify_id is None:
+                key = self._search_key(song)
+                if key is not None and key not in searches:
+                    searches[key] = song
+        return list(searches.values())
+
+    def _populated(self, song: Song, found: dict) -> Song:
+        """
+        returns the song fetched for song's id, or song if it wasn't found
+        """
+        populated = found[song.spotify_id]
+        return song if populated is None else populated
+
+    def _search_key(self, song: Song) -> tuple:
+        """
+        returns the normalized (track, artist, album) a song is searched by, 
+        None if the song has no name to search for
+        """
+        if song.name is None:
+            return None
+        artist = None
+        if song.artists is not None and len(song.artists) > 0:
+            artist = song.artists[0].name
+        album = None if song.album is None else song.album.name
+        return tuple(
+            None if value is None else ' '.join(value.casefold().split())
+            for value in (song.name, artist, album))
+
+    def _search_params(self, song: Song) -> dict:
+        """
+        builds the query parameters to search for a song with avaialable 
+        info, None if the song has no name to search for. They are encoded 
+        by the transport, so names may hold any character
+        """
+        if song.name is None:
+            return None
+        query = 'track:{}'.format(song.name)
+        if song.artists is not None and len(song.artists) > 0 and \
+        song.artists[0].name is not None:
+            query += ' artist:{}'.format(song.artists[0].name)
+        if song.album is not None and song.album.name is not None:
+            query += ' album:{}'.format(song.album.name)
+        return {'q': query, 'type': 'track', 'limit': 1}
+
+    def _track_from_search(self, song: Song, res: dict):
+        """
+        returns the JSON of the top search result, or NOT_FOUND if there were 
+        no results
+        """
+        if 'error' in res:
+            message = "Spotify API failed to populate song " \
+            + song.name + \
+            " because of the following error: " + str(res['error'])
+            raise RuntimeError(message)
         else:
-            query_string = 'q=track:{}'.format(song.name, song.name)
-            if song.artists is not None and len(song.artists) > 0 and \
-            song.artists[0].name is not None:
-                query_string += ' artist:{}'.format(song.artists[0].name)
-            if song.album is not None and song.album.name is not None:
-                query_string += ' album:{}'.format(song.album.name)
-            
-            query_string += '&type=track&limit=1'
-
-            res = self._session.get(
-            url="{}search?{}".format(self._base_url, query_string),
-            headers=self._gen_header(token)).json()
-
-            if 'error' in res:
-                message = "Spotify API failed to populate song " \
-                + song.name + \
-                " because of the following error: " + str(res['error'])
-                raise RuntimeError(message)
+            if len(res['tracks']['items']) == 0:
+                return NOT_FOUND
             else:
-                if len(res['tracks']['items']) == 0:
-                    return song
-                else:
-                    return self._create_song(res['tracks']['items'][0])
-            
+                track = res['tracks']['items'][0]
+                self._store_cached_metadata('track', {track['id']: track})
+                return track
+
+    def _song_from_search(self, song: Song, track) -> Song:
+        """
+        creates a Song from a search result, or returns song if there were no 
+        results
+        """
+        if track is NOT_FOUND:
+            return song
+        return self._create_song(track)
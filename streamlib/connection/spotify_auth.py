@@ -1,11 +1,14 @@
 from datetime import datetime, timedelta
 import random
 import string
-from requests import Session
+import threading
+import time
 from urllib.parse import urlencode, urlparse, parse_qs
 from base64 import b64encode
 import warnings
 from ..cache import CacheHandler
+from ..metrics import Metrics
+from .transport import Transport, RequestsTransport
 
 # a list of all valid scopes the Spotify API allows. Read more here:
     # https://developer.spotify.com/documentation/general/guides/authorization/scopes/
@@ -21,6 +24,19 @@ ALL_SCOPES = ["ugc-image-upload", "user-read-playback-state",
 
 BASE_URL = "https://accounts.spotify.com/api/token"
 
+# access_token_expires of user credentials is stored as seconds since this
+EPOCH = datetime(1970, 1, 1)
+
+# how long the background refresher waits before retrying a failed refresh
+REFRESH_RETRY_SECONDS = 30
+# the number of seconds Spotify access tokens are valid for
+TOKEN_LIFETIME_SECONDS = 3600
+# the background refresher never renews a token earlier than this fraction of
+# its lifetime before it expires, nor more often than every
+# MIN_REFRESH_SECONDS, so a large margin can't make it refresh in a loop
+MAX_REFRESH_MARGIN_FRACTION = 0.5
+MIN_REFRESH_SECONDS = 30
+
 class SpotifyAuthCode:
 
     def __init__(
@@ -31,23 +47,37 @@ class SpotifyAuthCode:
             cache_handler: CacheHandler,
             scope: list[str] = ALL_SCOPES,
             check_cache: bool = True,
-            update_cache: bool = True):
+            update_cache: bool = True,
+            refresh_margin: float = None,
+            metrics: Metrics = None,
+            token_url: str = BASE_URL,
+            transport: Transport = None):
             """
             constructor for SpotifyAuthCode object, this should not be accessed 
-            directly
+            directly. Every token request is recorded in metrics and sent to 
+            token_url through transport
             """
             self._client_id: str = client_id
             self._client_secret: str = client_secret
             self._redirect_uri: str = redirect_uri
             self._cache_handler: CacheHandler = cache_handler
             self._scope: str = self._parse_scopes(scope)
-            self._session: Session = Session()
+            self._transport: Transport = transport if transport is not None \
+                else RequestsTransport(pool_size=1)
             self._access_token: str = None
             self._refresh_token: str = None
             self._access_token_expires: datetime = None
+            self._access_token_lifetime: float = None
             self._update_cache: bool = update_cache
+            self._refresh_lock = threading.Lock()
+            self._refresh_thread: threading.Thread = None
+            self._metrics: Metrics = metrics if metrics is not None \
+                else Metrics()
+            self._token_url: str = token_url
             if (not check_cache) or (not self._check_cache()):
                 self._prompt_user_login()
+            if refresh_margin is not None:
+                self._start_background_refresh(refresh_margin)
 
     def _check_cache(self) -> bool:
         """
@@ -92,12 +122,7 @@ class SpotifyAuthCode:
             'Content-Type': 'application/x-www-form-urlencoded',
         }
 
-        response = self._session.post(
-            url=self.BASE_URL,
-            params=payload,
-            headers=headers
-        ).json()
-        self._get_access_token_helper(headers, response)  
+        self._get_access_token_helper(payload, headers)
 
     def _verify_credentials(self, uri: str, state: str) -> None:
         """
@@ -146,54 +171,201 @@ class SpotifyAuthCode:
         helper method which takes a payload and headers to get an access token,
         and parses the response to set fields in the object
         """
-        response = self._session.post(
-                url=BASE_URL, 
+        start = time.perf_counter()
+        status = None
+        size = 0
+        try:
+            res = self._transport._request(
+                'POST',
+                self._token_url,
                 params=payload,
-                headers=headers).json()
+                headers=headers)
+            status = res.status_code
+            size = len(res.content)
+            response = res.json()
+        finally:
+            seconds = time.perf_counter() - start
+            self._metrics._observe_request(
+                'token', 'POST', status, seconds, size)
+            self._metrics._observe_token_refresh(
+                payload['grant_type'],
+                status is not None and status < 400,
+                seconds)
         if 'error' in response:
             error_message = \
             "Retrieving a token from the Spotify API failed with the " + \
             "following error: {}".format(response['error'])
             raise RuntimeError(error_message)
         else:
-            new_scopes = self._parse_scopes(response['scope'])
-            if not (set(new_scopes) == set(self._scope)):
+            new_scopes = response.get('scope', self._scope)
+            if not (set(new_scopes.split()) == set(self._scope.split())):
                 warnings.warn(
                     "Scopes allowed by Spotify don't match inputted scopes")
                 self._scope = new_scopes
-            else:
-                self._access_token = response['access_token']
-                if 'refresh_token' in response:
-                    self._refresh_token = response['refresh_token']
-                self._access_token_expires = datetime.utcnow() + \
-                    timedelta(seconds=response['expires_in'])
+            self._access_token = response['access_token']
+            if 'refresh_token' in response:
+                self._refresh_token = response['refresh_token']
+            self._access_token_lifetime = response['expires_in']
+            self._access_token_expires = datetime.utcnow() + \
+                timedelta(seconds=response['expires_in'])
         if self._update_cache:
-            self._cache_handler._store_spotify_auth_code_connection(
-                self._client_id,
-                self._client_secret,
-                self._redirect_uri,
-                self._scope,
-                self._access_token,
-                self._refresh_token,
-                self._access_token_expires
-            )
+            self._store_credentials()
+
+    def _store_credentials(self) -> None:
+        """
+        stores the current credentials in the cache
+        """
+        self._cache_handler._store_spotify_auth_code_connection(
+            self._client_id,
+            self._client_secret,
+            self._redirect_uri,
+            self._scope,
+            self._access_token,
+            self._refresh_token,
+            self._access_token_expires
+        )
+
+    def _needs_refresh(self, margin: float = 0) -> bool:
+        """
+        checks if the access token expires within margin seconds
+        """
+        return self._access_token_expires - timedelta(seconds=margin) < \
+            datetime.utcnow()
+
+    def _refresh_access_token(self) -> None:
+        """
+        uses the refresh token to get a new access token, callers must hold 
+        the refresh lock
+        """
+        payload = {
+            'grant_type':'refresh_token',
+            'refresh_token': self._refresh_token,
+        }
+        headers = {
+        'Authorization': 'Basic %s' %
+        b64encode('{}:{}'.format(self._client_id,
+                                 self._client_secret).
+                  encode('ascii')).decode('ascii'),
+        'Content-Type': 'application/x-www-form-urlencoded',
+        }
+        self._get_access_token_helper(payload, headers)
 
     def _get_access_token(self) -> str:
         """
         gets the access token if it hasn't yet expried, otherwise uses the 
-        refresh token to get a new access token
-        """
-        if self._access_token_expires < datetime.utcnow():
-            payload = {
-                'grant_type':'refresh_token',
-                'refresh_token': self._refresh_token,
-            }
-            headers = {
-            'Authorization': 'Basic %s' %
-            b64encode('{}:{}'.format(self._client_id,
-                                     self._client_secret).
-                      encode('ascii')).decode('ascii'),
-            'Content-Type': 'application/x-www-form-urlencoded',
-            }
-            self._get_access_token_helper(payload, headers)
+        refresh token to get a new access token. Only one thread refreshes at 
+        a time, any other thread that finds the token expired waits for that 
+        refresh and then uses its result
+        """
+        if self._needs_refresh():
+            with self._refresh_lock:
+                # another thread may have refreshed while this one waited
+                if self._needs_refresh():
+                    self._refresh_access_token()
         return self._access_token
+
+    def _start_background_refresh(self, margin: float) -> None:
+        """
+        starts a daemon thread which refreshes the access token margin 
+        seconds before it expires, so callers never wait on a refresh
+        """
+        self._stop_background_refresh()
+        self._stop_refresh = threading.Event()
+        self._refresh_thread = threading.Thread(
+            target=self._background_refresh,
+            args=(margin, self._stop_refresh),
+            name='streamlib-token-refresh',
+            daemon=True)
+        self._refresh_thread.start()
+
+    def _stop_background_refresh(self) -> None:
+        """
+        stops the background refresh thread if there is one
+        """
+        if self._refresh_thread is not None:
+            self._stop_refresh.set()
+            self._refresh_thread = None
+
+    def _background_refresh(self, margin: float, stop: threading.Event) \
+    -> None:
+        """
+        body of the background refresh thread. The margin is clamped to 
+        MAX_REFRESH_MARGIN_FRACTION of the token's lifetime, and a pass 
+        which refreshed waits at least MIN_REFRESH_SECONDS before the next
+        """
+        while not stop.is_set():
+            lifetime = self._access_token_lifetime or TOKEN_LIFETIME_SECONDS
+            effective_margin = min(
+                margin, lifetime * MAX_REFRESH_MARGIN_FRACTION)
+            wait = (self._access_token_expires - datetime.utcnow()) \
+                .total_seconds() - effective_margin
+            if wait > 0 and stop.wait(wait):
+                return
+            try:
+                with self._refresh_lock:
+                    refreshed = self._needs_refresh(effective_margin)
+                    if refreshed:
+                        self._refresh_access_token()
+            except Exception as e:
+                warnings.warn(
+                    "Background refresh of the Spotify access token failed "
+                    "with the following error: {}".format(e))
+                if stop.wait(REFRESH_RETRY_SECONDS):
+                    return
+            else:
+                if refreshed and stop.wait(MIN_REFRESH_SECONDS):
+                    return
+
+
+class SpotifyUserAuth(SpotifyAuthCode):
+
+    def __init__(
+            self,
+            user_key: str,
+            client_id: str,
+            client_secret: str,
+            redirect_uri: str,
+            cache_handler: CacheHandler,
+            scope: str,
+            access_token: str = None,
+            refresh_token: str = None,
+            access_token_expires: datetime = EPOCH,
+            metrics: Metrics = None,
+            token_url: str = BASE_URL,
+            transport: Transport = None):
+            """
+            constructor for SpotifyUserAuth object, this should not be 
+            accessed directly. It holds the credentials of one of the users 
+            of a ConnectionManager, which were stored under user_key and are 
+            stored there again after every refresh. It never prompts for a 
+            login, scope is a space separated string
+            """
+            self._user_key: str = user_key
+            self._client_id: str = client_id
+            self._client_secret: str = client_secret
+            self._redirect_uri: str = redirect_uri
+            self._cache_handler: CacheHandler = cache_handler
+            self._scope: str = scope
+            self._transport: Transport = transport
+            self._access_token: str = access_token
+            self._refresh_token: str = refresh_token
+            self._access_token_expires: datetime = access_token_expires
+            self._access_token_lifetime: float = None
+            self._update_cache: bool = True
+            self._refresh_lock = threading.Lock()
+            self._refresh_thread: threading.Thread = None
+            self._metrics: Metrics = metrics if metrics is not None \
+                else Metrics()
+            self._token_url: str = token_url
+
+    def _store_credentials(self) -> None:
+        """
+        stores the current credentials in the cache under the user key
+        """
+        self._cache_handler._store_spotify_user(
+            self._client_id,
+            self._user_key,
+            self._scope,
+            self._access_token,
+            self._refresh_token,
+            (self._access_token_expires - EPOCH).total_seconds())
@@ -0,0 +1,183 @@
+import threading
+
+# requests and httpx are imported when the first request is sent, so
+# importing streamlib and constructing a ConnectionObject stay fast
+
+# the default number of seconds to wait for a connection or a response
+DEFAULT_TIMEOUT = 30
+# the default number of pooled connections, requests only keeps 10
+DEFAULT_POOL_SIZE = 32
+
+class Transport:
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        compress: bool = True):
+        """
+        Constructor for Transport object, the HTTP client every connection
+        class sends its requests through. One Transport can be passed to
+        several ConnectionObjects so they share a single connection pool.
+
+        Subclasses implement _request and _close to swap in a different HTTP
+        library, see RequestsTransport and HttpxTransport. Responses must
+        have status_code, headers, content and json() like a requests
+        Response.
+
+        params:
+
+        (optional) pool_size: the maximum number of connections kept open
+        and reused. The default value is 32
+        (optional) timeout: the number of seconds to wait to connect and for
+        each response before giving up, None waits forever. The default value
+        is 30
+        (optional) compress: whether responses may be gzip compressed, which
+        saves bandwidth on large pages. The default value is True
+        """
+        self._pool_size = pool_size
+        self._timeout = timeout
+        self._compress = compress
+        self._lock = threading.Lock()
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        headers: dict = None):
+        """
+        sends a request and returns its response, raising if no response was
+        received
+        """
+        raise NotImplementedError
+
+    def _close(self) -> None:
+        """
+        closes every pooled connection
+        """
+        raise NotImplementedError
+
+    def _headers(self, headers: dict) -> dict:
+        """
+        adds the compression header to the headers of a request
+        """
+        return dict(
+            headers or {},
+            **{'Accept-Encoding': 'gzip' if self._compress else 'identity'})
+
+
+class RequestsTransport(Transport):
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        compress: bool = True):
+        """
+        Constructor for RequestsTransport object, the default Transport. It
+        keeps a pool of HTTP/1.1 keep-alive connections with the requests
+        library, see Transport for the params
+        """
+        super().__init__(pool_size, timeout, compress)
+        self._session = None
+
+    def _get_session(self):
+        """
+        creates the requests session on first use
+        """
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    from requests import Session
+                    from requests.adapters import HTTPAdapter
+                    session = Session()
+                    # a single adapter holds the pool for every host, so the 
+                    # Web API and the accounts service share the same limit
+                    adapter = HTTPAdapter(
+                        pool_connections=self._pool_size,
+                        pool_maxsize=self._pool_size)
+                    session.mount('https://', adapter)
+                    session.mount('http://', adapter)
+                    self._session = session
+        return self._session
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        headers: dict = None):
+        return self._get_session().request(
+            method,
+            url,
+            params=params,
+            headers=self._headers(headers),
+            timeout=self._timeout)
+
+    def _close(self) -> None:
+        if self._session is not None:
+            self._session.close()
+
+
+class HttpxTransport(Transport):
+
+    def __init__(
+        self,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        timeout: float = DEFAULT_TIMEOUT,
+        compress: bool = True,
+        http2: bool = True):
+        """
+        Constructor for HttpxTransport object, a Transport on the httpx
+        library which can multiplex every request over a single HTTP/2
+        connection per host. It requires httpx to be installed, and HTTP/2
+        also requires h2, install both with 'pip install httpx[http2]'. See
+        Transport for the other params
+
+        params:
+
+        (optional) http2: whether to use HTTP/2 with servers that support
+        it. The default value is True
+        """
+        try:
+            import httpx
+        except ImportError:
+            raise ImportError(
+                "HttpxTransport requires httpx, install it with "
+                "'pip install httpx[http2]'")
+        super().__init__(pool_size, timeout, compress)
+        self._httpx = httpx
+        self._http2 = http2
+        self._client = None
+
+    def _get_client(self):
+        """
+        creates the httpx client on first use
+        """
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self._httpx.Client(
+                        http2=self._http2,
+                        timeout=self._timeout,
+                        limits=self._httpx.Limits(
+                            max_connections=self._pool_size,
+                            max_keepalive_connections=self._pool_size))
+        return self._client
+
+    def _request(
+        self,
+        method: str,
+        url: str,
+        params: dict = None,
+        headers: dict = None):
+        return self._get_client().request(
+            method,
+            url,
+            params=params,
+            headers=self._headers(headers))
+
+    def _close(self) -> None:
+        if self._client is not None:
+            self._client.close()
@@ -0,0 +1,209 @@
+from concurrent.futures import Future
+from typing import Callable
+import queue
+import threading
+
+SAVE = 'save'
+REMOVE = 'remove'
+# the result of each queued intent's Future
+OUTCOMES = {SAVE: 'saved', REMOVE: 'removed'}
+CANCELLED = 'cancelled'
+
+class WriteQueue:
+
+    def __init__(
+        self,
+        write: Callable[[str, list], None],
+        window: float,
+        max_batch: int):
+        """
+        constructor for WriteQueue object, this should not be accessed
+        directly. Save and remove intents are buffered and written with
+        write, which takes an action (SAVE or REMOVE) and a list of ids and
+        raises if the write failed. A save and a remove of the same id cancel
+        out without a request. An action is written once max_batch ids are
+        waiting for it, and everything is written window seconds after the
+        first pending intent, or when _flush is called. If window is None
+        intents only wait for a full batch or _flush. Batches are written in
+        the order they were taken by a worker thread, so callers never wait
+        on a write they didn't ask to flush
+        """
+        self._write = write
+        self._window = window
+        self._max_batch = max_batch
+        self._lock = threading.Lock()
+        self._pending: dict = {}
+        self._counts = {SAVE: 0, REMOVE: 0}
+        self._timer: threading.Timer = None
+        self._batches: queue.Queue = None
+        self._worker: threading.Thread = None
+
+    def _enqueue(self, action: str, id: str) -> Future:
+        """
+        queues an intent and returns a Future for its outcome, 'saved',
+        'removed' or 'cancelled'. Repeating a pending intent shares its
+        Future
+        """
+        cancelled = None
+        with self._lock:
+            entry = self._pending.get(id)
+            if entry is not None and entry[0] == action:
+                return entry[1]
+            if entry is not None:
+                del self._pending[id]
+                self._counts[entry[0]] -= 1
+                cancelled = entry[1]
+                future = self._create_future()
+                if len(self._pending) == 0:
+                    self._cancel_timer()
+            else:
+                future = self._create_future()
+                self._pending[id] = (action, future)
+                self._counts[action] += 1
+                if self._counts[action] >= self._max_batch:
+                    self._submit(self._take_batch(action))
+                elif self._timer is None and self._window is not None:
+                    self._start_timer()
+        if cancelled is not None:
+            cancelled.set_result(CANCELLED)
+            future.set_result(CANCELLED)
+        return future
+
+    def _create_future(self) -> Future:
+        """
+        returns the Future of a queued intent
+        """
+        return Future()
+
+    def _start_timer(self) -> None:
+        """
+        writes every pending intent in window seconds, callers must hold the
+        lock
+        """
+        self._timer = threading.Timer(self._window, self._flush)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _take_batch(self, action: str = None) -> dict:
+        """
+        removes and returns the pending intents for action, or every pending
+        intent if action is None, callers must hold the lock
+        """
+        if action is None:
+            batch = self._pending
+            self._pending = {}
+            self._counts = {SAVE: 0, REMOVE: 0}
+        else:
+            batch = {id: entry for id, entry in self._pending.items()
+                     if entry[0] == action}
+            for id in batch:
+                del self._pending[id]
+            self._counts[action] = 0
+        if len(self._pending) == 0:
+            self._cancel_timer()
+        return batch
+
+    def _cancel_timer(self) -> None:
+        """
+        stops the pending flush, callers must hold the lock
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _flush(self) -> dict:
+        """
+        writes every pending intent now and returns a dict from id to its
+        outcome, or to the exception raised while writing it
+        """
+        with self._lock:
+            done = self._submit(self._take_batch())
+        return done.result()
+
+    def _close(self) -> dict:
+        """
+        writes every pending intent like _flush, then stops the worker thread 
+        and waits for it to exit. Intents queued afterwards start a new one
+        """
+        with self._lock:
+            if self._worker is None and len(self._pending) == 0:
+                return {}
+            done = self._submit(self._take_batch())
+            worker = self._worker
+            self._batches.put(None)
+            self._worker = None
+        outcomes = done.result()
+        worker.join()
+        return outcomes
+
+    def _submit(self, batch: dict) -> Future:
+        """
+        queues a batch for the worker thread, starting it on first use, and
+        returns a Future for the batch's outcomes. Callers must hold the
+        lock, so batches are queued in the order they were taken
+        """
+        done = Future()
+        if self._worker is None:
+            # a worker stopped by _close may still be reading its queue
+            self._batches = queue.Queue()
+            self._worker = threading.Thread(
+                target=self._write_batches,
+                args=(self._batches,),
+                name='streamlib-write-queue',
+                daemon=True)
+            self._worker.start()
+        self._batches.put((batch, done))
+        return done
+
+    def _write_batches(self, batches: queue.Queue) -> None:
+        """
+        body of the worker thread, it writes batches from batches one at a 
+        time until it takes the None queued by _close
+        """
+        while (item := batches.get()) is not None:
+            batch, done = item
+            done.set_result(self._dispatch(batch))
+
+    def _dispatch(self, batch: dict) -> dict:
+        """
+        writes a batch of intents, at most max_batch ids per call to write,
+        and hands each outcome to its Future
+        """
+        outcomes = {}
+        for action, chunk in self._chunks(batch):
+            try:
+                self._write(action, chunk)
+            except Exception as e:
+                self._settle(batch, chunk, outcomes, error=e)
+            else:
+                self._settle(batch, chunk, outcomes, action=action)
+        return outcomes
+
+    def _chunks(self, batch: dict):
+        """
+        yields the action and ids of each call to write for a batch, removes
+        before saves and at most max_batch ids at a time
+        """
+        for action in (REMOVE, SAVE):
+            ids = [id for id, entry in batch.items() if entry[0] == action]
+            for i in range(0, len(ids), self._max_batch):
+                yield action, ids[i:i + self._max_batch]
+
+    def _settle(
+        self,
+        batch: dict,
+        chunk: list[str],
+        outcomes: dict,
+        action: str = None,
+        error: Exception = None) -> None:
+        """
+        hands the outcome of writing a chunk, or the error raised while
+        writing it, to the Future of each of its ids
+        """
+        for id in chunk:
+            if error is not None:
+                batch[id][1].set_exception(error)
+                outcomes[id] = error
+            else:
+                batch[id][1].set_result(OUTCOMES[action])
+                outcomes[id] = OUTCOMES[action]
@@ -0,0 +1,348 @@
+from bisect import bisect_left
+from typing import Callable
+from weakref import WeakSet
+import threading
+import warnings
+
+# upper bounds in seconds of the request latency histogram buckets
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+class Metrics:
+
+    def __init__(self, buckets: tuple = DEFAULT_BUCKETS):
+        """
+        Constructor for Metrics object, a registry of what a ConnectionObject
+        does: per-endpoint request counts by status, latency histograms and
+        response bytes, token refreshes, and cache operations with their hit
+        ratios. The registry of a ConnectionObject is returned by its
+        get_metrics method, and one registry can be shared by several
+        ConnectionObjects by passing it to their constructors.
+
+        Every recorded event is also passed to the hooks registered with
+        add_hook.
+
+        params:
+
+        (optional) buckets: the upper bounds in seconds of the latency
+        histogram buckets
+        """
+        self._buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._hooks = []
+        # (endpoint, method) -> {status: count}
+        self._requests = {}
+        # (endpoint, method) -> [bucket counts..., +Inf count]
+        self._latency_buckets = {}
+        self._latency_sum = {}
+        self._bytes = {}
+        # (grant_type, outcome) -> count
+        self._token_refreshes = {}
+        # (store, operation) -> [calls, hits, misses, seconds]
+        self._cache = {}
+        # store -> every LRUCache registered under that name
+        self._lru_caches = {}
+
+    def add_hook(self, hook: Callable[[dict], None]) -> None:
+        """
+        This method registers a function which is called with a dict
+        describing every event as it is recorded. Request events have the
+        keys 'type' ('request'), 'endpoint', 'method', 'status' (None if no
+        response was received), 'seconds' and 'bytes'. Token refresh events
+        have 'type' ('token_refresh'), 'grant_type', 'success' and 'seconds'.
+        Cache events have 'type' ('cache'), 'store', 'operation', 'seconds',
+        'hits' and 'misses'. Hooks run on the thread making the call, so
+        they should be fast, and exceptions they raise are turned into
+        warnings.
+
+        params:
+
+        hook: a function taking an event dict
+        """
+        with self._lock:
+            self._hooks = self._hooks + [hook]
+
+    def remove_hook(self, hook: Callable[[dict], None]) -> None:
+        """
+        This method unregisters a function registered with add_hook.
+
+        params:
+
+        hook: the function to unregister
+        """
+        with self._lock:
+            self._hooks = [h for h in self._hooks if h is not hook]
+
+    def snapshot(self) -> dict:
+        """
+        This method returns a copy of every metric recorded so far.
+
+        returns:
+
+        a dict with the keys 'requests', a dict from endpoint to method to a
+        dict of 'count', 'errors', 'statuses', 'bytes', 'seconds' and
+        'buckets' (a dict from bucket upper bound to the cumulative number of
+        requests which took at most that long), 'token_refreshes', a dict
+        from grant type to a dict from 'success' or 'error' to a count, and
+        'cache', a dict from store to operation to a dict of 'calls',
+        'hits', 'misses', 'hit_ratio' and 'seconds'
+        """
+        with self._lock:
+            requests = {}
+            for (endpoint, method), statuses in self._requests.items():
+                counts = self._latency_buckets[(endpoint, method)]
+                cumulative = []
+                total = 0
+                for count in counts:
+                    total += count
+                    cumulative.append(total)
+                requests.setdefault(endpoint, {})[method] = {
+                    'count': total,
+                    'errors': sum(count for status, count in statuses.items()
+                                  if status is None or status >= 400),
+                    'statuses': dict(statuses),
+                    'bytes': self._bytes[(endpoint, method)],
+                    'seconds': self._latency_sum[(endpoint, method)],
+                    'buckets': dict(zip(
+                        self._buckets + (float('inf'),), cumulative)),
+                }
+            token_refreshes = {}
+            for (grant_type, outcome), count in self._token_refreshes.items():
+                token_refreshes.setdefault(grant_type, {})[outcome] = count
+            cache = {}
+            for (store, operation), (calls, hits, misses, seconds) in \
+                    self._cache.items():
+                cache.setdefault(store, {})[operation] = \
+                    self._cache_entry(calls, hits, misses, seconds)
+            lru_caches = {name: list(caches)
+                          for name, caches in self._lru_caches.items()}
+        for name, caches in lru_caches.items():
+            if len(caches) == 0:
+                continue
+            hits = 0
+            misses = 0
+            for lru in caches:
+                stats = lru._stats()
+                hits += stats['hits']
+                misses += stats['misses']
+            cache.setdefault(name, {})['get'] = self._cache_entry(
+                hits + misses, hits, misses, None)
+        return {
+            'requests': requests,
+            'token_refreshes': token_refreshes,
+            'cache': cache,
+        }
+
+    def to_prometheus(self) -> str:
+        """
+        This method renders every metric in the Prometheus text exposition
+        format, for serving from a /metrics endpoint.
+
+        returns:
+
+        the metrics as a string
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def metric(name: str, kind: str, help: str, samples: list) -> None:
+            lines.append("# HELP {} {}".format(name, help))
+            lines.append("# TYPE {} {}".format(name, kind))
+            for suffix, labels, value in samples:
+                lines.append("{}{}{{{}}} {}".format(
+                    name,
+                    suffix,
+                    ",".join('{}="{}"'.format(k, self._escape(v))
+                             for k, v in labels),
+                    self._format_value(value)))
+
+        requests = [(endpoint, method, values)
+                    for endpoint, methods in snapshot['requests'].items()
+                    for method, values in methods.items()]
+        metric(
+            "streamlib_requests_total",
+            "counter",
+            "HTTP requests sent, by response status",
+            [("", [("endpoint", endpoint), ("method", method),
+                   ("status", "none" if status is None else status)], count)
+             for endpoint, method, values in requests
+             for status, count in values['statuses'].items()])
+        metric(
+            "streamlib_request_errors_total",
+            "counter",
+            "HTTP requests which failed or returned an error status",
+            [("", [("endpoint", endpoint), ("method", method)],
+              values['errors'])
+             for endpoint, method, values in requests])
+        metric(
+            "streamlib_response_bytes_total",
+            "counter",
+            "bytes of HTTP response bodies received",
+            [("", [("endpoint", endpoint), ("method", method)],
+              values['bytes'])
+             for endpoint, method, values in requests])
+        samples = []
+        for endpoint, method, values in requests:
+            labels = [("endpoint", endpoint), ("method", method)]
+            for bound, count in values['buckets'].items():
+                samples.append(("_bucket", labels + [("le", 
+                    self._format_value(bound))], count))
+            samples.append(("_sum", labels, values['seconds']))
+            samples.append(("_count", labels, values['count']))
+        metric(
+            "streamlib_request_duration_seconds",
+            "histogram",
+            "HTTP request latency",
+            samples)
+        metric(
+            "streamlib_token_refreshes_total",
+            "counter",
+            "access token requests, by grant type and outcome",
+            [("", [("grant_type", grant_type), ("outcome", outcome)], count)
+             for grant_type, outcomes in snapshot['token_refreshes'].items()
+             for outcome, count in outcomes.items()])
+        caches = [(store, operation, values)
+                  for store, operations in snapshot['cache'].items()
+                  for operation, values in operations.items()]
+        for name, key, help in (
+                ("streamlib_cache_operations_total", 'calls',
+                 "cache operations"),
+                ("streamlib_cache_hits_total", 'hits',
+                 "keys found by cache lookups"),
+                ("streamlib_cache_misses_total", 'misses',
+                 "keys not found by cache lookups"),
+                ("streamlib_cache_operation_seconds_total", 'seconds',
+                 "time spent in cache operations")):
+            metric(name, "counter", help,
+                   [("", [("store", store), ("operation", operation)],
+                     values[key])
+                    for store, operation, values in caches
+                    if values[key] is not None])
+        return "\n".join(lines) + "\n"
+
+    def _register_lru_cache(self, name: str, cache) -> None:
+        """
+        includes the hit and miss counters of an LRUCache in snapshots under
+        the store name, summed with every other cache registered under it. 
+        Caches are held weakly, once one is garbage collected its counts 
+        are no longer included
+        """
+        with self._lock:
+            self._lru_caches.setdefault(name, WeakSet()).add(cache)
+
+    def _observe_request(
+        self,
+        endpoint: str,
+        method: str,
+        status: int,
+        seconds: float,
+        size: int) -> None:
+        """
+        records a single HTTP request, status is None if no response was
+        received
+        """
+        key = (endpoint, method)
+        with self._lock:
+            statuses = self._requests.get(key)
+            if statuses is None:
+                statuses = self._requests[key] = {}
+                self._latency_buckets[key] = [0] * (len(self._buckets) + 1)
+                self._latency_sum[key] = 0.0
+                self._bytes[key] = 0
+            statuses[status] = statuses.get(status, 0) + 1
+            self._latency_buckets[key][
+                bisect_left(self._buckets, seconds)] += 1
+            self._latency_sum[key] += seconds
+            self._bytes[key] += size
+            hooks = self._hooks
+        if len(hooks) > 0:
+            self._emit(hooks, {
+                'type': 'request',
+                'endpoint': endpoint,
+                'method': method,
+                'status': status,
+                'seconds': seconds,
+                'bytes': size,
+            })
+
+    def _observe_token_refresh(
+        self,
+        grant_type: str,
+        success: bool,
+        seconds: float) -> None:
+        """
+        records a request for an access token
+        """
+        key = (grant_type, 'success' if success else 'error')
+        with self._lock:
+            self._token_refreshes[key] = self._token_refreshes.get(key, 0) + 1
+            hooks = self._hooks
+        if len(hooks) > 0:
+            self._emit(hooks, {
+                'type': 'token_refresh',
+                'grant_type': grant_type,
+                'success': success,
+                'seconds': seconds,
+            })
+
+    def _observe_cache(
+        self,
+        store: str,
+        operation: str,
+        seconds: float,
+        hits: int = 0,
+        misses: int = 0) -> None:
+        """
+        records a cache operation and how many keys it found and missed
+        """
+        key = (store, operation)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                entry = self._cache[key] = [0, 0, 0, 0.0]
+            entry[0] += 1
+            entry[1] += hits
+            entry[2] += misses
+            entry[3] += seconds
+            hooks = self._hooks
+        if len(hooks) > 0:
+            self._emit(hooks, {
+                'type': 'cache',
+                'store': store,
+                'operation': operation,
+                'seconds': seconds,
+                'hits': hits,
+                'misses': misses,
+            })
+
+    def _emit(self, hooks: list, event: dict) -> None:
+        for hook in hooks:
+            try:
+                hook(event)
+            except Exception as e:
+                warnings.warn(
+                    "A metrics hook failed with the following error: "
+                    "{}".format(e))
+
+    def _cache_entry(
+        self,
+        calls: int,
+        hits: int,
+        misses: int,
+        seconds: float) -> dict:
+        lookups = hits + misses
+        return {
+            'calls': calls,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups > 0 else None,
+            'seconds': seconds,
+        }
+
+    def _escape(self, value) -> str:
+        return str(value).replace('\\', '\\\\').replace('"', '\\"') \
+            .replace('\n', '\\n')
+
+    def _format_value(self, value) -> str:
+        if value == float('inf'):
+            return "+Inf"
+        return repr(value) if isinstance(value, float) else str(value)
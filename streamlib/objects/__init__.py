@@ -1,3 +1,5 @@
 from .album import Album
 from .artist import Artist
-from .song import Song
\ No newline at end of file
+from .song import Song
+from .identity_map import IdentityMap
+from .song_table import SongTable
@@ -1,5 +1,19 @@
 
 class Album:
+    __slots__ = (
+        'name',
+        'artists',
+        'songs',
+        'num_songs',
+        'spotify_album_type',
+        'spotify_id',
+        'release_year',
+        'release_month',
+        'release_day',
+        'disc_number',
+        '__weakref__',
+    )
+
     def __init__(
         self,
         name: str = None,
@@ -21,5 +35,10 @@ class Album:
         self.spotify_id = spotify_id
         self.release_year = release_year
         self.release_month = release_month
-        self.realase_day = release_day
-        self.disc_number = disc_number
\ No newline at end of file
+        self.release_day = release_day
+        self.disc_number = disc_number
+
+    @property
+    def realase_day(self) -> int:
+        # misspelled name kept for code written against earlier versions
+        return self.release_day
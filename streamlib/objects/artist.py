@@ -1,6 +1,8 @@
 
 
 class Artist:
+    __slots__ = ('name', 'spotify_id', 'genres', '__weakref__')
+
     def __init__(
         self,
         name: str = None,
@@ -9,4 +11,4 @@ class Artist:
     ):
         self.name = name
         self.spotify_id = spotify_id
-        self.genres = genres
\ No newline at end of file
+        self.genres = genres
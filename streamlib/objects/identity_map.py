@@ -0,0 +1,43 @@
+from typing import Callable
+from weakref import WeakValueDictionary
+import threading
+
+class IdentityMap:
+
+    def __init__(self):
+        """
+        constructor for IdentityMap object, which hands out a single shared
+        instance per object type and Spotify id for as long as anything
+        references it, this should not be accessed directly
+        """
+        self._objects = WeakValueDictionary()
+        # reentrant as creating an album creates its artists
+        self._lock = threading.RLock()
+
+    def _get_or_create(self, cls: type, spotify_id: str, create: Callable):
+        """
+        returns the live instance of cls with spotify_id, calling create to
+        make and register one if there is none. Objects without an id are
+        never shared
+        """
+        if spotify_id is None:
+            return create()
+        key = (cls, spotify_id)
+        obj = self._objects.get(key)
+        if obj is not None:
+            return obj
+        with self._lock:
+            obj = self._objects.get(key)
+            if obj is None:
+                obj = create()
+                self._objects[key] = obj
+            return obj
+
+    def _get(self, cls: type, spotify_id: str):
+        """
+        returns the live instance of cls with spotify_id, or None
+        """
+        return self._objects.get((cls, spotify_id))
+
+    def __len__(self) -> int:
+        return len(self._objects)
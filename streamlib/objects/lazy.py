@@ -0,0 +1,103 @@
+from streamlib.objects.album import Album
+from streamlib.objects.artist import Artist
+from streamlib.objects.song import Song
+
+# how each field of a lazy object is read from its JSON, factory is the
+# SpotifyAPI which parsed it and creates the shared albums and artists
+SONG_FIELDS = {
+    'name': lambda json, factory: json['name'],
+    'artists': lambda json, factory:
+        [factory._create_artist(a) for a in json['artists']],
+    'album': lambda json, factory: factory._create_album(json['album']),
+    'spotify_id': lambda json, factory: json['id'],
+    'duration_ms': lambda json, factory: json['duration_ms'],
+    'explicit': lambda json, factory: json['explicit'],
+    'song_number': lambda json, factory: json['disc_number'],
+    'spotify_is_local': lambda json, factory: json['is_local'],
+}
+ALBUM_FIELDS = {
+    'name': lambda json, factory: json['name'],
+    'artists': lambda json, factory:
+        [factory._create_artist(a) for a in json.get('artists', [])],
+    'songs': lambda json, factory: None,
+    'num_songs': lambda json, factory: json['total_tracks'],
+    'spotify_album_type': lambda json, factory: json['type'],
+    'spotify_id': lambda json, factory: json['id'],
+    'release_year': lambda json, factory: factory._parse_album_release(
+        json['release_date'], json['release_date_precision'])[0],
+    'release_month': lambda json, factory: factory._parse_album_release(
+        json['release_date'], json['release_date_precision'])[1],
+    'release_day': lambda json, factory: factory._parse_album_release(
+        json['release_date'], json['release_date_precision'])[2],
+    'disc_number': lambda json, factory: None,
+}
+ARTIST_FIELDS = {
+    'name': lambda json, factory: json['name'],
+    'spotify_id': lambda json, factory: json['id'],
+    'genres': lambda json, factory: json.get('genres'),
+}
+
+def _materialize(obj, fields: dict, name: str):
+    """
+    reads field name of a lazy object from its JSON and stores it in the
+    object's slot, so later reads are plain attribute lookups
+    """
+    loader = fields.get(name)
+    if loader is None:
+        raise AttributeError(
+            "'{}' object has no attribute '{}'".format(
+                type(obj).__name__, name))
+    value = loader(obj._json, obj._factory)
+    setattr(obj, name, value)
+    return value
+
+
+class LazySong(Song):
+    __slots__ = ('_json', '_factory')
+
+    def __init__(self, json: dict, factory):
+        """
+        constructor for LazySong object, a Song which reads each field from
+        the API JSON the first time it is accessed, this should not be
+        accessed directly
+        """
+        self._json = json
+        self._factory = factory
+
+    def __getattr__(self, name: str):
+        # only called for fields which haven't been read yet
+        return _materialize(self, SONG_FIELDS, name)
+
+
+class LazyAlbum(Album):
+    __slots__ = ('_json', '_factory')
+
+    def __init__(self, json: dict, factory):
+        """
+        constructor for LazyAlbum object, an Album which reads each field from
+        the API JSON the first time it is accessed, this should not be
+        accessed directly
+        """
+        self._json = json
+        self._factory = factory
+
+    def __getattr__(self, name: str):
+        # only called for fields which haven't been read yet
+        return _materialize(self, ALBUM_FIELDS, name)
+
+
+class LazyArtist(Artist):
+    __slots__ = ('_json', '_factory')
+
+    def __init__(self, json: dict, factory):
+        """
+        constructor for LazyArtist object, an Artist which reads each field
+        from the API JSON the first time it is accessed, this should not be
+        accessed directly
+        """
+        self._json = json
+        self._factory = factory
+
+    def __getattr__(self, name: str):
+        # only called for fields which haven't been read yet
+        return _materialize(self, ARTIST_FIELDS, name)
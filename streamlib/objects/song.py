@@ -2,6 +2,18 @@ from streamlib.objects.album import Album
 from streamlib.objects.artist import Artist
 
 class Song:
+    __slots__ = (
+        'name',
+        'artists',
+        'album',
+        'duration_ms',
+        'spotify_id',
+        'explicit',
+        'song_number',
+        'spotify_is_local',
+        '__weakref__',
+    )
+
     def __init__(
         self,
         name: str = None,
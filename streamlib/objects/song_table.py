@@ -0,0 +1,411 @@
+from typing import Iterable, Iterator
+from streamlib.objects.album import Album
+from streamlib.objects.artist import Artist
+from streamlib.objects.song import Song
+
+# numpy is imported by _import_numpy when the first table is built, it takes
+# longer to import than the rest of streamlib
+np = None
+
+# numeric columns and their dtypes, missing values are stored as -1
+NUMERIC_COLUMNS = {
+    'duration_ms': 'int64',
+    'song_number': 'int16',
+    'album_num_songs': 'int32',
+    'release_year': 'int16',
+    'release_month': 'int8',
+    'release_day': 'int8',
+}
+BOOLEAN_COLUMNS = ('explicit', 'spotify_is_local')
+# dictionary encoded columns, artist_id and artist_name hold the first artist
+# and artists holds every (id, name) pair
+STRING_COLUMNS = (
+    'spotify_id',
+    'name',
+    'artist_id',
+    'artist_name',
+    'artists',
+    'album_id',
+    'album_name',
+    'album_type',
+)
+AGGREGATIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+class SongTable:
+
+    def __init__(self, columns: dict, categories: dict):
+        """
+        Constructor for SongTable object, a columnar collection of songs for
+        fast filtering, sorting and aggregation over whole libraries. It
+        requires NumPy to be installed. Tables are made with
+        SongTable.from_songs, SongTable.from_tracks or by the ConnectionObject
+        methods that take as_table=True.
+
+        Numeric and boolean columns are NumPy arrays, string columns are
+        stored as NumPy arrays of codes into a list of distinct values
+        """
+        self._columns = columns
+        self._categories = categories
+
+    @classmethod
+    def from_tracks(cls, tracks: Iterable[dict]) -> 'SongTable':
+        """
+        This method builds a SongTable straight from Spotify API track JSON,
+        without creating Song objects. Tracks which are None are skipped.
+
+        params:
+
+        tracks: an iterable of track JSON objects
+
+        returns:
+
+        a SongTable
+        """
+        builder = _SongTableBuilder()
+        for track in tracks:
+            if track is not None:
+                builder._add_track(track)
+        return builder._build()
+
+    @classmethod
+    def from_songs(cls, songs: Iterable[Song]) -> 'SongTable':
+        """
+        This method builds a SongTable from Song objects. Songs which are
+        None are skipped.
+
+        params:
+
+        songs: an iterable of Song objects
+
+        returns:
+
+        a SongTable
+        """
+        builder = _SongTableBuilder()
+        for song in songs:
+            if song is not None:
+                builder._add_song(song)
+        return builder._build()
+
+    def __len__(self) -> int:
+        return len(self._columns['duration_ms'])
+
+    @property
+    def columns(self) -> list[str]:
+        return list(NUMERIC_COLUMNS) + list(BOOLEAN_COLUMNS) + \
+            list(STRING_COLUMNS)
+
+    def __getitem__(self, column: str):
+        """
+        returns a column as a NumPy array, string columns are decoded to an
+        array of objects and missing numbers are -1
+        """
+        if column in self._categories:
+            return self._decode(column, self._columns[column])
+        return self._columns[column]
+
+    def codes(self, column: str):
+        """
+        This method returns the integer codes of a string column together
+        with the list of values they index, which is much faster to compare
+        than decoded strings.
+
+        params:
+
+        column: the name of a string column
+
+        returns:
+
+        a tuple of the NumPy array of codes and the list of values
+        """
+        return self._columns[column], self._categories[column]
+
+    def equals(self, column: str, value):
+        """
+        This method returns a boolean mask of the rows whose column equals
+        value, without decoding the column.
+
+        params:
+
+        column: the name of a column
+        value: the value to compare with
+
+        returns:
+
+        a NumPy array of booleans
+        """
+        if column not in self._categories:
+            return self._columns[column] == value
+        try:
+            code = self._categories[column].index(value)
+        except ValueError:
+            return np.zeros(len(self), dtype=bool)
+        return self._columns[column] == code
+
+    def filter(self, mask) -> 'SongTable':
+        """
+        This method returns a new SongTable with the rows where mask is
+        True. Ex:
+        table.filter((table['duration_ms'] > 200000) & ~table['explicit'])
+
+        params:
+
+        mask: a NumPy array of booleans, or of row indices
+
+        returns:
+
+        a SongTable
+        """
+        return SongTable(
+            {name: values[mask] for name, values in self._columns.items()},
+            self._categories)
+
+    def sort(self, column: str, descending: bool = False) -> 'SongTable':
+        """
+        This method returns a new SongTable sorted by a column. The sort is
+        stable and string columns sort by value.
+
+        params:
+
+        column: the name of the column to sort by
+        (optional) descending: whether to sort from largest to smallest
+
+        returns:
+
+        a SongTable
+        """
+        if column in self._categories:
+            keys = self._category_ranks(column)[self._columns[column]]
+        else:
+            keys = self._columns[column]
+        if descending:
+            # negating keeps equal keys in their original order
+            order = np.argsort(-keys.astype('int64'), kind='stable')
+        else:
+            order = np.argsort(keys, kind='stable')
+        return self.filter(order)
+
+    def group_by(
+        self,
+        key: str,
+        column: str = None,
+        aggregation: str = 'count') -> dict:
+        """
+        This method groups the rows by the value of key and aggregates a
+        column for each group.
+
+        params:
+
+        key: the name of the column to group by
+        (optional) column: the name of the numeric or boolean column to
+        aggregate, not needed for 'count'
+        (optional) aggregation: one of 'count', 'sum', 'mean', 'min' or
+        'max'. The default value is 'count'
+
+        returns:
+
+        a dict from each value of key to its aggregate
+        """
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(
+                "aggregation must be one of " + str(AGGREGATIONS))
+        groups, inverse = np.unique(self._columns[key], return_inverse=True)
+        counts = np.bincount(inverse, minlength=len(groups))
+        if aggregation == 'count':
+            results = counts
+        else:
+            values = self._columns[column].astype('float64')
+            if aggregation in ('sum', 'mean'):
+                results = np.bincount(
+                    inverse, weights=values, minlength=len(groups))
+                if aggregation == 'mean':
+                    results = results / counts
+            elif aggregation == 'min':
+                results = np.full(len(groups), np.inf)
+                np.minimum.at(results, inverse, values)
+            else:
+                results = np.full(len(groups), -np.inf)
+                np.maximum.at(results, inverse, values)
+        if key in self._categories:
+            groups = self._decode(key, groups)
+        return dict(zip(groups.tolist(), results.tolist()))
+
+    def to_songs(self) -> list[Song]:
+        """
+        This method converts every row to a Song object.
+
+        returns:
+
+        a list of Song objects
+        """
+        return [self.song(i) for i in range(len(self))]
+
+    def __iter__(self) -> Iterator[Song]:
+        for i in range(len(self)):
+            yield self.song(i)
+
+    def song(self, i: int) -> Song:
+        """
+        This method converts row i to a Song object.
+
+        params:
+
+        i: the row index
+
+        returns:
+
+        a Song object
+        """
+        def value(column: str):
+            if column in self._categories:
+                return self._categories[column][self._columns[column][i]]
+            v = self._columns[column][i].item()
+            return None if v == -1 else v
+        artists = [Artist(name=name, spotify_id=id)
+                   for id, name in value('artists')]
+        album = Album(
+            name=value('album_name'),
+            artists=artists,
+            num_songs=value('album_num_songs'),
+            spotify_album_type=value('album_type'),
+            spotify_id=value('album_id'),
+            release_year=value('release_year'),
+            release_month=value('release_month'),
+            release_day=value('release_day'))
+        return Song(
+            name=value('name'),
+            artists=artists,
+            album=album,
+            spotify_id=value('spotify_id'),
+            duration_ms=value('duration_ms'),
+            explicit=bool(self._columns['explicit'][i]),
+            song_number=value('song_number'),
+            spotify_is_local=bool(self._columns['spotify_is_local'][i]))
+
+    def _decode(self, column: str, codes):
+        categories = np.empty(len(self._categories[column]), dtype=object)
+        categories[:] = self._categories[column]
+        return categories[codes]
+
+    def _category_ranks(self, column: str):
+        """
+        returns an array mapping each code of a string column to the rank of
+        its value in sorted order
+        """
+        values = self._categories[column]
+        order = sorted(
+            range(len(values)),
+            key=lambda code: (values[code] is None, values[code] or ''))
+        ranks = np.empty(len(values), dtype='int64')
+        ranks[order] = np.arange(len(values))
+        return ranks
+
+
+class _SongTableBuilder:
+
+    def __init__(self):
+        """
+        accumulates rows for a SongTable, this should not be accessed directly
+        """
+        _import_numpy()
+        self._values = {name: [] for name in
+                        list(NUMERIC_COLUMNS) + list(BOOLEAN_COLUMNS)}
+        self._codes = {name: [] for name in STRING_COLUMNS}
+        self._lookups = {name: {} for name in STRING_COLUMNS}
+
+    def _encode(self, column: str, value) -> None:
+        lookup = self._lookups[column]
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(lookup)
+        self._codes[column].append(code)
+
+    def _add_row(self, row: dict) -> None:
+        for name, values in self._values.items():
+            value = row[name]
+            values.append(-1 if value is None else value)
+        for name in STRING_COLUMNS:
+            self._encode(name, row[name])
+
+    def _add_track(self, track: dict) -> None:
+        self._add_row(_track_row(track))
+
+    def _add_song(self, song: Song) -> None:
+        album = song.album if song.album is not None else Album()
+        artists = tuple((a.spotify_id, a.name) for a in song.artists or [])
+        first = artists[0] if len(artists) > 0 else (None, None)
+        self._add_row({
+            'duration_ms': song.duration_ms,
+            'song_number': song.song_number,
+            'album_num_songs': album.num_songs,
+            'release_year': album.release_year,
+            'release_month': album.release_month,
+            'release_day': album.release_day,
+            'explicit': bool(song.explicit),
+            'spotify_is_local': bool(song.spotify_is_local),
+            'spotify_id': song.spotify_id,
+            'name': song.name,
+            'artist_id': first[0],
+            'artist_name': first[1],
+            'artists': artists,
+            'album_id': album.spotify_id,
+            'album_name': album.name,
+            'album_type': album.spotify_album_type,
+        })
+
+    def _build(self) -> SongTable:
+        columns = {}
+        for name, dtype in NUMERIC_COLUMNS.items():
+            columns[name] = np.array(self._values[name], dtype=dtype)
+        for name in BOOLEAN_COLUMNS:
+            columns[name] = np.array(self._values[name], dtype=bool)
+        categories = {}
+        for name in STRING_COLUMNS:
+            columns[name] = np.array(self._codes[name], dtype='int32')
+            categories[name] = list(self._lookups[name])
+        return SongTable(columns, categories)
+
+
+def _import_numpy() -> None:
+    """
+    imports numpy into np on first use, this should not be accessed directly
+    """
+    global np
+    if np is None:
+        try:
+            import numpy
+        except ImportError:
+            raise ImportError(
+                "SongTable requires numpy, install it with 'pip install numpy'")
+        np = numpy
+
+
+def _track_row(track: dict) -> dict:
+    """
+    returns the SongTable row of a track JSON object, this should not be 
+    accessed directly
+    """
+    album = track['album']
+    date = album['release_date'].split('-') if album['release_date'] \
+        else []
+    date += [None] * (3 - len(date))
+    artists = tuple((a['id'], a['name']) for a in track['artists'])
+    first = artists[0] if len(artists) > 0 else (None, None)
+    return {
+        'duration_ms': track['duration_ms'],
+        'song_number': track['disc_number'],
+        'album_num_songs': album['total_tracks'],
+        'release_year': None if date[0] is None else int(date[0]),
+        'release_month': None if date[1] is None else int(date[1]),
+        'release_day': None if date[2] is None else int(date[2]),
+        'explicit': track['explicit'],
+        'spotify_is_local': track['is_local'],
+        'spotify_id': track['id'],
+        'name': track['name'],
+        'artist_id': first[0],
+        'artist_name': first[1],
+        'artists': artists,
+        'album_id': album['id'],
+        'album_name': album['name'],
+        'album_type': album['type'],
+    }
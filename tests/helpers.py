@@ -0,0 +1,96 @@
+import asyncio
+import shutil
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from benchmarks.bench_connection import CLIENT_ID, CLIENT_SECRET, \
+    REDIRECT_URI, SCOPE
+from benchmarks.mock_spotify import MockSpotify
+from streamlib import ConnectionObject
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+LIBRARY_SIZE = 120
+MISSING_ID = 'missing0000000000000000'
+
+
+def store_expired_token(connection) -> None:
+    """
+    stores an expired token for the mock client in the cache of connection,
+    so that logging in doesn't prompt and the first call refreshes it
+    """
+    expired = datetime.utcnow() - timedelta(hours=1)
+    connection._cache_handler._store_spotify_auth_code_connection(
+        CLIENT_ID,
+        CLIENT_SECRET,
+        REDIRECT_URI,
+        " ".join(SCOPE),
+        'expired-token',
+        'mock-refresh-token',
+        expired.strftime('%Y-%m-%d %H:%M:%S.%f'))
+
+
+def connect(mock: MockSpotify, cache_folder: str, **kwargs) -> ConnectionObject:
+    """
+    returns a ConnectionObject using the mock server, logged in with an
+    expired token stored in the cache so the first call refreshes it
+    """
+    connection = ConnectionObject(
+        cache_folder=cache_folder,
+        spotify_api_url=mock.api_url,
+        spotify_token_url=mock.token_url,
+        **kwargs)
+    store_expired_token(connection)
+    connection.spotify_auth_code(
+        CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, scope=SCOPE)
+    return connection
+
+
+async def connect_async(mock: MockSpotify, cache_folder: str, **kwargs):
+    """
+    returns an AsyncConnectionObject using the mock server, logged in like
+    connect
+    """
+    from streamlib import AsyncConnectionObject
+    connection = AsyncConnectionObject(
+        cache_folder=cache_folder,
+        spotify_api_url=mock.api_url,
+        spotify_token_url=mock.token_url,
+        **kwargs)
+    store_expired_token(connection)
+    connection.spotify_auth_code(
+        CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, scope=SCOPE)
+    return connection
+
+
+class MockTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.mock = MockSpotify(library_size=LIBRARY_SIZE).start()
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        self.mock.stop()
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def statuses(self, connection, endpoint: str) -> dict:
+        """
+        returns the number of responses with each status from endpoint
+        """
+        requests = connection.get_metrics().snapshot()['requests']
+        return requests.get(endpoint, {}).get('GET', {}).get('statuses', {})
+
+    def run_async(self, test, **kwargs):
+        """
+        runs the coroutine function test with an AsyncConnectionObject
+        connected to the mock server and returns its result
+        """
+        async def main():
+            async with await connect_async(self.mock, self.folder, **kwargs) \
+                    as connection:
+                return await test(connection)
+        return asyncio.run(main())
@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.connection.rate_limiter import RateLimiter
+from streamlib.objects import Artist, Song
+from tests.helpers import LIBRARY_SIZE, MISSING_ID, MockTestCase, aiohttp
+
+
+@unittest.skipIf(aiohttp is None, "requires aiohttp")
+class TestAsyncConnection(MockTestCase):
+
+    def test_get_songs_by_id(self):
+        ids = [track_id(i) for i in range(70)] + [MISSING_ID]
+
+        async def test(connection):
+            return await connection.spotify_get_songs_by_id(ids)
+
+        songs = self.run_async(test)
+        self.assertEqual([song.spotify_id for song in songs[:-1]], ids[:-1])
+        self.assertIsNone(songs[-1])
+
+    def test_iter_saved_songs(self):
+        async def test(connection):
+            return [song async for song in connection.spotify_iter_saved_songs()]
+
+        self.assertEqual(len(self.run_async(test)), LIBRARY_SIZE)
+
+    def test_cache_is_never_used_on_the_event_loop(self):
+        threads = set()
+
+        async def test(connection):
+            cache_handler = connection._cache_handler
+            get_db = cache_handler._get_db
+            cache_handler._get_db = lambda *args: \
+                threads.add(threading.get_ident()) or get_db(*args)
+            await connection.spotify_get_song_by_id(track_id(1))
+            await connection.spotify_get_songs_by_id(
+                [track_id(i) for i in range(10)])
+            await connection.spotify_populate_song(
+                Song(name='Song', artists=[Artist(name='Artist')]))
+            await connection.spotify_hydrate(
+                await connection.spotify_get_songs_by_id([track_id(2)]))
+            await connection.spotify_build_saved_index()
+            return threading.get_ident()
+
+        loop_thread = self.run_async(test, persist_responses=True)
+        self.assertGreater(len(threads), 0)
+        self.assertNotIn(loop_thread, threads)
+
+
+class TestAsyncRateLimiter(unittest.TestCase):
+
+    def test_waiting_for_a_slot_does_not_poll(self):
+        limiter = RateLimiter(max_concurrency=1)
+        attempts = []
+        try_acquire = limiter._try_acquire
+        limiter._try_acquire = \
+            lambda endpoint: attempts.append(endpoint) or try_acquire(endpoint)
+
+        async def test():
+            await limiter._acquire_async('tracks')
+            waiting = asyncio.ensure_future(limiter._acquire_async('tracks'))
+            await asyncio.sleep(0.1)
+            self.assertFalse(waiting.done())
+            limiter._release(200)
+            await asyncio.wait_for(waiting, 1)
+
+        asyncio.run(test())
+        self.assertEqual(len(attempts), 3)
+        self.assertEqual(limiter._async_waiters, [])
+
+    def test_cancelled_waiters_are_forgotten(self):
+        limiter = RateLimiter(max_concurrency=1)
+
+        async def test():
+            await limiter._acquire_async('tracks')
+            waiting = asyncio.ensure_future(limiter._acquire_async('tracks'))
+            await asyncio.sleep(0.01)
+            waiting.cancel()
+            await asyncio.gather(waiting, return_exceptions=True)
+
+        asyncio.run(test())
+        self.assertEqual(limiter._async_waiters, [])
+
+    def test_release_from_another_thread_wakes_the_loop(self):
+        limiter = RateLimiter(max_concurrency=1)
+        limiter._acquire('tracks')
+
+        async def test():
+            threading.Timer(0.05, limiter._release, (200,)).start()
+            await asyncio.wait_for(limiter._acquire_async('tracks'), 1)
+
+        asyncio.run(test())
+
+
+if __name__ == '__main__':
+    unittest.main()
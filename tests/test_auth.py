@@ -0,0 +1,66 @@
+import threading
+import time
+import unittest
+
+from benchmarks.bench_connection import CLIENT_ID, CLIENT_SECRET, \
+    REDIRECT_URI, SCOPE
+from benchmarks.mock_spotify import track_id
+from streamlib import ConnectionObject
+from tests.helpers import MockTestCase, connect, store_expired_token
+
+THREADS = 8
+
+
+class TestAuth(MockTestCase):
+
+    def test_expired_token_is_refreshed(self):
+        connect(self.mock, self.folder).spotify_get_song_by_id(track_id(1))
+        self.assertEqual(self.mock.tokens, 1)
+
+    def test_concurrent_callers_share_one_refresh(self):
+        self.mock.latency = 0.05
+        auth = connect(self.mock, self.folder)._spotify_auth
+        barrier = threading.Barrier(THREADS)
+        tokens = []
+
+        def get_token():
+            barrier.wait()
+            tokens.append(auth._get_access_token())
+
+        threads = [threading.Thread(target=get_token)
+                   for _ in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(self.mock.tokens, 1)
+        self.assertEqual(tokens, ['mock-token-1'] * THREADS)
+
+    def test_background_refresh_renews_the_token_once(self):
+        connection = ConnectionObject(
+            cache_folder=self.folder,
+            spotify_api_url=self.mock.api_url,
+            spotify_token_url=self.mock.token_url)
+        store_expired_token(connection)
+        connection.spotify_auth_code(
+            CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, scope=SCOPE,
+            refresh_margin=60)
+        try:
+            deadline = time.monotonic() + 5
+            while self.mock.tokens == 0 and time.monotonic() < deadline:
+                time.sleep(0.01)
+            time.sleep(0.2)
+            self.assertEqual(self.mock.tokens, 1)
+            self.assertFalse(connection._spotify_auth._needs_refresh(60))
+        finally:
+            connection._spotify_auth._stop_background_refresh()
+
+    def test_impossible_refresh_margin_raises(self):
+        connection = ConnectionObject(cache_folder=self.folder)
+        with self.assertRaises(ValueError):
+            connection.spotify_auth_code(
+                CLIENT_ID, CLIENT_SECRET, REDIRECT_URI, refresh_margin=3600)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import threading
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.connection.batch_loader import BatchLoader
+from tests.helpers import MockTestCase, connect
+
+THREADS = 20
+
+
+class TestBatchLoader(unittest.TestCase):
+
+    def test_keys_in_a_window_are_loaded_together_once(self):
+        calls = []
+        loader = BatchLoader(
+            lambda keys: calls.append(keys) or [key * 2 for key in keys],
+            0.05,
+            100)
+        futures = [loader._load(key) for key in (1, 2, 1, 3)]
+        self.assertEqual([future.result(timeout=1) for future in futures],
+                         [2, 4, 2, 6])
+        self.assertEqual(calls, [[1, 2, 3]])
+
+    def test_full_batch_is_loaded_without_waiting(self):
+        calls = []
+        loader = BatchLoader(
+            lambda keys: calls.append(keys) or keys, 60, 2)
+        futures = [loader._load(key) for key in (1, 2)]
+        self.assertEqual([future.result(timeout=1) for future in futures],
+                         [1, 2])
+        self.assertEqual(calls, [[1, 2]])
+
+    def test_load_errors_reach_every_caller(self):
+        def load(keys):
+            raise RuntimeError('load failed')
+
+        loader = BatchLoader(load, 0.01, 100)
+        futures = [loader._load(key) for key in (1, 2)]
+        for future in futures:
+            with self.assertRaises(RuntimeError):
+                future.result(timeout=1)
+
+
+class TestCoalescedSongs(MockTestCase):
+
+    def test_concurrent_lookups_share_one_request(self):
+        connection = connect(self.mock, self.folder, coalesce_window=0.1)
+        barrier = threading.Barrier(THREADS)
+        songs = [None] * THREADS
+
+        def get_song(i):
+            barrier.wait()
+            songs[i] = connection.spotify_get_song_by_id(track_id(i))
+
+        threads = [threading.Thread(target=get_song, args=(i,))
+                   for i in range(THREADS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual([song.spotify_id for song in songs],
+                         [track_id(i) for i in range(THREADS)])
+        self.assertEqual(self.statuses(connection, 'tracks'), {200: 1})
+
+    def test_coalesced_cache_hit_does_not_wait(self):
+        connection = connect(self.mock, self.folder, coalesce_window=30)
+        connection.spotify_get_songs_by_id([track_id(3)])
+        song = connection.spotify_get_song_by_id(track_id(3))
+        self.assertEqual(song.name, 'Song 3')
+
+
+if __name__ == '__main__':
+    unittest.main()
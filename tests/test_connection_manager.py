@@ -0,0 +1,107 @@
+import threading
+import time
+import unittest
+
+from benchmarks.bench_connection import CLIENT_ID, CLIENT_SECRET, \
+    REDIRECT_URI, SCOPE
+from benchmarks.mock_spotify import track_id
+from streamlib import ConnectionManager, ConnectionObject
+from tests.helpers import MockTestCase
+
+USERS = 40
+
+
+def worker_threads() -> int:
+    return len([thread for thread in threading.enumerate()
+                if thread.name == 'streamlib-write-queue'])
+
+
+class TestConnectionManager(MockTestCase):
+
+    def manager(self, users: int = 3, **kwargs) -> ConnectionManager:
+        """
+        returns a ConnectionManager using the mock server with users added
+        as 'user-0', 'user-1' and so on
+        """
+        manager = ConnectionManager(
+            CLIENT_ID,
+            CLIENT_SECRET,
+            REDIRECT_URI,
+            scope=SCOPE,
+            connection=ConnectionObject(
+                cache_folder=self.folder,
+                spotify_api_url=self.mock.api_url,
+                spotify_token_url=self.mock.token_url,
+                write_behind_window=None),
+            **kwargs)
+        for i in range(users):
+            manager.spotify_add_user('user-' + str(i), 'mock-refresh-token')
+        return manager
+
+    def test_users_make_requests_with_their_own_token(self):
+        manager = self.manager()
+        for i in range(3):
+            song = manager.get_connection('user-' + str(i)) \
+                .spotify_get_song_by_id(track_id(i))
+            self.assertEqual(song.name, 'Song ' + str(i))
+        self.assertEqual(self.mock.tokens, 3)
+        manager.get_connection('user-0').spotify_get_song_by_id(track_id(5))
+        self.assertEqual(self.mock.tokens, 3)
+
+    def test_unknown_user_raises(self):
+        with self.assertRaises(RuntimeError):
+            self.manager().get_connection('someone else')
+
+    def test_removed_user_is_unloaded(self):
+        manager = self.manager()
+        manager.get_connection('user-0')
+        self.assertTrue(manager.spotify_remove_user('user-0'))
+        with self.assertRaises(RuntimeError):
+            manager.get_connection('user-0')
+
+    def test_least_recently_used_user_is_unloaded(self):
+        manager = self.manager(max_loaded_users=2)
+        first = manager.get_connection('user-0')
+        manager.get_connection('user-1')
+        self.assertIs(manager.get_connection('user-0'), first)
+        manager.get_connection('user-2')
+        self.assertEqual(list(manager._users), ['user-0', 'user-2'])
+        self.assertIsNot(manager.get_connection('user-1'), first)
+
+    def test_idle_users_are_unloaded(self):
+        manager = self.manager(idle_seconds=0.05)
+        manager.get_connection('user-0')
+        time.sleep(0.1)
+        manager.get_connection('user-1')
+        self.assertEqual(list(manager._users), ['user-1'])
+
+    def test_unloading_writes_queued_songs(self):
+        manager = self.manager(max_loaded_users=1)
+        futures = manager.get_connection('user-0') \
+            .spotify_queue_save_songs_by_id([track_id(8000)])
+        self.assertNotIn(track_id(8000), self.mock.saved)
+        manager.get_connection('user-1')
+        self.assertEqual(futures[0].result(timeout=0), 'saved')
+        self.assertIn(track_id(8000), self.mock.saved)
+
+    def test_replacing_a_user_writes_their_queued_songs(self):
+        manager = self.manager()
+        futures = manager.get_connection('user-0') \
+            .spotify_queue_remove_saved_songs_by_id([track_id(0)])
+        manager.spotify_add_user('user-0', 'mock-refresh-token')
+        self.assertEqual(futures[0].result(timeout=0), 'removed')
+
+    def test_unloaded_users_leave_no_threads(self):
+        before = worker_threads()
+        manager = self.manager(USERS, max_loaded_users=2)
+        for i in range(USERS):
+            connection = manager.get_connection('user-' + str(i))
+            connection.spotify_queue_save_songs_by_id([track_id(8000 + i)])
+            connection.spotify_flush_saved_songs()
+        self.assertLessEqual(worker_threads() - before, 2)
+        self.assertTrue(all(track_id(8000 + i) in self.mock.saved
+                            for i in range(USERS)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import csv
+import os
+import shutil
+import tempfile
+import unittest
+
+from streamlib.cache.cache_handler import CacheHandler
+
+
+class TestCredentials(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_stored_credentials_match_any_scope_order(self):
+        cache = CacheHandler(self.folder)
+        cache._store_spotify_auth_code_connection(
+            'client', 'secret', 'uri', 'b a', 'access', 'refresh', 'expires')
+        self.assertEqual(
+            cache._get_spotify_auth_code_connection(
+                'client', 'secret', 'uri', 'a b'),
+            ('access', 'refresh', 'expires'))
+        self.assertIsNone(cache._get_spotify_auth_code_connection(
+            'client', 'other secret', 'uri', 'a b'))
+
+    def test_storing_again_replaces_the_credentials(self):
+        cache = CacheHandler(self.folder)
+        for token in ('old', 'new'):
+            cache._store_spotify_auth_code_connection(
+                'client', 'secret', 'uri', 'a', token, 'refresh', 'expires')
+        self.assertEqual(
+            cache._get_spotify_auth_code_connection(
+                'client', 'secret', 'uri', 'a'),
+            ('new', 'refresh', 'expires'))
+
+    def test_csv_credentials_are_migrated(self):
+        legacy = os.path.join(self.folder, 'sacc.csv')
+        with open(legacy, 'w', newline='') as file:
+            csv.writer(file).writerows([
+                ['client', 'secret', 'uri', 'a b', 'access', 'refresh',
+                 'expires'],
+                ['malformed row'],
+            ])
+        cache = CacheHandler(self.folder)
+        self.assertEqual(
+            cache._get_spotify_auth_code_connection(
+                'client', 'secret', 'uri', 'b a'),
+            ('access', 'refresh', 'expires'))
+        self.assertFalse(os.path.exists(legacy))
+        self.assertTrue(os.path.exists(legacy + '.migrated'))
+        reopened = CacheHandler(self.folder)
+        self.assertIsNotNone(reopened._get_spotify_auth_code_connection(
+            'client', 'secret', 'uri', 'a b'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,96 @@
+import json
+import os
+import stat
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from tests.helpers import LIBRARY_SIZE, MISSING_ID, MockTestCase, aiohttp, \
+    connect
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+
+class TestExport(MockTestCase):
+
+    def test_export_saved_songs(self):
+        connection = connect(self.mock, self.folder)
+        path = os.path.join(self.folder, 'library.ndjson')
+        self.assertEqual(connection.spotify_export_saved_songs(path),
+                         LIBRARY_SIZE)
+        with open(path) as file:
+            rows = [json.loads(line) for line in file]
+        self.assertEqual(len(rows), LIBRARY_SIZE)
+        self.assertIsNotNone(rows[0]['added_at'])
+
+    def test_export_songs_by_id_skips_missing(self):
+        connection = connect(self.mock, self.folder)
+        path = os.path.join(self.folder, 'songs.csv')
+        count = connection.spotify_export_songs_by_id(
+            [track_id(1), MISSING_ID, track_id(2)], path)
+        self.assertEqual(count, 2)
+        with open(path) as file:
+            self.assertEqual(len(file.readlines()), 3)
+
+    @unittest.skipIf(pyarrow is None, "requires pyarrow")
+    def test_export_parquet(self):
+        connection = connect(self.mock, self.folder)
+        path = os.path.join(self.folder, 'library.parquet')
+        connection.spotify_export_saved_songs(path)
+        table = pyarrow.parquet.read_table(path)
+        self.assertEqual(table.num_rows, LIBRARY_SIZE)
+        self.assertEqual(table.column('spotify_id')[0].as_py(),
+                         self.mock.library[0][0])
+
+    def test_exported_file_gets_the_umask_mode(self):
+        connection = connect(self.mock, self.folder)
+        path = os.path.join(self.folder, 'songs.csv')
+        for umask, mode in ((0o022, 0o644), (0o077, 0o600)):
+            previous = os.umask(umask)
+            try:
+                connection.spotify_export_songs_by_id([track_id(1)], path)
+            finally:
+                os.umask(previous)
+            self.assertEqual(stat.S_IMODE(os.stat(path).st_mode), mode)
+
+    def test_failed_export_keeps_the_old_file(self):
+        connection = connect(self.mock, self.folder)
+        path = os.path.join(self.folder, 'library.ndjson')
+        with open(path, 'w') as file:
+            file.write('old\n')
+
+        def failing_pages(get_token):
+            raise RuntimeError('fetching failed')
+            yield
+
+        connection._spotify_connection._iter_saved_pages = failing_pages
+        with self.assertRaises(RuntimeError):
+            connection.spotify_export_saved_songs(path)
+        with open(path) as file:
+            self.assertEqual(file.read(), 'old\n')
+        self.assertEqual(
+            [name for name in os.listdir(self.folder) if name.endswith('.tmp')],
+            [])
+
+    def test_unknown_extension_raises(self):
+        connection = connect(self.mock, self.folder)
+        with self.assertRaises(ValueError):
+            connection.spotify_export_saved_songs(
+                os.path.join(self.folder, 'library.txt'))
+
+    @unittest.skipIf(aiohttp is None, "requires aiohttp")
+    def test_async_export_saved_songs(self):
+        path = os.path.join(self.folder, 'library.csv')
+
+        async def test(connection):
+            return await connection.spotify_export_saved_songs(path)
+
+        self.assertEqual(self.run_async(test), LIBRARY_SIZE)
+        with open(path) as file:
+            self.assertEqual(len(file.readlines()), LIBRARY_SIZE + 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
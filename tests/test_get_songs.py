@@ -0,0 +1,31 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from tests.helpers import MISSING_ID, MockTestCase, connect
+
+
+class TestGetSongs(MockTestCase):
+
+    def test_get_song_by_id(self):
+        connection = connect(self.mock, self.folder)
+        song = connection.spotify_get_song_by_id(track_id(7))
+        self.assertEqual(song.spotify_id, track_id(7))
+        self.assertEqual(song.name, 'Song 7')
+
+    def test_get_missing_song_raises(self):
+        connection = connect(self.mock, self.folder)
+        with self.assertRaises(RuntimeError):
+            connection.spotify_get_song_by_id(MISSING_ID)
+
+    def test_get_songs_by_id_keeps_order_across_chunks(self):
+        connection = connect(self.mock, self.folder)
+        ids = [track_id(i) for i in range(120, 0, -1)] + [MISSING_ID]
+        songs = connection.spotify_get_songs_by_id(ids)
+        self.assertEqual([song.spotify_id for song in songs[:-1]], ids[:-1])
+        self.assertIsNone(songs[-1])
+        requests = connection.get_metrics().snapshot()['requests']
+        self.assertEqual(requests['tracks']['GET']['count'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
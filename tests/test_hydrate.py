@@ -0,0 +1,58 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from tests.helpers import MockTestCase, aiohttp, connect
+
+
+class TestHydrate(MockTestCase):
+
+    def test_hydrate_fills_in_artists_and_albums(self):
+        connection = connect(self.mock, self.folder)
+        songs = connection.spotify_hydrate(
+            connection.spotify_get_songs_by_id([track_id(0), track_id(31)]))
+        self.assertEqual(songs[0].artists[0].genres, ['indie pop'])
+        self.assertEqual(len(songs[1].album.songs), 10)
+
+    def test_hydrate_pages_through_long_albums(self):
+        self.mock.page_size = 4
+        connection = connect(self.mock, self.folder)
+        songs = connection.spotify_hydrate(connection.spotify_get_songs_by_id(
+            [track_id(0), track_id(15), track_id(25)]))
+        for song, first in zip(songs, (0, 10, 20)):
+            self.assertEqual(
+                [album_song.spotify_id for album_song in song.album.songs],
+                [track_id(i) for i in range(first, first + 10)])
+        requests = connection.get_metrics().snapshot()['requests']
+        self.assertEqual(requests['albums/tracks']['GET']['count'], 6)
+        self.assertFalse(any(endpoint.startswith('albums/album')
+                             for endpoint in requests))
+
+    def test_hydrated_objects_are_cached(self):
+        connection = connect(self.mock, self.folder)
+        connection.spotify_hydrate(
+            connection.spotify_get_songs_by_id([track_id(0)]))
+        other = connect(self.mock, self.folder, memory_cache_entries=None)
+        songs = other.spotify_get_songs_by_id([track_id(0)])
+        requests = self.mock.requests
+        songs = other.spotify_hydrate(songs)
+        self.assertEqual(self.mock.requests, requests)
+        self.assertEqual(songs[0].artists[0].genres, ['indie pop'])
+
+    @unittest.skipIf(aiohttp is None, "requires aiohttp")
+    def test_async_hydrate_pages_through_long_albums(self):
+        self.mock.page_size = 4
+
+        async def test(connection):
+            return await connection.spotify_hydrate(
+                await connection.spotify_get_songs_by_id(
+                    [track_id(0), track_id(15)]))
+
+        songs = self.run_async(test)
+        for song, first in zip(songs, (0, 10)):
+            self.assertEqual(
+                [album_song.spotify_id for album_song in song.album.songs],
+                [track_id(i) for i in range(first, first + 10)])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+import json
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.objects.lazy import LazySong
+from tests.helpers import MockTestCase, aiohttp, connect
+
+
+def not_json(body: bytes):
+    raise ValueError('not JSON')
+
+
+class TestLazySongs(MockTestCase):
+
+    def test_lazy_songs_match_eager_songs(self):
+        ids = [track_id(i) for i in range(12)]
+        eager = connect(self.mock, self.folder).spotify_get_songs_by_id(ids)
+        lazy = connect(self.mock, self.folder, lazy=True) \
+            .spotify_get_songs_by_id(ids)
+        self.assertTrue(all(isinstance(song, LazySong) for song in lazy))
+        for lazy_song, song in zip(lazy, eager):
+            self.assertEqual(lazy_song.name, song.name)
+            self.assertEqual(lazy_song.album.name, song.album.name)
+            self.assertEqual(lazy_song.album.release_year,
+                             song.album.release_year)
+            self.assertEqual(lazy_song.artists[0].name, song.artists[0].name)
+
+    def test_json_decoder_parses_responses(self):
+        bodies = []
+        connection = connect(
+            self.mock,
+            self.folder,
+            json_decoder=lambda body: bodies.append(body) or json.loads(body))
+        connection.spotify_get_song_by_id(track_id(1))
+        self.assertEqual(len(bodies), 1)
+
+    def test_non_json_response_raises(self):
+        connection = connect(self.mock, self.folder, json_decoder=not_json)
+        with self.assertRaises(RuntimeError) as raised:
+            connection.spotify_get_song_by_id(track_id(1))
+        self.assertIn("tracks", str(raised.exception))
+        self.assertIn("200", str(raised.exception))
+
+    @unittest.skipIf(aiohttp is None, "requires aiohttp")
+    def test_non_json_async_response_raises(self):
+        async def test(connection):
+            with self.assertRaises(RuntimeError) as raised:
+                await connection.spotify_get_song_by_id(track_id(1))
+            return str(raised.exception)
+
+        message = self.run_async(test, json_decoder=not_json)
+        self.assertIn("tracks", message)
+        self.assertIn("200", message)
+
+
+if __name__ == '__main__':
+    unittest.main()
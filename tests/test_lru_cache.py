@@ -0,0 +1,67 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.cache.lru_cache import LRUCache
+from streamlib.objects import Album, Artist, Song
+from tests.helpers import MockTestCase, connect
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_entries=2)
+        cache._put('a', 1)
+        cache._put('b', 2)
+        cache._get('a')
+        cache._put('c', 3)
+        self.assertEqual(cache._get('a'), 1)
+        self.assertIsNone(cache._get('b'))
+
+    def test_counts_hits_misses_and_evictions(self):
+        cache = LRUCache(max_entries=1)
+        cache._put('a', 1)
+        cache._get('a')
+        cache._get('b')
+        cache._put('b', 2)
+        self.assertEqual(cache._stats(), {
+            'hits': 1, 'misses': 1, 'evictions': 1, 'entries': 1, 'bytes': 0})
+
+    def test_song_size_leaves_out_shared_album_and_artists(self):
+        artist = Artist(name='Artist', genres=['genre ' * 1000])
+        album = Album(name='Album ' * 10000, artists=[artist])
+        songs = [Song(name='Song', album=album, artists=[artist])
+                 for _ in range(3)]
+        album.songs = songs
+        cache = LRUCache(max_bytes=10 ** 6)
+        size = cache._sizeof(songs[0])
+        self.assertLess(size, 1000)
+        self.assertEqual(size, cache._sizeof(
+            Song(name='Song', album=Album(), artists=[Artist()])))
+
+    def test_bytes_bound_evicts(self):
+        cache = LRUCache(max_bytes=2000)
+        for i in range(10):
+            cache._put(i, Song(name=str(i) * 200))
+        self.assertLess(cache._stats()['bytes'], 2000)
+        self.assertGreater(cache._stats()['evictions'], 0)
+
+
+class TestMemoryCache(MockTestCase):
+
+    def test_stats_count_repeated_lookups(self):
+        connection = connect(self.mock, self.folder, memory_cache_entries=10)
+        ids = [track_id(i) for i in range(20)]
+        connection.spotify_get_songs_by_id(ids)
+        connection.spotify_get_songs_by_id(ids[-5:])
+        stats = connection.spotify_memory_cache_stats()
+        self.assertEqual(stats['hits'], 5)
+        self.assertEqual(stats['entries'], 10)
+        self.assertEqual(stats['evictions'], 10)
+
+    def test_turned_off_memory_cache_has_no_stats(self):
+        connection = connect(self.mock, self.folder, memory_cache_entries=None)
+        self.assertIsNone(connection.spotify_memory_cache_stats())
+
+
+if __name__ == '__main__':
+    unittest.main()
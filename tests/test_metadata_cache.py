@@ -0,0 +1,54 @@
+import shutil
+import tempfile
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.cache.cache_handler import CacheHandler
+from tests.helpers import MockTestCase, connect
+
+
+class TestCacheHandlerMetadata(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_stored_metadata_is_returned_by_kind(self):
+        cache = CacheHandler(self.folder)
+        cache._store_spotify_metadata('track', {'a': {'name': 'A'}})
+        self.assertEqual(
+            cache._get_spotify_metadata('track', ['a', 'b']),
+            {'a': {'name': 'A'}})
+        self.assertEqual(cache._get_spotify_metadata('album', ['a']), {})
+
+    def test_expired_metadata_is_ignored(self):
+        CacheHandler(self.folder)._store_spotify_metadata(
+            'track', {'a': {'name': 'A'}})
+        self.assertEqual(
+            CacheHandler(self.folder, metadata_ttl=0)._get_spotify_metadata(
+                'track', ['a']),
+            {})
+
+    def test_no_ttl_disables_the_cache(self):
+        cache = CacheHandler(self.folder, metadata_ttl=None)
+        cache._store_spotify_metadata('track', {'a': {'name': 'A'}})
+        self.assertEqual(cache._get_spotify_metadata('track', ['a']), {})
+
+
+class TestDiskCachedSongs(MockTestCase):
+
+    def test_songs_are_read_from_disk_by_a_new_connection(self):
+        ids = [track_id(i) for i in range(60)]
+        connect(self.mock, self.folder).spotify_get_songs_by_id(ids)
+        connection = connect(self.mock, self.folder, memory_cache_entries=None)
+        requests = self.mock.requests
+        songs = connection.spotify_get_songs_by_id(ids)
+        self.assertEqual(self.mock.requests, requests)
+        self.assertEqual([song.name for song in songs],
+                         ['Song ' + str(i) for i in range(60)])
+
+
+if __name__ == '__main__':
+    unittest.main()
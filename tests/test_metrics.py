@@ -0,0 +1,120 @@
+import unittest
+import warnings
+
+from benchmarks.mock_spotify import track_id
+from streamlib.cache.lru_cache import LRUCache
+from streamlib.metrics import Metrics
+from tests.helpers import MockTestCase, connect
+
+
+class TestMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = Metrics(buckets=(0.01, 0.1))
+        self.metrics._observe_request('tracks', 'GET', 200, 0.05, 100)
+        self.metrics._observe_request('tracks', 'GET', 429, 0.005, 10)
+        self.metrics._observe_request('me/tracks', 'PUT', None, 1.0, 0)
+        self.metrics._observe_token_refresh('refresh_token', True, 0.2)
+        self.metrics._observe_cache('metadata', 'get', 0.5, hits=3, misses=1)
+
+    def test_snapshot(self):
+        snapshot = self.metrics.snapshot()
+        tracks = snapshot['requests']['tracks']['GET']
+        self.assertEqual(tracks['count'], 2)
+        self.assertEqual(tracks['errors'], 1)
+        self.assertEqual(tracks['statuses'], {200: 1, 429: 1})
+        self.assertEqual(tracks['bytes'], 110)
+        self.assertEqual(tracks['buckets'],
+                         {0.01: 1, 0.1: 2, float('inf'): 2})
+        self.assertEqual(
+            snapshot['requests']['me/tracks']['PUT']['errors'], 1)
+        self.assertEqual(snapshot['token_refreshes'],
+                         {'refresh_token': {'success': 1}})
+        self.assertEqual(snapshot['cache']['metadata']['get']['hit_ratio'],
+                         0.75)
+
+    def test_prometheus_rendering(self):
+        lines = self.metrics.to_prometheus().splitlines()
+        for line in (
+                '# TYPE streamlib_requests_total counter',
+                'streamlib_requests_total{endpoint="tracks",method="GET",'
+                'status="200"} 1',
+                'streamlib_requests_total{endpoint="me/tracks",method="PUT",'
+                'status="none"} 1',
+                'streamlib_request_errors_total{endpoint="tracks",'
+                'method="GET"} 1',
+                'streamlib_response_bytes_total{endpoint="tracks",'
+                'method="GET"} 110',
+                '# TYPE streamlib_request_duration_seconds histogram',
+                'streamlib_request_duration_seconds_bucket{endpoint="tracks",'
+                'method="GET",le="0.01"} 1',
+                'streamlib_request_duration_seconds_bucket{endpoint="tracks",'
+                'method="GET",le="+Inf"} 2',
+                'streamlib_request_duration_seconds_count{endpoint="tracks",'
+                'method="GET"} 2',
+                'streamlib_token_refreshes_total{grant_type="refresh_token",'
+                'outcome="success"} 1',
+                'streamlib_cache_hits_total{store="metadata",'
+                'operation="get"} 3'):
+            self.assertIn(line, lines)
+
+    def test_prometheus_labels_are_escaped(self):
+        self.metrics._observe_request('a"b\\c', 'GET', 200, 0.01, 0)
+        self.assertIn(
+            'streamlib_requests_total{endpoint="a\\"b\\\\c",method="GET",'
+            'status="200"} 1',
+            self.metrics.to_prometheus().splitlines())
+
+    def test_hooks_get_every_event(self):
+        events = []
+        hook = events.append
+        self.metrics.add_hook(hook)
+        self.metrics._observe_request('tracks', 'GET', 200, 0.01, 5)
+        self.metrics.remove_hook(hook)
+        self.metrics._observe_request('tracks', 'GET', 200, 0.01, 5)
+        self.assertEqual([event['type'] for event in events], ['request'])
+
+    def test_failing_hooks_warn(self):
+        def hook(event):
+            raise ValueError('hook failed')
+
+        self.metrics.add_hook(hook)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always')
+            self.metrics._observe_cache('metadata', 'get', 0.1)
+        self.assertEqual(len(caught), 1)
+
+    def test_lru_caches_with_one_name_are_summed(self):
+        first = LRUCache(max_entries=10)
+        second = LRUCache(max_entries=10)
+        self.metrics._register_lru_cache('memory', first)
+        self.metrics._register_lru_cache('memory', second)
+        first._get('a')
+        second._put('a', 1)
+        second._get('a')
+        self.assertEqual(
+            self.metrics.snapshot()['cache']['memory']['get'],
+            {'calls': 2, 'hits': 1, 'misses': 1, 'hit_ratio': 0.5,
+             'seconds': None})
+
+
+class TestConnectionMetrics(MockTestCase):
+
+    def test_connections_sharing_metrics_add_up(self):
+        metrics = Metrics()
+        connections = [connect(self.mock, self.folder, metrics=metrics)
+                       for _ in range(2)]
+        for connection in connections:
+            connection.spotify_get_songs_by_id([track_id(1)])
+            connection.spotify_get_songs_by_id([track_id(1)])
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['token_refreshes'],
+                         {'refresh_token': {'success': 2}})
+        self.assertEqual(snapshot['cache']['memory']['get']['hits'], 2)
+        self.assertIn('streamlib_cache_hits_total{store="memory",'
+                      'operation="get"} 2',
+                      metrics.to_prometheus().splitlines())
+
+
+if __name__ == '__main__':
+    unittest.main()
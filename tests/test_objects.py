@@ -0,0 +1,29 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.objects import Album, Artist, Song
+from tests.helpers import MockTestCase, connect
+
+
+class TestObjects(unittest.TestCase):
+
+    def test_objects_have_no_instance_dict(self):
+        for obj in (Song(), Album(), Artist()):
+            with self.assertRaises(AttributeError):
+                obj.__dict__
+
+
+class TestSharedObjects(MockTestCase):
+
+    def test_songs_share_their_album_and_artists(self):
+        connection = connect(self.mock, self.folder)
+        songs = connection.spotify_get_songs_by_id(
+            [track_id(0), track_id(1), track_id(10)])
+        self.assertIs(songs[0].album, songs[1].album)
+        self.assertIsNot(songs[0].album, songs[2].album)
+        self.assertIs(songs[0].artists[0], songs[2].artists[0])
+        self.assertIs(songs[0].album.artists[0], songs[0].artists[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
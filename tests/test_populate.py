@@ -0,0 +1,40 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id, track_index
+from streamlib.objects import Artist, Song
+from tests.helpers import MockTestCase, connect
+
+
+class TestPopulate(MockTestCase):
+
+    def test_populate_song_sends_the_whole_search_query(self):
+        connection = connect(self.mock, self.folder)
+        song = connection.spotify_populate_song(Song(
+            name='Rock & Roll #1',
+            artists=[Artist(name='AC/DC?')]))
+        self.assertEqual(
+            song.spotify_id,
+            track_id(track_index('track:Rock & Roll #1 artist:AC/DC?')))
+
+    def test_equal_searches_are_sent_once(self):
+        connection = connect(self.mock, self.folder)
+        songs = connection.spotify_populate_songs([
+            Song(name='Song', artists=[Artist(name='Artist')]),
+            Song(name='  SONG ', artists=[Artist(name='artist')]),
+            Song(name='Other song'),
+            Song(spotify_id=track_id(4)),
+        ])
+        self.assertEqual(songs[0].spotify_id, songs[1].spotify_id)
+        self.assertEqual(songs[3].name, 'Song 4')
+        self.assertEqual(self.statuses(connection, 'search'), {200: 2})
+        connection.spotify_populate_song(Song(name='other SONG'))
+        self.assertEqual(self.statuses(connection, 'search'), {200: 2})
+
+    def test_songs_without_a_name_are_returned_as_they_are(self):
+        connection = connect(self.mock, self.folder)
+        song = Song()
+        self.assertIs(connection.spotify_populate_songs([song])[0], song)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import threading
+import time
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.connection.rate_limiter import RateLimiter
+from tests.helpers import MockTestCase, connect
+
+
+class TestRateLimiter(unittest.TestCase):
+
+    def test_errors_halve_concurrency_and_successes_grow_it_back(self):
+        limiter = RateLimiter(max_concurrency=8, min_concurrency=2)
+        for status in (429, 503, None, 429):
+            limiter._acquire('tracks')
+            limiter._release(status)
+        self.assertEqual(limiter._concurrency, 2)
+        for _ in range(4):
+            limiter._acquire('tracks')
+            limiter._release(200)
+        self.assertGreater(limiter._concurrency, 3)
+        self.assertLess(limiter._concurrency, 4)
+
+    def test_retry_after_pauses_every_request(self):
+        limiter = RateLimiter()
+        limiter._acquire('tracks')
+        limiter._release(429, '0.2')
+        start = time.monotonic()
+        limiter._acquire('me/tracks')
+        self.assertGreaterEqual(time.monotonic() - start, 0.15)
+
+    def test_requests_wait_for_a_free_slot(self):
+        limiter = RateLimiter(max_concurrency=1)
+        limiter._acquire('tracks')
+        acquired = threading.Event()
+        thread = threading.Thread(
+            target=lambda: limiter._acquire('tracks') or acquired.set())
+        thread.start()
+        self.assertFalse(acquired.wait(0.1))
+        limiter._release(200)
+        self.assertTrue(acquired.wait(1))
+        thread.join()
+
+    def test_endpoint_rate_is_paced(self):
+        limiter = RateLimiter(endpoint_rates={'search': 20})
+        start = time.monotonic()
+        # a burst of 20 requests, then 5 more paced 0.05 seconds apart
+        for _ in range(25):
+            limiter._acquire('search')
+            limiter._release(200)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+        start = time.monotonic()
+        limiter._acquire('tracks')
+        self.assertLess(time.monotonic() - start, 0.05)
+
+    def test_only_rate_limits_and_server_errors_are_retried(self):
+        limiter = RateLimiter(max_retries=2)
+        self.assertTrue(limiter._should_retry(429, 0))
+        self.assertTrue(limiter._should_retry(502, 1))
+        self.assertFalse(limiter._should_retry(502, 2))
+        self.assertFalse(limiter._should_retry(404, 0))
+
+
+class TestRateLimitedRequests(MockTestCase):
+
+    def test_rate_limited_requests_are_retried(self):
+        self.mock.rate_limit_every = 3
+        self.mock.retry_after = 0.05
+        connection = connect(self.mock, self.folder, max_workers=4)
+        ids = [track_id(i) for i in range(200)]
+        songs = connection.spotify_get_songs_by_id(ids)
+        self.assertEqual([song.spotify_id for song in songs], ids)
+        self.assertGreater(self.statuses(connection, 'tracks')[429], 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import json
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+
+from streamlib.cache.cache_handler import RESPONSE_TTL, CacheHandler
+from streamlib.cache.response_cache import ResponseCache
+from tests.helpers import MockTestCase, connect
+
+
+class TestResponseCacheStore(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.folder, ignore_errors=True)
+
+    def test_stored_bodies_are_parsed_once(self):
+        cache = ResponseCache(cache_handler=CacheHandler(self.folder))
+        cache._put('key', 'etag', b'{"a": 1}', None)
+        reopened = ResponseCache(cache_handler=CacheHandler(self.folder))
+        entry = reopened._get('key')
+        self.assertEqual(entry, ('etag', b'{"a": 1}', None))
+        parses = []
+
+        def loads(body):
+            parses.append(body)
+            return json.loads(body)
+
+        self.assertEqual(reopened._parsed('key', entry, loads), {'a': 1})
+        self.assertEqual(
+            reopened._parsed('key', reopened._get('key'), loads), {'a': 1})
+        self.assertEqual(len(parses), 1)
+
+    def test_old_responses_expire(self):
+        cache_handler = CacheHandler(self.folder)
+        cache_handler._store_response('old', 'etag', b'{}')
+        later = time.time() + RESPONSE_TTL + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertIsNone(cache_handler._get_response('old'))
+            cache_handler._store_response('new', 'etag', b'{}')
+        count, = cache_handler._get_db('responses.sqlite3', '').execute(
+            "SELECT COUNT(*) FROM responses").fetchone()
+        self.assertEqual(count, 1)
+
+
+class TestResponseCache(MockTestCase):
+
+    def test_unchanged_responses_are_revalidated(self):
+        connection = connect(
+            self.mock,
+            self.folder,
+            response_cache_entries=100,
+            persist_responses=True)
+        connection.spotify_get_saved_songs()
+        connection.spotify_get_saved_songs()
+        self.assertEqual(self.statuses(connection, 'me/tracks'),
+                         {200: 3, 304: 3})
+
+    def test_user_responses_survive_a_new_token(self):
+        connect(self.mock, self.folder, response_cache_entries=100,
+                persist_responses=True).spotify_get_saved_songs()
+        connection = connect(self.mock, self.folder, response_cache_entries=100,
+                             persist_responses=True)
+        connection.spotify_get_saved_songs()
+        self.assertEqual(self.statuses(connection, 'me/tracks'), {304: 3})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import time
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from tests.helpers import MockTestCase, aiohttp, connect
+
+
+class TestSavedIndex(MockTestCase):
+
+    def test_save_check_and_remove(self):
+        connection = connect(self.mock, self.folder)
+        ids = [track_id(1000), track_id(1001)]
+        self.assertEqual(
+            connection.spotify_check_saved_songs_by_id(ids), [False, False])
+        self.assertTrue(connection.spotify_save_songs_by_id(ids))
+        self.assertEqual(
+            connection.spotify_check_saved_songs_by_id(ids), [True, True])
+        self.assertTrue(connection.spotify_removed_saved_songs_by_id(ids[:1]))
+        self.assertEqual(
+            connection.spotify_check_saved_songs_by_id(ids), [False, True])
+
+    def test_check_saved_songs_from_the_index(self):
+        connection = connect(self.mock, self.folder, saved_index_max_age=60)
+        kept, removed = [id for id, _ in self.mock.library[:2]]
+        self.assertEqual(
+            connection.spotify_build_saved_index(), len(self.mock.library))
+        connection.spotify_save_songs_by_id([track_id(5000)])
+        connection.spotify_removed_saved_songs_by_id([removed])
+        requests = self.mock.requests
+        self.assertEqual(
+            connection.spotify_check_saved_songs_by_id(
+                [kept, removed, track_id(5000), track_id(5001)]),
+            [True, False, True, False])
+        self.assertEqual(self.mock.requests, requests)
+
+    def test_old_index_is_not_used(self):
+        connection = connect(self.mock, self.folder, saved_index_max_age=0.01)
+        connection.spotify_build_saved_index()
+        time.sleep(0.05)
+        requests = self.mock.requests
+        connection.spotify_check_saved_songs_by_id([track_id(0)])
+        self.assertEqual(self.mock.requests, requests + 1)
+
+    @unittest.skipIf(aiohttp is None, "requires aiohttp")
+    def test_async_check_saved_songs_from_the_index(self):
+        async def test(connection):
+            await connection.spotify_build_saved_index()
+            requests = self.mock.requests
+            saved = await connection.spotify_check_saved_songs_by_id(
+                [self.mock.library[0][0], track_id(5000)])
+            return saved, self.mock.requests - requests
+
+        self.assertEqual(
+            self.run_async(test, saved_index_max_age=60),
+            ([True, False], 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+
+from tests.helpers import LIBRARY_SIZE, MockTestCase, connect
+
+
+class TestGetSavedSongs(MockTestCase):
+
+    def test_get_saved_songs_keeps_library_order(self):
+        connection = connect(self.mock, self.folder)
+        songs = connection.spotify_get_saved_songs()
+        self.assertEqual([song.spotify_id for song in songs],
+                         [item[0] for item in self.mock.library])
+
+    def test_pages_step_by_the_page_size_spotify_used(self):
+        self.mock.page_size = 7
+        connection = connect(self.mock, self.folder)
+        songs = connection.spotify_get_saved_songs()
+        self.assertEqual(len(songs), LIBRARY_SIZE)
+        self.assertEqual(len(set(song.spotify_id for song in songs)),
+                         LIBRARY_SIZE)
+
+
+class TestIterSavedSongs(MockTestCase):
+
+    def test_iter_saved_songs_matches_list(self):
+        connection = connect(self.mock, self.folder)
+        self.assertEqual(
+            [song.spotify_id for song in connection.spotify_iter_saved_songs()],
+            [song.spotify_id for song in connection.spotify_get_saved_songs()])
+
+    def test_iter_saved_songs_asks_for_a_token_per_page(self):
+        connection = connect(self.mock, self.folder)
+        calls = []
+        get_access_token = connection._spotify_auth._get_access_token
+        connection._spotify_auth._get_access_token = \
+            lambda: calls.append(None) or get_access_token()
+        list(connection.spotify_iter_saved_songs())
+        self.assertEqual(len(calls), -(-LIBRARY_SIZE // 50))
+
+    def test_stopping_early_fetches_at_most_one_more_page(self):
+        connection = connect(self.mock, self.folder)
+        requests = self.mock.requests
+        songs = connection.spotify_iter_saved_songs()
+        next(songs)
+        songs.close()
+        self.assertLessEqual(self.mock.requests - requests, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.objects import Album, Artist, Song, SongTable
+from tests.helpers import MockTestCase, connect
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def song(name: str, artist: str, duration_ms: int, explicit: bool) -> Song:
+    artists = [Artist(name=artist, spotify_id=artist.lower())]
+    return Song(
+        name=name,
+        artists=artists,
+        album=Album(name=name + ' album', artists=artists, release_year=2020),
+        spotify_id=name.lower(),
+        duration_ms=duration_ms,
+        explicit=explicit)
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class TestSongTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = SongTable.from_songs([
+            song('B', 'Y', 200000, False),
+            None,
+            song('A', 'X', 100000, True),
+            song('C', 'X', 300000, False),
+        ])
+
+    def test_columns(self):
+        self.assertEqual(len(self.table), 3)
+        self.assertEqual(self.table['name'].tolist(), ['B', 'A', 'C'])
+        self.assertEqual(self.table['artist_name'].tolist(), ['Y', 'X', 'X'])
+        self.assertEqual(self.table['release_month'].tolist(), [-1, -1, -1])
+        self.assertIn('duration_ms', self.table.columns)
+
+    def test_filter_and_sort(self):
+        table = self.table.filter(
+            (self.table['duration_ms'] > 150000) & ~self.table['explicit'])
+        self.assertEqual(table['name'].tolist(), ['B', 'C'])
+        self.assertEqual(
+            self.table.sort('name', descending=True)['name'].tolist(),
+            ['C', 'B', 'A'])
+        self.assertEqual(
+            self.table.filter(self.table.equals('artist_name', 'X'))
+            ['name'].tolist(),
+            ['A', 'C'])
+
+    def test_group_by(self):
+        self.assertEqual(self.table.group_by('artist_name'), {'X': 2, 'Y': 1})
+        self.assertEqual(
+            self.table.group_by('artist_name', 'duration_ms', 'mean'),
+            {'X': 200000.0, 'Y': 200000.0})
+        self.assertEqual(
+            self.table.group_by('artist_name', 'duration_ms', 'max'),
+            {'X': 300000.0, 'Y': 200000.0})
+        with self.assertRaises(ValueError):
+            self.table.group_by('artist_name', 'duration_ms', 'median')
+
+    def test_rows_convert_back_to_songs(self):
+        songs = self.table.to_songs()
+        self.assertEqual([s.name for s in songs], ['B', 'A', 'C'])
+        self.assertEqual(songs[1].artists[0].name, 'X')
+        self.assertEqual(songs[1].album.release_year, 2020)
+        self.assertIsNone(songs[1].album.release_month)
+        self.assertTrue(songs[1].explicit)
+
+
+@unittest.skipIf(numpy is None, "requires numpy")
+class TestSongTableRequests(MockTestCase):
+
+    def test_table_matches_songs(self):
+        connection = connect(self.mock, self.folder)
+        ids = [track_id(i) for i in range(30)]
+        table = connection.spotify_get_songs_by_id(ids, as_table=True)
+        songs = connection.spotify_get_songs_by_id(ids)
+        self.assertEqual(table['spotify_id'].tolist(), ids)
+        self.assertEqual(table['duration_ms'].tolist(),
+                         [s.duration_ms for s in songs])
+
+    def test_saved_songs_table(self):
+        connection = connect(self.mock, self.folder)
+        table = connection.spotify_get_saved_songs(as_table=True)
+        self.assertEqual(sum(table.group_by('album_id').values()),
+                         len(self.mock.library))
+
+
+if __name__ == '__main__':
+    unittest.main()
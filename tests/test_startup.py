@@ -0,0 +1,39 @@
+import os
+import statistics
+import unittest
+
+from benchmarks.bench_startup import DEFERRED_MODULES, run_once
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RUNS = 5
+# the default budgets of benchmarks/bench_startup.py, in seconds
+IMPORT_BUDGET = 0.1
+CONSTRUCT_BUDGET = 0.01
+
+
+class TestStartup(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.runs = [run_once(ROOT) for _ in range(RUNS)]
+
+    def test_import_is_within_budget(self):
+        median = statistics.median(run['import'] for run in self.runs)
+        self.assertLessEqual(median, IMPORT_BUDGET)
+
+    def test_construction_is_within_budget(self):
+        median = statistics.median(run['construct'] for run in self.runs)
+        self.assertLessEqual(median, CONSTRUCT_BUDGET)
+
+    def test_heavy_modules_are_deferred(self):
+        for run in self.runs:
+            self.assertEqual(run['modules'], [],
+                             "imported eagerly, one of " + str(DEFERRED_MODULES))
+
+    def test_cache_folder_is_created_lazily(self):
+        for run in self.runs:
+            self.assertFalse(run['folder_created'])
+
+
+if __name__ == '__main__':
+    unittest.main()
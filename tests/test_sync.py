@@ -0,0 +1,39 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from tests.helpers import LIBRARY_SIZE, MockTestCase, connect
+
+
+class TestSyncSavedSongs(MockTestCase):
+
+    def test_first_sync_builds_the_index(self):
+        connection = connect(self.mock, self.folder)
+        added, removed = connection.spotify_sync_saved_songs()
+        self.assertEqual(len(added), LIBRARY_SIZE)
+        self.assertEqual(removed, [])
+
+    def test_sync_downloads_only_new_songs(self):
+        connection = connect(self.mock, self.folder)
+        connection.spotify_sync_saved_songs()
+        other = connect(self.mock, self.folder)
+        other.spotify_save_songs_by_id([track_id(2000), track_id(2001)])
+        requests = self.mock.requests
+        added, removed = connection.spotify_sync_saved_songs()
+        self.assertEqual(sorted(added), [track_id(2000), track_id(2001)])
+        self.assertEqual(removed, [])
+        self.assertEqual(self.statuses(connection, 'me/tracks'), {200: 4})
+        self.assertEqual(self.mock.requests, requests + 1)
+
+    def test_sync_finds_removed_songs(self):
+        connection = connect(self.mock, self.folder)
+        self.assertEqual(connection.spotify_build_saved_index(), LIBRARY_SIZE)
+        connection.spotify_save_songs_by_id([track_id(2000)])
+        self.mock.saved.discard(track_id(2000))
+        self.mock.library = [item for item in self.mock.library
+                             if item[0] != track_id(2000)]
+        added, removed = connection.spotify_sync_saved_songs()
+        self.assertEqual((added, removed), ([], [track_id(2000)]))
+
+
+if __name__ == '__main__':
+    unittest.main()
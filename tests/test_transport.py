@@ -0,0 +1,67 @@
+import unittest
+
+from benchmarks.mock_spotify import track_id, track_index
+from streamlib.connection.transport import HttpxTransport, RequestsTransport
+from streamlib.objects import Artist, Song
+from tests.helpers import LIBRARY_SIZE, MockTestCase, connect
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+
+class TestTransport(MockTestCase):
+
+    def test_connections_share_a_transport(self):
+        transport = RequestsTransport(pool_size=4)
+        connections = [connect(self.mock, self.folder, transport=transport)
+                       for _ in range(2)]
+        for connection in connections:
+            self.assertIs(connection._transport, transport)
+            self.assertIs(connection._spotify_auth._transport, transport)
+            connection.spotify_get_song_by_id(track_id(1))
+        self.assertEqual(self.mock.tokens, 2)
+        transport._close()
+
+    def test_compression_can_be_turned_off(self):
+        self.assertEqual(RequestsTransport()._headers({'a': 'b'}),
+                         {'a': 'b', 'Accept-Encoding': 'gzip'})
+        self.assertEqual(
+            RequestsTransport(compress=False)._headers(None),
+            {'Accept-Encoding': 'identity'})
+
+
+@unittest.skipIf(httpx is None, "requires httpx")
+class TestHttpxTransport(MockTestCase):
+
+    def test_requests_are_sent_with_httpx(self):
+        connection = connect(self.mock, self.folder, http2=True)
+        self.assertIsInstance(connection._transport, HttpxTransport)
+        songs = connection.spotify_get_songs_by_id(
+            [track_id(i) for i in range(60)])
+        self.assertEqual([song.name for song in songs],
+                         ['Song ' + str(i) for i in range(60)])
+        self.assertEqual(len(connection.spotify_get_saved_songs()),
+                         LIBRARY_SIZE)
+        self.assertEqual(self.mock.tokens, 1)
+
+    def test_search_query_is_encoded(self):
+        connection = connect(self.mock, self.folder, http2=True)
+        song = connection.spotify_populate_song(Song(
+            name='Rock & Roll #1',
+            artists=[Artist(name='AC/DC?')]))
+        self.assertEqual(
+            song.spotify_id,
+            track_id(track_index('track:Rock & Roll #1 artist:AC/DC?')))
+
+    def test_save_and_check(self):
+        connection = connect(self.mock, self.folder, http2=True)
+        self.assertTrue(connection.spotify_save_songs_by_id([track_id(9000)]))
+        self.assertEqual(
+            connection.spotify_check_saved_songs_by_id([track_id(9000)]),
+            [True])
+
+
+if __name__ == '__main__':
+    unittest.main()
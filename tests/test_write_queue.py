@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import unittest
+
+from benchmarks.mock_spotify import track_id
+from streamlib.connection.write_queue import REMOVE, SAVE, WriteQueue
+from tests.helpers import MockTestCase, aiohttp, connect
+
+
+def worker_threads() -> list[threading.Thread]:
+    return [thread for thread in threading.enumerate()
+            if thread.name == 'streamlib-write-queue']
+
+
+class TestWriteQueueClose(unittest.TestCase):
+
+    def test_close_writes_pending_intents_and_stops_the_worker(self):
+        writes = []
+        write_queue = WriteQueue(
+            lambda action, ids: writes.append((action, ids)), None, 2)
+        saved = write_queue._enqueue(SAVE, 'a')
+        write_queue._enqueue(REMOVE, 'b')
+        write_queue._enqueue(REMOVE, 'c')
+        worker = write_queue._worker
+        self.assertEqual(write_queue._close(), {'a': 'saved'})
+        self.assertEqual(saved.result(), 'saved')
+        self.assertEqual(writes, [(REMOVE, ['b', 'c']), (SAVE, ['a'])])
+        self.assertFalse(worker.is_alive())
+        self.assertIsNone(write_queue._worker)
+
+    def test_queue_can_be_used_after_close(self):
+        writes = []
+        write_queue = WriteQueue(
+            lambda action, ids: writes.append(ids), None, 10)
+        write_queue._enqueue(SAVE, 'a')
+        write_queue._close()
+        write_queue._enqueue(SAVE, 'b')
+        self.assertEqual(write_queue._flush(), {'b': 'saved'})
+        write_queue._close()
+        self.assertEqual(writes, [['a'], ['b']])
+
+    def test_closed_queues_leave_no_threads(self):
+        before = len(worker_threads())
+        for _ in range(20):
+            write_queue = WriteQueue(lambda action, ids: None, None, 10)
+            write_queue._enqueue(SAVE, 'a')
+            write_queue._flush()
+            write_queue._close()
+        self.assertEqual(len(worker_threads()), before)
+
+    def test_closing_an_unused_queue_starts_no_thread(self):
+        write_queue = WriteQueue(lambda action, ids: None, None, 10)
+        self.assertEqual(write_queue._close(), {})
+        self.assertIsNone(write_queue._worker)
+
+
+class TestWriteQueue(MockTestCase):
+
+    def test_flush_writes_queued_songs(self):
+        connection = connect(self.mock, self.folder, write_behind_window=None)
+        futures = connection.spotify_queue_save_songs_by_id(
+            [track_id(3000), track_id(3001)])
+        self.assertNotIn(track_id(3000), self.mock.saved)
+        self.assertEqual(connection.spotify_flush_saved_songs(), {
+            track_id(3000): 'saved', track_id(3001): 'saved'})
+        self.assertEqual([future.result() for future in futures],
+                         ['saved', 'saved'])
+        self.assertIn(track_id(3000), self.mock.saved)
+
+    def test_save_and_remove_cancel_out(self):
+        connection = connect(self.mock, self.folder, write_behind_window=None)
+        saved = connection.spotify_queue_save_songs_by_id([track_id(3000)])
+        removed = connection.spotify_queue_remove_saved_songs_by_id(
+            [track_id(3000)])
+        self.assertEqual(saved[0].result(), 'cancelled')
+        self.assertEqual(removed[0].result(), 'cancelled')
+        self.assertEqual(connection.spotify_flush_saved_songs(), {})
+
+    def test_full_batch_is_written_in_the_background(self):
+        connection = connect(self.mock, self.folder, write_behind_window=None)
+        ids = [track_id(i) for i in range(4000, 4050)]
+        futures = connection.spotify_queue_save_songs_by_id(ids)
+        self.assertEqual(
+            set(future.result(timeout=10) for future in futures), {'saved'})
+        self.assertTrue(all(id in self.mock.saved for id in ids))
+
+    def test_window_writes_queued_songs(self):
+        connection = connect(self.mock, self.folder, write_behind_window=0.05)
+        futures = connection.spotify_queue_save_songs_by_id([track_id(3000)])
+        self.assertEqual(futures[0].result(timeout=10), 'saved')
+
+    def test_closing_the_connection_writes_queued_songs(self):
+        with connect(self.mock, self.folder, write_behind_window=None) \
+                as connection:
+            futures = connection.spotify_queue_save_songs_by_id(
+                [track_id(i) for i in range(4000, 4060)])
+        self.assertEqual(set(future.result(timeout=0) for future in futures),
+                         {'saved'})
+        self.assertIsNone(connection._write_queue._worker)
+
+
+@unittest.skipIf(aiohttp is None, "requires aiohttp")
+class TestAsyncWriteQueue(MockTestCase):
+
+    def test_write_queue(self):
+        ids = [track_id(i) for i in range(6000, 6060)]
+
+        async def test(connection):
+            futures = await connection.spotify_queue_save_songs_by_id(ids)
+            removed = await connection.spotify_queue_remove_saved_songs_by_id(
+                ids[-1:])
+            outcomes = await connection.spotify_flush_saved_songs()
+            return (
+                await asyncio.gather(*futures[:50]),
+                await removed[0],
+                outcomes)
+
+        full, cancelled, outcomes = self.run_async(
+            test, write_behind_window=None)
+        self.assertEqual(set(full), {'saved'})
+        self.assertEqual(cancelled, 'cancelled')
+        self.assertEqual(len(outcomes), 9)
+        self.assertTrue(all(id in self.mock.saved for id in ids[:-1]))
+        self.assertNotIn(ids[-1], self.mock.saved)
+
+    def test_closing_the_connection_writes_queued_songs(self):
+        async def test(connection):
+            futures = await connection.spotify_queue_save_songs_by_id(
+                [track_id(7000)])
+            await connection.close()
+            return futures[0].result(), connection._write_queue._worker
+
+        self.assertEqual(
+            self.run_async(test, write_behind_window=None), ('saved', None))
+        self.assertIn(track_id(7000), self.mock.saved)
+
+
+if __name__ == '__main__':
+    unittest.main()